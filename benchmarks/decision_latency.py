@@ -0,0 +1,62 @@
+"""
+Per-decision latency of rlgraph `Agent.get_action` against the NumPy export of the same policy.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/decision_latency.py
+"""
+import argparse
+import json
+
+import numpy as np
+import time
+from rlgraph.agents import Agent
+from rlgraph.spaces import Dict as RLDict, FloatBox, IntBox
+
+from rlcache.rl_model.numpy_policy import NumpyPolicy
+from rlcache.strategies.caching_strategies.rl_caching_state import CachingAgentSystemState
+from rlcache.strategies.eviction_strategies.rl_eviction_state import EvictionAgentSystemState
+from rlcache.strategies.multi_task.rl_multi_task_cache_strategy_state import MultiTaskAgentSystemState
+from rlcache.strategies.ttl_estimation_strategies.rl_ttl_state import TTLAgentSystemState
+
+# agent config -> (fields in state, action space), as built by the strategies using them
+AGENTS = {
+    'caching_dqn': (len(CachingAgentSystemState.__slots__), IntBox(2)),
+    'eviction_dqn': (len(EvictionAgentSystemState.__slots__), IntBox(low=0, high=2)),
+    'ttl_sac': (len(TTLAgentSystemState.__slots__), FloatBox(low=0, high=1800, shape=(1,))),
+    'multi_dqn': (len(MultiTaskAgentSystemState.__slots__),
+                  RLDict({'ttl': IntBox(low=0, high=1800), 'eviction': IntBox(low=0, high=2)})),
+}
+
+
+def median_latency(get_action, states: np.ndarray) -> float:
+    timings = []
+    for state in states:
+        start = time.perf_counter()
+        get_action(state)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--agents', nargs='+', default=list(AGENTS.keys()))
+    parser.add_argument('--decisions', type=int, default=2000)
+    args = parser.parse_args()
+
+    print('agent,rlgraph_us,numpy_us,speedup')
+    for agent_name in args.agents:
+        with open(f'configs/agents/{agent_name}.json', 'r') as fp:
+            agent_config = json.load(fp)
+        fields_in_state, action_space = AGENTS[agent_name]
+        agent = Agent.from_spec(agent_config, state_space=FloatBox(shape=(fields_in_state,)), action_space=action_space)
+        numpy_policy = NumpyPolicy.from_agent(agent, agent_config, action_space)
+
+        states = np.random.uniform(0, 100, size=(args.decisions, fields_in_state)).astype('float32')
+        rlgraph_latency = median_latency(lambda state: agent.get_action(state, use_exploration=False), states)
+        numpy_latency = median_latency(numpy_policy.get_action, states)
+        print(f'{agent_name},{rlgraph_latency * 1e6:.1f},{numpy_latency * 1e6:.1f},'
+              f'{rlgraph_latency / numpy_latency:.1f}')
+
+
+if __name__ == '__main__':
+    main()
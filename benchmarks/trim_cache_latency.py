@@ -0,0 +1,75 @@
+"""
+Trim latency of RLEvictionStrategy against cache capacity, per-key loop vs batched vs sampled vs indexed scoring.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/trim_cache_latency.py --agent_config configs/agents/eviction_dqn.json
+"""
+import argparse
+import json
+import tempfile
+
+import time
+
+from rlcache.backend import InMemoryStorage, TTLCache
+from rlcache.cache_constants import CacheInformation
+from rlcache.observer import ObservationType
+from rlcache.strategies.eviction_strategies.rl_eviction_strategy import RLEvictionStrategy
+
+MODES = {
+    'loop': {},
+    'batched': {'batch_inference': True},
+    'batched_chunked': {'batch_inference': True, 'inference_batch_size': 512},
+    'sampled': {'eviction_sample_size': 16},
+    'score_index': {'score_index': True},
+}
+
+
+def fill_cache(strategy: RLEvictionStrategy, cache: TTLCache, ttl: int):
+    key_id = 0
+    while not cache.is_full():
+        key = f'key_{key_id}'
+        key_id += 1
+        if cache.contains(key, clean_expire=False):
+            continue
+        cache.set(key, {'value': key_id}, ttl)
+        strategy.observe(key, ObservationType.Write, {'ttl': ttl})
+
+
+def time_trim(agent_config: dict, mode: str, capacity: int, repeats: int, result_dir: str) -> float:
+    config = {'checkpoint_steps': 10000, 'agent_config': agent_config}
+    config.update(MODES[mode])
+    cache_stats = CacheInformation(capacity, lambda: 0)
+    strategy = RLEvictionStrategy(config, result_dir, cache_stats)
+    cache = TTLCache(InMemoryStorage(capacity))
+
+    timings = []
+    for _ in range(repeats):
+        fill_cache(strategy, cache, ttl=3600)
+        start = time.perf_counter()
+        strategy.trim_cache(cache)
+        timings.append(time.perf_counter() - start)
+
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--agent_config', default='configs/agents/eviction_dqn.json')
+    parser.add_argument('--capacities', type=int, nargs='+', default=[100, 1000, 2500, 5000])
+    parser.add_argument('--modes', nargs='+', default=list(MODES.keys()))
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.agent_config, 'r') as fp:
+        agent_config = json.load(fp)
+
+    print('capacity,mode,median_trim_ms')
+    with tempfile.TemporaryDirectory() as result_dir:
+        for capacity in args.capacities:
+            for mode in args.modes:
+                median = time_trim(agent_config, mode, capacity, args.repeats, result_dir)
+                print(f'{capacity},{mode},{median * 1000:.3f}')
+
+
+if __name__ == '__main__':
+    main()
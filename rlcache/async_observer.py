@@ -0,0 +1,153 @@
+import logging
+import threading
+from typing import Dict, List
+
+from rlcache.cache_constants import CacheInformation
+from rlcache.observer import ObservationType, Observer, ObserversOrchestrator
+from rlcache.utils import clock
+
+
+class AsyncObserversOrchestrator(ObserversOrchestrator):
+    """
+    Observers orchestrator that takes the strategies' bookkeeping off the request path.
+
+    observe only appends (key, observation type, info, timestamp) to a preallocated ring buffer of queue_size events,
+    a worker thread delivers them in order in batches of batch_size, the clock pinned to each event's timestamp. Only
+    the decisions (should_cache, estimate_ttl, trim_cache) stay on the request path.
+
+    Decisions still see every observation made before them (e.g. the RL strategies complete the key's last experience
+    on its Miss before deciding on it again): the CacheManager settles a key, delivering its pending events right away
+    in their order, before the write decisions on it and flushes the queue before trim_cache. Pair it with
+    eviction_watermarks so the flushes mostly happen on the eviction worker rather than on requests.
+
+    When the buffer is full on_full decides: 'deliver' (default) delivers the oldest batch on the request path,
+    'drop_hits' drops the new event if it is a Hit, counted in CacheInformation.dropped_observations, and delivers
+    the oldest batch otherwise. Hits only credit the pending decisions, the strategies rely on every other observation.
+
+    The worker takes the CacheManager's lock per batch, like the eviction worker, and the manager holds it while
+    observing, so the buffer is only touched under that lock. The manager stops the worker when it closes an episode.
+    """
+
+    def __init__(self,
+                 config: Dict[str, any],
+                 observers: List[Observer],
+                 results_dir: str,
+                 cache_stats: CacheInformation,
+                 lock: threading.RLock):
+        super().__init__(observers, results_dir, cache_stats)
+        self.queue_size = config.get('queue_size', 65536)
+        self.batch_size = config.get('batch_size', 256)
+        self.flush_interval = config.get('flush_interval_ms', 50) / 1000
+        self.on_full = config.get('on_full', 'deliver')
+        assert self.on_full in ('deliver', 'drop_hits'), \
+            f"Unknown on_full: {self.on_full}, expected 'deliver' or 'drop_hits'"
+
+        self.lock = lock
+        self.logger = logging.getLogger(__name__)
+        self._events = [None] * self.queue_size
+        self._head = 0  # slot of the oldest event
+        self._size = 0  # slots in use, settled events leave theirs empty until the head passes them
+        self._pending_slots = {}  # type: Dict[str, List[int]]
+
+        self._wake_up = threading.Event()
+        self._stopped = False
+        self._thread = None  # type: threading.Thread
+        self._start()
+
+    def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any] = None):
+        if self._thread is None:
+            self._start()  # stopped at the end of the previous episode
+        if self._size == self.queue_size:
+            if self.on_full == 'drop_hits' and observation_type == ObservationType.Hit:
+                self.cache_stats.dropped_observations += 1
+                return
+            self._deliver(self.batch_size)
+
+        slot = (self._head + self._size) % self.queue_size
+        self._events[slot] = (key, observation_type, info, clock.now())
+        self._size += 1
+        slots = self._pending_slots.get(key)
+        if slots is None:
+            self._pending_slots[key] = [slot]
+        else:
+            slots.append(slot)
+        if self._size == self.batch_size:
+            self._wake_up.set()
+
+    def observe_many(self, observations):
+        for key, observation_type, info in observations:
+            self.observe(key, observation_type, info)
+
+    def settle(self, key: str):
+        slots = self._pending_slots.pop(key, None)
+        if slots is None:
+            return
+        for slot in slots:
+            event = self._events[slot]
+            self._events[slot] = None
+            self._dispatch_event(event)
+
+    def flush(self):
+        self._deliver(self._size)
+
+    def stop(self):
+        """
+        Join the worker and deliver what is left, a no-op once stopped. Not to be called under the lock, which the
+        worker takes per batch. The next observe starts a new worker.
+        """
+        if self._thread is None:
+            return
+        self._stopped = True
+        self._wake_up.set()
+        self._thread.join()
+        self._thread = None
+        with self.lock:
+            self.flush()
+
+    def _start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='observers_worker', daemon=True)
+        self._thread.start()
+
+    def _deliver(self, num_events: int):
+        """Deliver the oldest num_events events, including the slots already settled."""
+        events = self._events
+        for _ in range(min(num_events, self._size)):
+            event = events[self._head]
+            events[self._head] = None
+            self._head = (self._head + 1) % self.queue_size
+            self._size -= 1
+            if event is None:
+                continue  # settled
+            key = event[0]
+            slots = self._pending_slots[key]
+            if len(slots) == 1:
+                del self._pending_slots[key]
+            else:
+                slots.pop(0)
+            self._dispatch_event(event)
+
+    def _dispatch_event(self, event):
+        key, observation_type, info, timestamp = event
+        clock.pin(timestamp)
+        try:
+            super().observe(key, observation_type, info)
+        finally:
+            clock.pin(None)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake_up.wait(self.flush_interval)
+            self._wake_up.clear()
+            try:
+                self._deliver_pending()
+            except Exception:
+                self.logger.exception('Delivering observations failed.')
+
+    def _deliver_pending(self):
+        while not self._stopped:
+            # take the lock per batch so requests can interleave with a long backlog
+            with self.lock:
+                if self._size == 0:
+                    return
+                self._deliver(self.batch_size)
@@ -6,6 +6,7 @@ import time
 
 from rlcache.backend.base import Storage
 from rlcache.observer import ObservationType
+from rlcache.utils import clock
 
 KeyType = str
 InfoType = Dict[str, any]
@@ -53,11 +54,12 @@ class TTLCache(object):
 
     def contains(self, key: str, clean_expire=True):
         if clean_expire:
-            self.expire(time.time())
+            self.expire(clock.now())
         return self.memory.contains(key)
 
-    def get(self, key: str, default=None):
-        self.expire(time.time())
+    def get(self, key: str, default=None, clean_expire=True):
+        if clean_expire:
+            self.expire(clock.now())
         return self.memory.get(key, default)
 
     def set(self, key: str, values: any, ttl: int) -> None:
@@ -66,20 +68,13 @@ class TTLCache(object):
         :param values: values.
         :param ttl: time to live in seconds.
         """
-        current_time = time.time()
+        current_time = clock.now()
         self.expire(current_time)
         self.memory.set(key, values)
-        if key in self.key_to_expiration_item:  # update pointer
-            stored_value = self.key_to_expiration_item[key].copy()
-            self.key_to_expiration_item[key].eviction_time = -1
-
-            stored_value.eviction_time = current_time + ttl
-            heapq.heappush(self.expiration_time_list, stored_value)
-            self.key_to_expiration_item[key] = stored_value
-        else:
-            expiration_entry = _ExpirationListEntry(eviction_time=current_time + ttl, key=key, dirty_delete=False)
-            self.key_to_expiration_item[key] = expiration_entry
-            heapq.heappush(self.expiration_time_list, expiration_entry)
+        # a previous entry of the key is superseded, it is dropped once it reaches the top of the expiration queue
+        expiration_entry = _ExpirationListEntry(eviction_time=current_time + ttl, key=key, dirty_delete=False)
+        self.key_to_expiration_item[key] = expiration_entry
+        heapq.heappush(self.expiration_time_list, expiration_entry)
 
     def update(self, key: str, values: any):
         """Update without changing the TTL value"""
@@ -87,26 +82,21 @@ class TTLCache(object):
             self.memory.set(key, values)
 
     def expire(self, cur_time):
-        for expiration_entry in self.expiration_time_list:
-            eviction_time = expiration_entry.eviction_time
+        expiration_time_list = self.expiration_time_list
+        while len(expiration_time_list) > 0 and expiration_time_list[0].eviction_time <= cur_time:
+            expiration_entry = heapq.heappop(expiration_time_list)
             key = expiration_entry.key
-            stored_value = self.key_to_expiration_item[key]
-
-            if eviction_time == -1:
-                heapq.heappop(self.expiration_time_list)
-                continue
-
-            if cur_time < eviction_time:
-                break
+            if self.key_to_expiration_item.get(key) is not expiration_entry:
+                continue  # superseded by a later set of the key
+            # forget expired keys, the map would otherwise grow with every key ever set
+            del self.key_to_expiration_item[key]
             # self.delete(key) leaves the expiration queue as is, as a trade-off between speed and memory. cleanup here.
-            if not stored_value.dirty_delete and self.memory.contains(key):
+            if not expiration_entry.dirty_delete and self.memory.contains(key):
                 stored_values = self.memory.get(key)
-                self.invoke_hooks(key, stored_values, eviction_time)
+                self.invoke_hooks(key, stored_values, expiration_entry.eviction_time)
                 # remove entries from cache and expiration queue
                 self.memory.delete(key)
 
-            heapq.heappop(self.expiration_time_list)
-
     def invoke_hooks(self, key, stored_values, eviction_time):
         info = {'value': stored_values,
                 'expire_at': eviction_time}
@@ -1,10 +1,13 @@
 import json
+from collections import Counter, defaultdict
 from dataclasses import dataclass
 from enum import Enum
-from typing import Callable
+from typing import Callable, Dict, List
 
 from time import time
 
+from rlcache.key_metadata import KeyMetadataTable
+
 
 class OperationType(Enum):
     New = 0
@@ -26,16 +29,79 @@ class MonitoringEntry(object):
         return f'{self.timestamp},{self.key},{self.cache_hit},{self.cache_miss},{self.should_cache}'
 
 
+class StrategyMetrics(object):
+    """
+    In-memory aggregates of a strategy's evaluation numbers in the current episode: the eviction outcomes
+    (TrueEvict/FalseEvict/MissEvict/TrueMiss), the error of the estimated TTLs against the real ones and the rewards
+    given. The same numbers the visualiser reconstructs from the per event logs.
+    """
+
+    def __init__(self):
+        self.eviction_outcomes = Counter()
+        self.ttl_observations = 0
+        self.ttl_error_sum = 0.0  # estimated - real ttl
+        self.ttl_absolute_error_sum = 0.0
+        self.rewards = 0
+        self.reward_sum = 0.0
+
+    def record_ttl(self, estimated_ttl: float, real_ttl: float):
+        self.ttl_observations += 1
+        self.ttl_error_sum += estimated_ttl - real_ttl
+        self.ttl_absolute_error_sum += abs(estimated_ttl - real_ttl)
+
+    def record_rewards(self, num_rewards: int, reward_sum: float):
+        self.rewards += num_rewards
+        self.reward_sum += reward_sum
+
+    def to_dict(self) -> Dict[str, any]:
+        metrics = {}
+        if self.eviction_outcomes:
+            metrics['eviction_outcomes'] = dict(self.eviction_outcomes)
+        if self.ttl_observations:
+            metrics['ttl_observations'] = self.ttl_observations
+            metrics['mean_ttl_error'] = self.ttl_error_sum / self.ttl_observations
+            metrics['mean_absolute_ttl_error'] = self.ttl_absolute_error_sum / self.ttl_observations
+        if self.rewards:
+            metrics['rewards'] = self.rewards
+            metrics['reward_sum'] = self.reward_sum
+            metrics['mean_reward'] = self.reward_sum / self.rewards
+        return metrics
+
+    def clear(self):
+        self.eviction_outcomes.clear()
+        self.ttl_observations = 0
+        self.ttl_error_sum = 0.0
+        self.ttl_absolute_error_sum = 0.0
+        self.rewards = 0
+        self.reward_sum = 0.0
+
+
 class CacheInformation(object):
     """Class for keeping track of the environment information across all strategies."""
 
-    def __init__(self, max_capacity: int, size_check_func: Callable[[], int]):
+    def __init__(self,
+                 max_capacity: int,
+                 size_check_func: Callable[[], int],
+                 event_log_settings: Dict[str, any] = None):
         self.invalidate = 0
         self.hit = 0
         self.miss = 0
         self.manual_evicts = 0
+        self.fallback_evicts = Counter()  # eviction strategy name -> evictions made by the fallback policy for it
+        self.latency_fallbacks = Counter()  # decision -> decisions routed to the fallback strategy over latency SLO
+        self.offered_experiences = Counter()  # strategy name -> decisions offered for learning
+        self.dropped_experiences = Counter()  # strategy name -> of which not learned from, over the in-flight cap
+        self.dropped_observations = 0  # Hit observations dropped by the async observers, their queue full
         self.should_cache_true = 0
         self.should_cache_false = 0
+        # strategy name -> its StrategyMetrics, strategies keep a reference: cleared in place on close
+        self.strategy_metrics = defaultdict(StrategyMetrics)  # type: Dict[str, StrategyMetrics]
+        # metrics() of every completed episode
+        self.episode_metrics = []  # type: List[Dict[str, any]]
+        # metadata of the cached keys shared by the strategies, maintained by the CacheManager across episodes
+        self.key_metadata = KeyMetadataTable()
+        self.event_log_settings = event_log_settings or {}  # settings of every strategy's event logs
+        self.key_encoders = {}  # key encoding settings -> KeyEncoder shared by the strategies, kept across episodes
         self.max_capacity = max_capacity
         self._size_check_func = size_check_func
 
@@ -58,24 +124,58 @@ class CacheInformation(object):
     def hit_ratio(self) -> float:
         return self.hit / max(self.miss + self.hit, 1)
 
+    @property
+    def dropped_experience_ratio(self) -> Dict[str, float]:
+        return {name: self.dropped_experiences[name] / max(offered, 1)
+                for name, offered in self.offered_experiences.items()}
+
+    def to_record(self) -> tuple:
+        return (self.invalidate,
+                self.hit,
+                self.miss,
+                self.hit_ratio * 100,
+                self.should_cache_true,
+                self.should_cache_false,
+                self.should_cache_ratio * 100,
+                self.manual_evicts,
+                self.cache_utility)
+
     def to_log(self) -> str:
-        return "{},{},{},{},{},{},{},{},{}".format(self.invalidate,
-                                                   self.hit,
-                                                   self.miss,
-                                                   self.hit_ratio * 100,
-                                                   self.should_cache_true,
-                                                   self.should_cache_false,
-                                                   self.should_cache_ratio * 100,
-                                                   self.manual_evicts,
-                                                   self.cache_utility)
+        return "{},{},{},{},{},{},{},{},{}".format(*self.to_record())
+
+    def metrics(self) -> Dict[str, any]:
+        """The evaluation numbers of the current episode, json serialisable."""
+        return {'invalidate': self.invalidate,
+                'hit': self.hit,
+                'miss': self.miss,
+                'hit_ratio': self.hit_ratio,
+                'should_cache': self.should_cache_true,
+                'should_not_cache': self.should_cache_false,
+                'should_cache_ratio': self.should_cache_ratio,
+                'manual_evicts': self.manual_evicts,
+                'fallback_evicts': dict(self.fallback_evicts),
+                'latency_fallbacks': dict(self.latency_fallbacks),
+                'dropped_experiences': dict(self.dropped_experiences),
+                'dropped_experience_ratio': self.dropped_experience_ratio,
+                'dropped_observations': self.dropped_observations,
+                'cache_utility': self.cache_utility,
+                'strategies': {name: strategy_metrics.to_dict()
+                               for name, strategy_metrics in self.strategy_metrics.items()}}
 
     def close(self):
         self.invalidate = 0
         self.hit = 0
         self.miss = 0
         self.manual_evicts = 0
+        self.fallback_evicts.clear()
+        self.latency_fallbacks.clear()
+        self.offered_experiences.clear()
+        self.dropped_experiences.clear()
+        self.dropped_observations = 0
         self.should_cache_true = 0
         self.should_cache_false = 0
+        for strategy_metrics in self.strategy_metrics.values():
+            strategy_metrics.clear()
 
     def __str__(self):
         return json.dumps({"Invalidation": self.invalidate,
@@ -86,6 +186,11 @@ class CacheInformation(object):
                            "Shouldn't cache": self.should_cache_false,
                            "Should cache ratio (%)": self.should_cache_ratio * 100,
                            "Manual Evicts": self.manual_evicts,
+                           "Fallback Evicts": self.fallback_evicts,
+                           "Latency Fallbacks": self.latency_fallbacks,
+                           "Dropped Experiences (%)": {name: ratio * 100
+                                                       for name, ratio in self.dropped_experience_ratio.items()},
+                           "Dropped Observations": self.dropped_observations,
                            "Size": self.size,
                            "capacity": self.max_capacity
                            })
@@ -1,10 +1,17 @@
-from typing import Dict
+import sys
+import threading
+from typing import Dict, List
 
+from rlcache.async_observer import AsyncObserversOrchestrator
 from rlcache.backend.base import Storage
 from rlcache.backend.ttl_cache import TTLCache
 from rlcache.cache_constants import OperationType, CacheInformation
+from rlcache.eviction_worker import WatermarkEvictionWorker
 from rlcache.observer import ObservationType, ObserversOrchestrator
+from rlcache.strategies.eviction_strategies.base_eviction_strategy import EvictionBudget
+from rlcache.strategies.eviction_strategies.fallback_eviction import FallbackEviction
 from rlcache.strategies.strategies_from_config import strategies_from_config
+from rlcache.utils import clock, event_log
 
 
 class CacheManager(object):
@@ -12,25 +19,84 @@ class CacheManager(object):
     def __init__(self, config: Dict[str, any], cache: TTLCache, backend: Storage, result_dir: str):
         self.cache = cache
         self.backend = backend
-        self.cache_stats = CacheInformation(cache.capacity(), size_check_func=cache.size)
+        self.cache_stats = CacheInformation(cache.capacity(),
+                                            size_check_func=cache.size,
+                                            event_log_settings=config.get('event_log', {}))
+        self.key_metadata = self.cache_stats.key_metadata
         self.caching_strategy, self.eviction_strategy, self.ttl_strategy = strategies_from_config(config,
                                                                                                   result_dir,
                                                                                                   self.cache_stats)
+        # requests and the background workers all go through the strategies, serialise them
+        self._lock = threading.RLock()
+
         if 'multi_strategy_settings' in config:
             # any of the strategies work for multi-strategy
-            self.observer_orchestrator = ObserversOrchestrator([self.caching_strategy], result_dir, self.cache_stats)
+            observers = [self.caching_strategy]
             self.multi_strategy = True
         else:
-            self.observer_orchestrator = ObserversOrchestrator([self.caching_strategy,
-                                                                self.eviction_strategy,
-                                                                self.ttl_strategy], result_dir, self.cache_stats)
+            observers = [self.caching_strategy, self.eviction_strategy, self.ttl_strategy]
             self.multi_strategy = False
+        if 'async_observers' in config:
+            self.observer_orchestrator = AsyncObserversOrchestrator(config['async_observers'],
+                                                                    observers,
+                                                                    result_dir,
+                                                                    self.cache_stats,
+                                                                    self._lock)
+        else:
+            self.observer_orchestrator = ObserversOrchestrator(observers, result_dir, self.cache_stats)
+
+        self.cache.expired_entry_callback(self._observe_expiration)
+
+        # eviction budget per insert, handed to trim_cache so a single scan stops once it is spent. once spent (or
+        # when trim_cache makes no progress) the fallback policy evicts
+        eviction_budget = config.get('eviction_budget', {})
+        self.eviction_max_time = eviction_budget.get('max_time_ms', float('inf')) / 1000
+        self.eviction_max_candidates = eviction_budget.get('max_candidates', float('inf'))
+        self.fallback_eviction = FallbackEviction(eviction_budget)
 
-        self.cache.expired_entry_callback(self.observer_orchestrator.observe)
+        self.eviction_worker = None
+        if 'eviction_watermarks' in config and cache.capacity() is not None:
+            self.eviction_worker = WatermarkEvictionWorker(config['eviction_watermarks'],
+                                                           cache,
+                                                           self._evict_batch,
+                                                           self._lock)
 
     def get(self, key: str) -> Dict[str, any]:
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key: str, values: Dict[str, str]) -> None:
+        with self._lock:
+            self._set_or_update(key, values)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._delete(key)
+
+    def stats(self) -> str:
+        return str(self.cache_stats)
+
+    def metrics(self) -> Dict[str, any]:
+        """Evaluation numbers of the current episode so far and of the completed ones, aggregated in memory."""
+        with self._lock:
+            self.observer_orchestrator.flush()  # the strategies aggregate as they observe
+            return {'episode': self.observer_orchestrator.episode_num,
+                    'current': self.cache_stats.metrics(),
+                    'completed_episodes': list(self.cache_stats.episode_metrics)}
+
+    def close(self):
+        # the background workers are stopped first so they can't evict or deliver while the strategies and logs
+        # close. not under the lock, which the workers take per batch
+        if self.eviction_worker is not None:
+            self.eviction_worker.stop()
+        self.observer_orchestrator.stop()
+        with self._lock:
+            self._close()
+
+    def _get(self, key: str) -> Dict[str, any]:
         if self.cache.contains(key):
             self.cache_stats.hit += 1
+            self.key_metadata.hit(key, clock.now())
             self.observer_orchestrator.observe(key, ObservationType.Hit, {})
             values = self.cache.get(key)
         else:
@@ -41,9 +107,10 @@ class CacheManager(object):
 
         return values
 
-    def set(self, key: str, values: Dict[str, str]) -> None:
+    def _set_or_update(self, key: str, values: Dict[str, str]) -> None:
         if self.cache.contains(key):
-            self.observer_orchestrator.observe(key, ObservationType.Invalidate, {})
+            self.observer_orchestrator.observe(key, ObservationType.Invalidate,
+                                               {'metadata': self.key_metadata.remove(key)})
             self.cache_stats.invalidate += 1
             self.cache.delete(key)  # ensure key isn't cached anymore
             status = OperationType.Update
@@ -53,18 +120,17 @@ class CacheManager(object):
 
         self._set(key, values, status)
 
-    def delete(self, key: str) -> None:
+    def _delete(self, key: str) -> None:
         if self.cache.contains(key):
-            self.observer_orchestrator.observe(key, ObservationType.Invalidate, {})
+            self.observer_orchestrator.observe(key, ObservationType.Invalidate,
+                                               {'metadata': self.key_metadata.remove(key)})
             self.cache_stats.invalidate += 1
             self.cache.delete(key)
         else:
             self.observer_orchestrator.observe(key, ObservationType.Invalidate, {})
 
-    def stats(self) -> str:
-        return str(self.cache_stats)
-
-    def close(self):
+    def _close(self):
+        self.observer_orchestrator.flush()
         if self.multi_strategy:
             self.ttl_strategy.close()
         else:
@@ -74,19 +140,62 @@ class CacheManager(object):
 
         self.observer_orchestrator.close()
         self.cache_stats.close()
+        event_log.flush_all()
 
     def _set(self, key: str, values: Dict[str, any], operation_type: OperationType) -> None:
+        self.observer_orchestrator.settle(key)
         ttl = self.ttl_strategy.estimate_ttl(key, values, operation_type)
         should_cache = self.caching_strategy.should_cache(key, values, ttl, operation_type)
         if should_cache:
             self.cache_stats.should_cache_true += 1
-            while self.cache.is_full():
-                evicted_keys = self.eviction_strategy.trim_cache(self.cache)
-                for evicted_key in evicted_keys:
-                    self.observer_orchestrator.observe(evicted_key, ObservationType.EvictionPolicy, {})
-                    self.cache_stats.manual_evicts += 1
+            if self.cache.is_full():
+                self._make_room()
 
             self.cache.set(key, values, ttl)
+            self.key_metadata.insert(key, ttl, sys.getsizeof(values), clock.now())
             self.observer_orchestrator.observe(key, ObservationType.Write, {'ttl': ttl})
+            if self.eviction_worker is not None:
+                self.eviction_worker.notify()
         else:
             self.cache_stats.should_cache_false += 1
+
+    def _make_room(self) -> None:
+        """Evict until one more key fits, handing over to the O(1) fallback policy once the budget is spent."""
+        # eviction decisions are taken with every observation so far delivered
+        self.observer_orchestrator.flush()
+        budget = EvictionBudget(self.eviction_max_candidates, self.eviction_max_time)
+        while self.cache.is_full():
+            evicted_keys = self.eviction_strategy.trim_cache(self.cache, budget)
+            self._observe_evictions(evicted_keys)
+            if not self.cache.is_full():
+                return
+
+            if len(evicted_keys) == 0 or budget.exhausted():
+                break
+
+        strategy_name = type(self.eviction_strategy).__name__
+        while self.cache.is_full():
+            evicted_key = self.fallback_eviction.evict(self.cache)
+            self.eviction_strategy.forget(evicted_key)
+            self.cache_stats.fallback_evicts[strategy_name] += 1
+            self._observe_evictions([evicted_key])
+
+    def _evict_batch(self, num_keys: int) -> int:
+        self.observer_orchestrator.flush()
+        evicted_keys = self.eviction_strategy.trim_cache_batch(self.cache, num_keys)
+        self._observe_evictions(evicted_keys)
+        return len(evicted_keys)
+
+    def _observe_evictions(self, evicted_keys: List[str]) -> None:
+        if len(evicted_keys) == 0:
+            return
+        # one call per strategy for the whole batch
+        self.observer_orchestrator.observe_many([(evicted_key,
+                                                  ObservationType.EvictionPolicy,
+                                                  {'metadata': self.key_metadata.remove(evicted_key)})
+                                                 for evicted_key in evicted_keys])
+        self.cache_stats.manual_evicts += len(evicted_keys)
+
+    def _observe_expiration(self, key: str, observation_type: ObservationType, info: Dict[str, any]) -> None:
+        info['metadata'] = self.key_metadata.remove(key)
+        self.observer_orchestrator.observe(key, observation_type, info)
@@ -0,0 +1,83 @@
+import logging
+import threading
+from typing import Callable, Dict
+
+from rlcache.backend.ttl_cache import TTLCache
+
+
+class WatermarkEvictionWorker(object):
+    """
+    Background thread that keeps the cache below a high watermark.
+
+    Once the cache size crosses high * capacity the worker wakes up and evicts in batches of batch_size until the
+    size is back at low * capacity, so requests rarely find the cache full and pay for eviction themselves.
+
+    `stop` joins the thread, e.g. while the CacheManager closes an episode, the next notify over the high watermark
+    starts a new one.
+    """
+
+    def __init__(self,
+                 config: Dict[str, any],
+                 cache: TTLCache,
+                 evict_batch: Callable[[int], int],
+                 lock: threading.RLock):
+        capacity = cache.capacity()
+        self.high_watermark = int(capacity * config.get('high', 0.95))
+        self.low_watermark = int(capacity * config.get('low', 0.85))
+        assert self.low_watermark < self.high_watermark <= capacity, 'Expected 0 < low < high <= 1'
+        self.batch_size = config.get('batch_size', 64)
+
+        self.cache = cache
+        self.evict_batch = evict_batch
+        self.lock = lock
+        self.logger = logging.getLogger(__name__)
+
+        self._wake_up = threading.Event()
+        self._stopped = False
+        self._thread = None  # type: threading.Thread
+        self._start()
+
+    def notify(self):
+        """Called after every write, cheap unless the high watermark was crossed."""
+        if self.cache.size() >= self.high_watermark:
+            if self._thread is None:
+                self._start()
+            self._wake_up.set()
+
+    def stop(self):
+        """Wait for the worker to finish its batch and exit. Don't hold the lock, the worker takes it per batch."""
+        if self._thread is None:
+            return
+        self._stopped = True
+        self._wake_up.set()
+        self._thread.join()
+        self._thread = None
+
+    def _start(self):
+        self._stopped = False
+        self._wake_up.clear()
+        self._thread = threading.Thread(target=self._run, name='watermark_eviction_worker', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake_up.wait()
+            self._wake_up.clear()
+            if self._stopped:
+                return
+            try:
+                self._evict_to_low_watermark()
+            except Exception:
+                self.logger.exception('Background eviction failed.')
+
+    def _evict_to_low_watermark(self):
+        while not self._stopped:
+            # take the lock per batch so requests can interleave with a long eviction run
+            with self.lock:
+                excess = self.cache.size() - self.low_watermark
+                if excess <= 0:
+                    return
+                evicted = self.evict_batch(min(excess, self.batch_size))
+            if evicted == 0:
+                self.logger.error('Background eviction made no progress.')
+                return
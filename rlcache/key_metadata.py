@@ -0,0 +1,122 @@
+import random
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class KeyMetadataTable(object):
+    """
+    Metadata of every cached key, maintained once by the CacheManager and read by all the strategies.
+
+    Built-in columns: insert_time, ttl, hit_count, last_access, size (shallow size of the cached values in bytes) and
+    flags (a bit field left to the strategies). Strategies register the columns only they need with
+    `register_column` and fill them in when they observe the Write. Rows are kept dense: removing a key
+    moves the last row into its place, so the cached keys are rows [0, len) and can be sampled uniformly in O(1).
+
+    The manager inserts a key's row before observers see its Write. When the entry ends the row is removed and handed
+    to the observers of the Invalidate, Expiration or EvictionPolicy as info['metadata'], so they read the metadata of
+    the entry that ended even when they observe it later, after the key was cached again.
+    """
+    _BUILT_IN_COLUMNS = {'insert_time': 'float64',
+                         'ttl': 'float64',
+                         'hit_count': 'int64',
+                         'last_access': 'float64',
+                         'size': 'int64',
+                         'flags': 'uint8'}
+
+    def __init__(self, initial_capacity: int = 1024, seed: Optional[int] = None):
+        self._capacity = max(initial_capacity, 1)
+        self.columns = {}  # type: Dict[str, np.ndarray]
+        self._defaults = {}  # type: Dict[str, any]
+        for name, dtype in self._BUILT_IN_COLUMNS.items():
+            self.register_column(name, dtype)
+        self.keys = []  # type: List[str]
+        self._key_to_row = {}  # type: Dict[str, int]
+        self._random = random.Random(seed)
+
+    def register_column(self, name: str, dtype: str = 'float64', default=0) -> None:
+        """Add a strategy specific column. Registering an existing column is a no-op, strategies may share one."""
+        if name in self.columns:
+            return
+        self.columns[name] = np.full(self._capacity, default, dtype=dtype)
+        self._defaults[name] = default
+
+    def insert(self, key: str, ttl: float, size: int, now: float) -> int:
+        """Start the metadata of a newly cached entry, every column back at its default. Returns the key's row."""
+        row = self._key_to_row.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == self._capacity:
+                self._grow()
+            self._key_to_row[key] = row
+            self.keys.append(key)
+        for name, column in self.columns.items():
+            column[row] = self._defaults[name]
+        self.columns['insert_time'][row] = now
+        self.columns['last_access'][row] = now
+        self.columns['ttl'][row] = ttl
+        self.columns['size'][row] = size
+        return row
+
+    def hit(self, key: str, now: float) -> None:
+        row = self._key_to_row.get(key)
+        if row is not None:
+            self.columns['hit_count'][row] += 1
+            self.columns['last_access'][row] = now
+
+    def remove(self, key: str) -> Optional[Dict[str, any]]:
+        """Drop the key's row, returns it as a dict of column name -> value, None if the key had no row."""
+        row = self._key_to_row.pop(key, None)
+        if row is None:
+            return None
+        removed = {name: column[row].item() for name, column in self.columns.items()}
+        last_key = self.keys.pop()
+        if row < len(self.keys):
+            last_row = len(self.keys)
+            for column in self.columns.values():
+                column[row] = column[last_row]
+            self.keys[row] = last_key
+            self._key_to_row[last_key] = row
+        return removed
+
+    def row(self, key: str) -> Optional[int]:
+        return self._key_to_row.get(key)
+
+    def rows(self, keys: List[str]) -> np.ndarray:
+        return np.fromiter((self._key_to_row[key] for key in keys), dtype='int64', count=len(keys))
+
+    def get(self, key: str, name: str, default=None):
+        row = self._key_to_row.get(key)
+        if row is None:
+            return default
+        return self.columns[name][row].item()
+
+    def set(self, key: str, name: str, value) -> None:
+        self.columns[name][self._key_to_row[key]] = value
+
+    def column(self, name: str) -> np.ndarray:
+        """The column of every cached key, row i belongs to self.keys[i]. Not a copy, don't hold on to it."""
+        return self.columns[name][:len(self.keys)]
+
+    def sample(self, k: int) -> List[str]:
+        """Draw up to k distinct cached keys uniformly at random."""
+        if k >= len(self.keys):
+            return list(self.keys)
+        return self._random.sample(self.keys, k)
+
+    def clear(self) -> None:
+        self.keys.clear()
+        self._key_to_row.clear()
+
+    def _grow(self):
+        for name, column in self.columns.items():
+            grown = np.full(self._capacity * 2, self._defaults[name], dtype=column.dtype)
+            grown[:self._capacity] = column
+            self.columns[name] = grown
+        self._capacity *= 2
+
+    def __contains__(self, key):
+        return key in self._key_to_row
+
+    def __len__(self):
+        return len(self.keys)
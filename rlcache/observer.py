@@ -1,9 +1,11 @@
+import json
+import os
 from abc import ABC
 from enum import Enum
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 from rlcache.cache_constants import CacheInformation
-from rlcache.utils.loggers import create_file_logger
+from rlcache.utils.event_log import END_OF_EPISODE_COLUMNS, EVALUATION_COLUMNS, create_event_log
 
 
 class ObservationType(Enum):
@@ -19,6 +21,10 @@ class ObservationType(Enum):
     DeleteNotInCache = 9
 
 
+# (key, observation type, info)
+Observation = Tuple[str, ObservationType, Dict[str, any]]
+
+
 class Observer(ABC):
     def __init__(self):
         self.supported_observations = {}
@@ -26,27 +32,76 @@ class Observer(ABC):
     def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
         raise NotImplementedError
 
+    def observe_many(self, observations: List[Observation]):
+        """Observations in the order they happened, all of a supported type. Override to handle them together."""
+        for key, observation_type, info in observations:
+            self.observe(key, observation_type, info)
+
 
 class ObserversOrchestrator(object):
+    """
+    Dispatches the cache's observations to the observers supporting them.
+
+    The dispatch table is built once, when the observers are registered, so their supported_observations must be
+    final by then (strategies set them in __init__).
+    """
+
     def __init__(self, observers: List[Observer], results_dir: str, cache_stats: CacheInformation):
         self.observers = observers
         self.episode_num = 0
         self.cache_stats = cache_stats
-        self.evaluation_logger = create_file_logger(result_dir=results_dir, name='evaluation_logger')
-        self.end_of_episode_logger = create_file_logger(result_dir=results_dir, name='end_of_episode_logger')
+        self.metrics_path = os.path.join(results_dir, 'metrics.jsonl')
+        self.evaluation_logger = create_event_log('evaluation_logger', results_dir, EVALUATION_COLUMNS,
+                                                  cache_stats.event_log_settings)
+        self.end_of_episode_logger = create_event_log('end_of_episode_logger', results_dir, END_OF_EPISODE_COLUMNS,
+                                                      cache_stats.event_log_settings)
+        # observation type -> bound observe methods of the observers supporting it
+        self._dispatch = {observation_type: tuple(observer.observe for observer in observers
+                                                  if observation_type in observer.supported_observations)
+                          for observation_type in ObservationType}
+        self._supported = [(observer, frozenset(observer.supported_observations)) for observer in observers]
+        # Writes aren't evaluated
+        self._logged_names = {observation_type: observation_type.name for observation_type in ObservationType
+                              if observation_type != ObservationType.Write}
 
     def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any] = None):
-        if observation_type != ObservationType.Write:
-            self.evaluation_logger.info(f'{key},{observation_type.name},{self.episode_num}')
+        self._log(key, observation_type)
+        for observe in self._dispatch[observation_type]:
+            observe(key, observation_type, info)
+
+    def observe_many(self, observations: List[Observation]):
+        """Dispatch a sequence of observations, each observer gets the ones it supports, in order, in one call."""
+        for key, observation_type, _ in observations:
+            self._log(key, observation_type)
+        observed_types = {observation_type for _, observation_type, _ in observations}
+        for observer, supported in self._supported:
+            if observed_types <= supported:
+                observer.observe_many(observations)
+            elif not observed_types.isdisjoint(supported):
+                observer.observe_many([observation for observation in observations if observation[1] in supported])
+
+    def settle(self, key: str):
+        """Called before a decision on the key, every observation of the key so far must have been delivered."""
+        pass
+
+    def flush(self):
+        """Deliver every observation so far."""
+        pass
 
-        for observer in self.observers:
-            # if observation_type in {ObservationType.SetNotInCache, ObservationType.DeleteNotInCache}:
-            #     # TODO refactor the strategies to handle this
-            #     observation_type = ObservationType.Invalidate
+    def stop(self):
+        """Stop delivering in the background, a no-op unless observations are delivered asynchronously."""
+        pass
 
-            if observation_type in observer.supported_observations:
-                observer.observe(key=key, observation_type=observation_type, info=info)
+    def _log(self, key: str, observation_type: ObservationType):
+        name = self._logged_names.get(observation_type)
+        if name is not None:
+            self.evaluation_logger.log(key, name, self.episode_num)
 
     def close(self):
-        self.end_of_episode_logger.info(f'{self.episode_num},{self.cache_stats.to_log()}')
+        self.end_of_episode_logger.log(self.episode_num, *self.cache_stats.to_record())
+        # the episode's aggregates, available even with the event logs disabled
+        metrics = {'episode': self.episode_num, **self.cache_stats.metrics()}
+        self.cache_stats.episode_metrics.append(metrics)
+        with open(self.metrics_path, 'a') as fp:
+            fp.write(json.dumps(metrics) + '\n')
         self.episode_num += 1
@@ -0,0 +1,162 @@
+"""
+Offline pretraining of the RL strategies from a recorded request trace.
+
+The trace is replayed through a CacheManager under a simulated clock, the experiences the RL strategies complete
+are recorded to <results_dir>/<strategy>/experiences, then every agent is batch-trained from its dataset and
+checkpointed. Start the server from the result with `load_checkpoint: <results_dir>/<strategy>` in the strategy
+settings.
+
+Trace: csv lines of `timestamp,operation,key`, timestamps in seconds and operations one of get, set, delete.
+
+Usage (from the repository root):
+    python -m rlcache.offline_trainer --config configs/rl_all_strategy.json --trace trace.csv
+"""
+import argparse
+import copy
+import csv
+import json
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import time
+
+from rlcache.backend import storage_from_config
+from rlcache.backend.base import Storage
+from rlcache.cache_manager import CacheManager
+from rlcache.rl_model.experience_dataset import load_experiences
+from rlcache.strategies.base_strategy import BaseStrategy
+from rlcache.strategies.caching_strategies.rl_caching_strategy import RLCachingStrategy
+from rlcache.strategies.eviction_strategies.rl_eviction_strategy import RLEvictionStrategy
+from rlcache.strategies.multi_task.rl_multi_task_cache_strategy import RLMultiTasksStrategy
+from rlcache.strategies.ttl_estimation_strategies.rl_ttl_strategy import RLTtlStrategy
+from rlcache.utils import clock
+from rlcache.utils.clock import SimulatedClock
+
+_RL_STRATEGIES = (RLCachingStrategy, RLEvictionStrategy, RLTtlStrategy, RLMultiTasksStrategy)
+
+
+def read_trace(path: str) -> Iterator[Tuple[float, str, str]]:
+    with open(path, 'r') as fp:
+        for row in csv.reader(fp):
+            if len(row) == 0 or row[0] == 'timestamp':
+                continue  # blank line or header
+            timestamp, operation, key = row
+            yield float(timestamp), operation, key
+
+
+def replay_trace(manager: CacheManager,
+                 backend: Storage,
+                 trace: Iterator[Tuple[float, str, str]],
+                 simulated_clock: SimulatedClock) -> int:
+    requests = 0
+    for timestamp, operation, key in trace:
+        simulated_clock.advance_to(timestamp)
+        if operation == 'get':
+            if not backend.contains(key):
+                backend.set(key, {'key': key})  # the trace only says the key exists
+            manager.get(key)
+        elif operation == 'set':
+            values = {'key': key, 'timestamp': timestamp}
+            backend.set(key, values)
+            manager.set(key, values)
+        elif operation == 'delete':
+            backend.delete(key)
+            manager.delete(key)
+        else:
+            raise ValueError(f'Unknown trace operation: {operation}')
+        requests += 1
+    return requests
+
+
+def rl_strategies(manager: CacheManager) -> List[BaseStrategy]:
+    """The manager's RL strategies, the multi task strategy once."""
+    strategies = []
+    for strategy in [manager.caching_strategy, manager.eviction_strategy, manager.ttl_strategy]:
+        if isinstance(strategy, _RL_STRATEGIES) and strategy not in strategies:
+            strategies.append(strategy)
+    return strategies
+
+
+def train_strategy(strategy: BaseStrategy, epochs: int, batch_size: int, random_state: np.random.RandomState) -> int:
+    """Batch-train the strategy's agent on its recorded experiences, returns the number of experiences."""
+    learner = strategy.learner
+    learner.recorder.close()
+    if learner.recorder.experiences_written == 0:
+        return 0
+    experiences = load_experiences(learner.recorder.directory)
+    size = len(experiences['rewards'])
+    for epoch in range(epochs):
+        order = random_state.permutation(size)
+        for start in range(0, size, batch_size):
+            learner.train_on_batch(_take(experiences, order[start:start + batch_size]), episode_num=epoch)
+    return size
+
+
+def _take(experiences: Dict[str, any], rows: np.ndarray) -> Dict[str, any]:
+    return {name: ({component: values[rows] for component, values in column.items()}
+                   if isinstance(column, dict) else column[rows])
+            for name, column in experiences.items()}
+
+
+def pretrain(config: Dict[str, any],
+             trace_path: str,
+             results_dir: str,
+             epochs: int,
+             batch_size: int,
+             seed: int = 0) -> List[str]:
+    """Replay, record and train, returns the strategy result dirs to use as load_checkpoint."""
+    manager_config = copy.deepcopy(config['cache_manager_settings'])
+    for section, settings in manager_config.items():
+        if section == 'multi_strategy_settings' or (isinstance(settings, dict) and settings.get('type') == 'rl_driven'):
+            settings['record_experiences'] = os.path.join(results_dir, section[:-len('_settings')], 'experiences')
+
+    simulated_clock = SimulatedClock()
+    previous_clock = clock.set_clock(simulated_clock)
+    try:
+        backend = storage_from_config(config['database_backend_settings'])
+        cache = storage_from_config(config['cache_backend_settings'])
+        manager = CacheManager(manager_config, cache, backend, results_dir)
+        requests = replay_trace(manager, backend, read_trace(trace_path), simulated_clock)
+        print(f'Replayed {requests} requests: {manager.stats()}')
+        strategies = rl_strategies(manager)
+        manager.close()
+    finally:
+        clock.set_clock(previous_clock)
+
+    random_state = np.random.RandomState(seed)
+    checkpoints = []
+    for strategy in strategies:
+        start = time.perf_counter()
+        size = train_strategy(strategy, epochs, batch_size, random_state)
+        if size == 0:
+            print(f'{type(strategy).__name__}: the trace completed no experiences, nothing to train on.')
+            continue
+        strategy.checkpoint.save(strategy.policy, strategy.key_encoder)
+        checkpoints.append(strategy.result_dir)
+        print(f'{type(strategy).__name__}: trained on {size} experiences for {epochs} epochs in '
+              f'{time.perf_counter() - start:.1f}s, checkpoint in {strategy.checkpoint.directory}')
+    return checkpoints
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', required=True)
+    parser.add_argument('--trace', required=True)
+    parser.add_argument('--results_dir')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch_size', type=int, default=512)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as fp:
+        config = json.load(fp)
+    results_dir = args.results_dir or f"results/{config['experiment_name']}/offline/{time.strftime('%Y_%m_%d_%H_%M')}"
+    os.makedirs(results_dir, exist_ok=True)
+
+    for checkpoint in pretrain(config, args.trace, results_dir, args.epochs, args.batch_size, args.seed):
+        print(f'load_checkpoint: {checkpoint}')
+
+
+if __name__ == '__main__':
+    main()
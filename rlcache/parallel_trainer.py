@@ -0,0 +1,239 @@
+"""
+Ape-X style parallel pretraining of the RL strategies from a recorded request trace.
+
+`--actors` worker processes each replay a shard of the trace (by key hash or by time window) against their own
+CacheManager under a simulated clock. Their completed experiences are streamed through shared memory to this process,
+the learner, which owns the agents, trains on every block as it arrives and every `--sync_every_updates` updates
+sends the new weights to the actors. Actors pick them up every `--sync_every_requests` replayed requests. The trained
+agents are checkpointed under <results_dir>/learner/<strategy>, use that dir as `load_checkpoint`.
+
+Actors and learner encode keys independently, so only the (default) hashing key encoding is supported.
+
+Usage (from the repository root):
+    python -m rlcache.parallel_trainer --config configs/rl_all_strategy.json --trace trace.csv --actors 4
+"""
+import argparse
+import copy
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import zlib
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+import time
+
+from rlcache.backend import storage_from_config
+from rlcache.cache_manager import CacheManager
+from rlcache.offline_trainer import read_trace, replay_trace, rl_strategies
+from rlcache.rl_model.experience_stream import SharedMemoryExperienceStream, read_experience_block
+from rlcache.strategies.base_strategy import BaseStrategy
+from rlcache.utils import clock
+from rlcache.utils.clock import SimulatedClock
+
+
+def _rl_settings(manager_config: Dict[str, any]) -> List[Dict[str, any]]:
+    return [settings for section, settings in manager_config.items()
+            if section == 'multi_strategy_settings' or (isinstance(settings, dict)
+                                                        and settings.get('type') == 'rl_driven')]
+
+
+def _manager_config(config: Dict[str, any]) -> Dict[str, any]:
+    manager_config = copy.deepcopy(config['cache_manager_settings'])
+    for settings in _rl_settings(manager_config):
+        # experiences leave the process, the actors don't train
+        settings['async_learner'] = False
+        settings.pop('record_experiences', None)
+    return manager_config
+
+
+def shard_trace(path: str, index: int, num_actors: int, shard_by: str, span: Tuple[float, float] = None) \
+        -> Iterator[Tuple[float, str, str]]:
+    """Records of the actor `index`: keys hashing to it, or its time window of `span` (first, last timestamp)."""
+    if shard_by == 'key':
+        for record in read_trace(path):
+            if zlib.crc32(record[2].encode('utf-8')) % num_actors == index:
+                yield record
+    elif shard_by == 'time':
+        first, last = span
+        window = (last - first) / num_actors
+        start = first + index * window
+        for record in read_trace(path):
+            # the last actor takes the last timestamp too
+            if start <= record[0] < start + window or (index == num_actors - 1 and record[0] == last):
+                yield record
+    else:
+        raise ValueError(f'Unknown shard_by: {shard_by}')
+
+
+def trace_span(path: str) -> Tuple[float, float]:
+    timestamps = [record[0] for record in read_trace(path)]
+    return min(timestamps), max(timestamps)
+
+
+def run_actor(index: int,
+              num_actors: int,
+              config: Dict[str, any],
+              trace_path: str,
+              shard_by: str,
+              span: Tuple[float, float],
+              results_dir: str,
+              experience_queue,
+              weights_queue,
+              block_rows: int,
+              sync_every_requests: int):
+    simulated_clock = SimulatedClock()
+    clock.set_clock(simulated_clock)
+    backend = storage_from_config(config['database_backend_settings'])
+    cache = storage_from_config(config['cache_backend_settings'])
+    manager = CacheManager(_manager_config(config), cache, backend, os.path.join(results_dir, f'actor_{index}'))
+    strategies = {strategy.checkpoint.name: strategy for strategy in rl_strategies(manager)}
+    for name, strategy in strategies.items():
+        strategy.learner.recorder = SharedMemoryExperienceStream(name, experience_queue, block_rows)
+
+    trace = shard_trace(trace_path, index, num_actors, shard_by, span)
+    while True:
+        _sync_weights(strategies, weights_queue)
+        if replay_trace(manager, backend, itertools.islice(trace, sync_every_requests), simulated_clock) == 0:
+            break
+
+    exploration = {name: (strategy.policy.decisions, getattr(strategy.learner.serving_agent, 'timesteps', 0))
+                   for name, strategy in strategies.items()}
+    manager.close()
+    for strategy in strategies.values():
+        strategy.learner.recorder.close()
+    experience_queue.put(('done', index, exploration))
+
+
+def _sync_weights(strategies: Dict[str, BaseStrategy], weights_queue):
+    latest = None
+    while True:
+        try:
+            latest = weights_queue.get_nowait()
+        except queue.Empty:
+            break
+    if latest is not None:
+        for name, weights in latest.items():
+            strategies[name].learner.set_weights(weights)
+
+
+def _publish_weights(strategies: Dict[str, BaseStrategy], weights_queues: list):
+    weights = {name: strategy.learner.get_weights() for name, strategy in strategies.items()}
+    for weights_queue in weights_queues:
+        try:
+            weights_queue.put_nowait(weights)
+        except queue.Full:
+            pass  # the actor hasn't picked up the previous weights yet, it gets these next time
+
+
+def train_parallel(config: Dict[str, any],
+                   trace_path: str,
+                   results_dir: str,
+                   num_actors: int,
+                   shard_by: str = 'key',
+                   block_rows: int = 512,
+                   sync_every_updates: int = 10,
+                   sync_every_requests: int = 1000) -> List[str]:
+    """Run the actors and the learner, returns the strategy result dirs to use as load_checkpoint."""
+    manager_config = _manager_config(config)
+    for settings in _rl_settings(manager_config):
+        if settings.get('key_encoding', {}).get('type', 'hashing') != 'hashing':
+            raise ValueError('Parallel training needs the hashing key encoding, actors encode keys independently.')
+
+    learner_manager = CacheManager(manager_config,
+                                   storage_from_config(config['cache_backend_settings']),
+                                   storage_from_config(config['database_backend_settings']),
+                                   os.path.join(results_dir, 'learner'))
+    strategies = {strategy.checkpoint.name: strategy for strategy in rl_strategies(learner_manager)}
+
+    context = multiprocessing.get_context('spawn')
+    experience_queue = context.Queue(maxsize=4 * num_actors)
+    weights_queues = [context.Queue(maxsize=1) for _ in range(num_actors)]
+    # every actor starts from the learner's weights
+    _publish_weights(strategies, weights_queues)
+    span = trace_span(trace_path) if shard_by == 'time' else None
+    actors = [context.Process(target=run_actor,
+                              name=f'actor_{index}',
+                              args=(index, num_actors, config, trace_path, shard_by, span, results_dir,
+                                    experience_queue, weights_queues[index], block_rows, sync_every_requests),
+                              daemon=True)
+              for index in range(num_actors)]
+    for actor in actors:
+        actor.start()
+
+    start = time.perf_counter()
+    finished, updates, experiences = 0, 0, Counter()
+    decisions, timesteps = Counter(), Counter()
+    while finished < num_actors:
+        try:
+            message = experience_queue.get(timeout=1.0)
+        except queue.Empty:
+            failed = [actor.name for actor in actors if actor.exitcode not in (None, 0)]
+            if failed:
+                raise RuntimeError(f'Actors failed: {failed}')
+            continue
+
+        if message[0] == 'done':
+            finished += 1
+            for name, (actor_decisions, actor_timesteps) in message[2].items():
+                decisions[name] += actor_decisions
+                timesteps[name] += actor_timesteps
+            continue
+
+        _, name, block_name, layout = message
+        batch = read_experience_block(block_name, layout)
+        strategies[name].learner.train_on_batch(batch)
+        experiences[name] += len(batch['rewards'])
+        updates += 1
+        if updates % sync_every_updates == 0:
+            _publish_weights(strategies, weights_queues)
+
+    for actor in actors:
+        actor.join()
+    for weights_queue in weights_queues:
+        weights_queue.cancel_join_thread()  # weights published after an actor's last sync are never read
+
+    checkpoints = []
+    for name, strategy in strategies.items():
+        if experiences[name] == 0:
+            print(f'{name}: the trace completed no experiences, nothing to train on.')
+            continue
+        # exploration carries on from where the actors, together, left it
+        strategy.policy.decisions = decisions[name]
+        if hasattr(strategy.learner.training_agent, 'timesteps'):
+            strategy.learner.training_agent.timesteps = timesteps[name]
+        strategy.checkpoint.save(strategy.policy, strategy.key_encoder)
+        checkpoints.append(strategy.result_dir)
+        print(f'{name}: trained on {experiences[name]} experiences from {num_actors} actors, '
+              f'checkpoint in {strategy.checkpoint.directory}')
+    learner_manager.close()
+    print(f'{updates} updates in {time.perf_counter() - start:.1f}s')
+    return checkpoints
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', required=True)
+    parser.add_argument('--trace', required=True)
+    parser.add_argument('--results_dir')
+    parser.add_argument('--actors', type=int, default=max(os.cpu_count() - 1, 1))
+    parser.add_argument('--shard_by', choices=['key', 'time'], default='key')
+    parser.add_argument('--block_rows', type=int, default=512)
+    parser.add_argument('--sync_every_updates', type=int, default=10)
+    parser.add_argument('--sync_every_requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as fp:
+        config = json.load(fp)
+    results_dir = args.results_dir or f"results/{config['experiment_name']}/parallel/{time.strftime('%Y_%m_%d_%H_%M')}"
+    os.makedirs(results_dir, exist_ok=True)
+
+    for checkpoint in train_parallel(config, args.trace, results_dir, args.actors, args.shard_by, args.block_rows,
+                                     args.sync_every_updates, args.sync_every_requests):
+        print(f'load_checkpoint: {checkpoint}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import copy
 import dataclasses
 from abc import ABC
+from typing import List
 
 import numpy as np
 
@@ -15,5 +16,10 @@ class AgentSystemState(ABC):
     def from_numpy(cls, encoded: np.ndarray):
         raise NotImplementedError
 
+    @classmethod
+    def field_names(cls) -> List[str]:
+        """State fields in to_numpy order."""
+        return [field.name for field in dataclasses.fields(cls)]
+
     def copy(self):
         return copy.deepcopy(self)
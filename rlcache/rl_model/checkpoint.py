@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+import pickle
+from typing import Dict
+
+from rlcache.rl_model.policy import AgentPolicy
+from rlcache.utils.key_encoder import KeyEncoder
+
+
+class StrategyCheckpoint(object):
+    """
+    Persists what an RL strategy needs to carry on where it stopped: the agent weights, how far exploration got
+    and the key encoder, under <result_dir>/checkpoints/<name>.
+
+    `load_checkpoint` is the strategy result dir of an earlier run to restore from, e.g.
+    results/<run>/caching_strategy. `inference_only` serves a frozen restored policy, nothing is saved then since
+    nothing is learned.
+    """
+
+    def __init__(self, config: Dict[str, any], result_dir: str, name: str):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.directory = os.path.join(result_dir, 'checkpoints', name)
+        load_checkpoint = config.get('load_checkpoint')
+        self.load_directory = os.path.join(load_checkpoint, 'checkpoints', name) if load_checkpoint else None
+        self.inference_only = config.get('inference_only', False)
+        if self.inference_only and self.load_directory is None:
+            raise ValueError(f'{name}: inference_only needs a trained policy, set load_checkpoint.')
+
+    def save(self, policy: AgentPolicy, key_encoder: KeyEncoder) -> None:
+        if self.inference_only:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'weights.pkl'), 'wb') as fp:
+            pickle.dump(policy.learner.get_weights(), fp)
+        with open(os.path.join(self.directory, 'key_encoder.pkl'), 'wb') as fp:
+            pickle.dump(key_encoder.get_state(), fp)
+        with open(os.path.join(self.directory, 'exploration.json'), 'w') as fp:
+            json.dump({'decisions': policy.decisions,
+                       'timesteps': getattr(policy.learner.serving_agent, 'timesteps', 0)}, fp)
+
+    def restore(self, policy: AgentPolicy, key_encoder: KeyEncoder) -> bool:
+        if self.load_directory is None:
+            return False
+
+        with open(os.path.join(self.load_directory, 'weights.pkl'), 'rb') as fp:
+            policy.learner.set_weights(pickle.load(fp))
+        with open(os.path.join(self.load_directory, 'key_encoder.pkl'), 'rb') as fp:
+            key_encoder.restore_state(pickle.load(fp), self.load_directory)
+        with open(os.path.join(self.load_directory, 'exploration.json'), 'r') as fp:
+            exploration = json.load(fp)
+
+        policy.decisions = exploration['decisions']
+        for agent in {policy.learner.serving_agent, policy.learner.training_agent}:
+            if hasattr(agent, 'timesteps'):
+                agent.timesteps = exploration['timesteps']
+
+        self.logger.info(f'Restored checkpoint {self.load_directory} after {policy.decisions} decisions.')
+        return True
@@ -0,0 +1,39 @@
+from collections import defaultdict
+from typing import Callable, Dict
+
+import numpy as np
+
+
+class CompletionBuffer(object):
+    """
+    Completed experiences waiting to be rewarded and observed by the agent.
+
+    Experiences are added column by column and handed to `flush_batch` as {column: stacked array} once
+    `batch_size` of them are buffered, so rewards can be computed with NumPy over the batch and the agent observes
+    one multi-row batch. A batch size of 1 hands every experience over as it completes.
+    """
+
+    def __init__(self, batch_size: int, flush_batch: Callable[[Dict[str, np.ndarray]], None]):
+        self.batch_size = batch_size
+        self.flush_batch = flush_batch
+        self._columns = defaultdict(list)
+        self._size = 0
+
+    def add(self, **columns) -> None:
+        for name, value in columns.items():
+            self._columns[name].append(value)
+        self._size += 1
+        if self._size >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand over whatever is buffered, e.g. at the end of an episode."""
+        if self._size == 0:
+            return
+        batch = {name: np.stack(values) for name, values in self._columns.items()}
+        self._columns.clear()
+        self._size = 0
+        self.flush_batch(batch)
+
+    def __len__(self):
+        return self._size
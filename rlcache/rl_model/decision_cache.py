@@ -0,0 +1,68 @@
+import copy
+from collections import OrderedDict
+from typing import Dict
+
+import numpy as np
+
+
+class DecisionCache(object):
+    """
+    LRU memo of greedy actions keyed by the quantized agent state.
+
+    Every field is bucketed by `decision_cache_bucket_width`. The key field (column `key_column`) is handled by
+    `decision_cache_encoded_key`: 'exclude' drops it, 'bucket' folds it into `decision_cache_key_buckets` buckets,
+    'keep' treats it like any other field. Entries belong to one policy version, the cache empties itself when it
+    is asked about another one.
+    """
+
+    def __init__(self, config: Dict[str, any], key_column: int = 0):
+        self.capacity = config.get('decision_cache_size', 10000)
+        self.bucket_width = config.get('decision_cache_bucket_width', 1.0)
+        self.encoded_key = config.get('decision_cache_encoded_key', 'exclude')
+        self.key_buckets = config.get('decision_cache_key_buckets', 64)
+        assert self.encoded_key in {'exclude', 'bucket', 'keep'}, \
+            f'Unknown decision_cache_encoded_key: {self.encoded_key}'
+        self.key_column = key_column
+
+        self._actions = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    def bucket(self, state: np.ndarray) -> bytes:
+        buckets = np.floor(np.asarray(state, dtype='float64') / self.bucket_width).astype('int64')
+        if self.encoded_key == 'exclude':
+            buckets = np.delete(buckets, self.key_column)
+        elif self.encoded_key == 'bucket':
+            buckets[self.key_column] = int(state[self.key_column]) % self.key_buckets
+        return buckets.tobytes()
+
+    def get(self, state: np.ndarray, version: int):
+        self._check_version(version)
+        bucket = self.bucket(state)
+        action = self._actions.get(bucket)
+        if action is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._actions.move_to_end(bucket)
+        # callers are free to modify the action they get, e.g. the multi task strategy updates its eviction part
+        return copy.copy(action)
+
+    def set(self, state: np.ndarray, version: int, action) -> None:
+        self._check_version(version)
+        self._actions[self.bucket(state)] = copy.copy(action)
+        if len(self._actions) > self.capacity:
+            self._actions.popitem(last=False)
+
+    def _check_version(self, version: int):
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def clear(self) -> None:
+        self._actions.clear()
+
+    def __len__(self):
+        return len(self._actions)
@@ -0,0 +1,94 @@
+import glob
+import os
+from collections import defaultdict
+from typing import Dict
+
+import numpy as np
+
+_ACTION_PREFIX = 'actions/'
+
+
+class ExperienceWriter(object):
+    """
+    Records completed (state, action, reward, next_state, terminal) experiences into a directory of .npz chunks.
+
+    States are stored as float32 and rewards as float32, one row per experience. Dict actions (multi task agent) get
+    one column per component. A chunk is written every `chunk_size` rows and on `close`.
+    """
+
+    def __init__(self, directory: str, chunk_size: int = 100000):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+        self._columns = defaultdict(list)
+        self._rows = 0
+        self._chunks = len(glob.glob(os.path.join(directory, 'chunk_*.npz')))
+        self.experiences_written = 0
+
+    def append(self, states, actions, rewards, next_states, terminals) -> None:
+        """Takes what AgentLearner.observe takes, a single experience or a batch of them."""
+        columns = experience_columns(states, actions, rewards, next_states, terminals)
+        for name, column in columns.items():
+            self._columns[name].append(column)
+        self._rows += len(columns['rewards'])
+        if self._rows >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._rows == 0:
+            return
+        chunk = {name: np.concatenate(values) for name, values in self._columns.items()}
+        np.savez(os.path.join(self.directory, f'chunk_{self._chunks:05d}.npz'), **chunk)
+        self._chunks += 1
+        self.experiences_written += self._rows
+        self._columns.clear()
+        self._rows = 0
+
+    def close(self) -> None:
+        self.flush()
+
+
+def experience_columns(states, actions, rewards, next_states, terminals) -> Dict[str, np.ndarray]:
+    """
+    A single experience or a batch of them (as handed to AgentLearner.observe) as columns with one row per
+    experience: float32 states and rewards, bool terminals and an `actions/<component>` column per action component.
+    """
+    single = np.ndim(states) == 1
+    states = np.atleast_2d(np.asarray(states, dtype='float32'))
+    rows = len(states)
+
+    columns = {'states': states,
+               'next_states': np.atleast_2d(np.asarray(next_states, dtype='float32')),
+               'rewards': np.broadcast_to(np.asarray(rewards, dtype='float32').reshape(-1), (rows,)),
+               'terminals': np.broadcast_to(np.asarray(terminals, dtype=bool).reshape(-1), (rows,))}
+    action_components = actions.items() if isinstance(actions, dict) else [('action', actions)]
+    for name, action in action_components:
+        action = np.asarray(action)
+        # a single experience's action has the agent's action shape, batched ones have an extra leading axis
+        columns[_ACTION_PREFIX + name] = action.reshape((1,) + action.shape) if single else action
+    return columns
+
+
+def columns_to_experiences(columns: Dict[str, np.ndarray]) -> Dict[str, any]:
+    """Inverse of `experience_columns`: {states, actions, rewards, next_states, terminals}, dict actions as a dict."""
+    experiences = {name: column for name, column in columns.items() if not name.startswith(_ACTION_PREFIX)}
+    actions = {name[len(_ACTION_PREFIX):]: column for name, column in columns.items()
+               if name.startswith(_ACTION_PREFIX)}
+    experiences['actions'] = actions['action'] if list(actions) == ['action'] else actions
+    return experiences
+
+
+def load_experiences(directory: str) -> Dict[str, any]:
+    """
+    All experiences recorded in `directory` as {states, actions, rewards, next_states, terminals} arrays, actions
+    being a dict of arrays for dict action spaces.
+    """
+    columns = defaultdict(list)
+    for path in sorted(glob.glob(os.path.join(directory, 'chunk_*.npz'))):
+        with np.load(path) as chunk:
+            for name in chunk.files:
+                columns[name].append(chunk[name])
+    if len(columns) == 0:
+        raise FileNotFoundError(f'No recorded experiences in {directory}')
+
+    return columns_to_experiences({name: np.concatenate(values) for name, values in columns.items()})
@@ -0,0 +1,70 @@
+from collections import defaultdict
+from multiprocessing import shared_memory
+from typing import Dict, Tuple
+
+import numpy as np
+
+from rlcache.rl_model.experience_dataset import columns_to_experiences, experience_columns
+
+
+class SharedMemoryExperienceStream(object):
+    """
+    Actor side of the parallel trainer, a drop-in for AgentLearner.recorder.
+
+    Experiences are packed column after column into a shared memory block every `block_rows` rows, the queue only
+    carries ('block', stream name, block name, layout). The receiving learner copies the block out and unlinks it,
+    see `read_experience_block`. A bounded queue makes actors wait for a learner that falls behind.
+    """
+
+    def __init__(self, name: str, queue, block_rows: int = 512):
+        self.name = name
+        self.queue = queue
+        self.block_rows = block_rows
+        self._columns = defaultdict(list)
+        self._rows = 0
+        self.experiences_sent = 0
+
+    def append(self, states, actions, rewards, next_states, terminals) -> None:
+        columns = experience_columns(states, actions, rewards, next_states, terminals)
+        for name, column in columns.items():
+            self._columns[name].append(column)
+        self._rows += len(columns['rewards'])
+        if self._rows >= self.block_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._rows == 0:
+            return
+        columns = {name: np.ascontiguousarray(np.concatenate(values)) for name, values in self._columns.items()}
+        layout = []  # (column, byte offset, shape, dtype)
+        offset = 0
+        for name, column in columns.items():
+            layout.append((name, offset, column.shape, column.dtype.str))
+            offset += column.nbytes
+
+        block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for (name, column_offset, shape, dtype), column in zip(layout, columns.values()):
+            block.buf[column_offset:column_offset + column.nbytes] = column.tobytes()
+        block_name = block.name
+        block.close()  # the learner unlinks it once read
+        self.queue.put(('block', self.name, block_name, layout))
+
+        self.experiences_sent += self._rows
+        self._columns.clear()
+        self._rows = 0
+
+    def close(self) -> None:
+        self.flush()
+
+
+def read_experience_block(block_name: str, layout) -> Dict[str, any]:
+    """Copy a block sent by a SharedMemoryExperienceStream out of shared memory and free it."""
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        columns = {}
+        for name, offset, shape, dtype in layout:  # type: Tuple[str, int, tuple, str]
+            columns[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf, offset=offset).copy()
+    finally:
+        block.close()
+        block.unlink()
+    return columns_to_experiences(columns)
@@ -0,0 +1,115 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class ExperienceTable(object):
+    """
+    Preallocated columnar store of in-flight experiences: decisions taken whose outcome hasn't been observed yet.
+
+    An experience occupies a slot, i.e. one row of every column: the current state, the state the decision was
+    taken on, one column per action component, the observation time and boolean flags. Fields are updated in place
+    and `state(slot)` is a view rather than a copy, so copy rows that outlive the slot (e.g. handed to the
+    learner). Freed slots are reused, the columns only grow (doubling) once every slot is taken.
+    """
+
+    def __init__(self,
+                 state_fields: List[str],
+                 actions: Dict[str, Tuple[tuple, str]],
+                 flags: List[str] = (),
+                 initial_capacity: int = 1024):
+        """
+        :param state_fields: names of the state fields, in the agent's state order.
+        :param actions: action component name -> (shape, dtype).
+        :param flags: names of per experience boolean markers.
+        """
+        capacity = max(initial_capacity, 1)
+        self.field_index = {name: i for i, name in enumerate(state_fields)}
+        self.states = np.zeros((capacity, len(state_fields)), dtype='float32')
+        self.starting_states = np.zeros_like(self.states)
+        self.actions = {name: np.zeros((capacity,) + tuple(shape), dtype=dtype)
+                        for name, (shape, dtype) in actions.items()}
+        self.observation_times = np.zeros(capacity, dtype='float64')
+        self.flags = {name: np.zeros(capacity, dtype=bool) for name in flags}
+
+        self._free_slots = list(range(capacity - 1, -1, -1))
+        self._in_use = 0
+
+    def make_state(self, **fields) -> np.ndarray:
+        """A standalone state row, fields not given are 0."""
+        state = np.zeros(len(self.field_index), dtype='float32')
+        for name, value in fields.items():
+            state[self.field_index[name]] = value
+        return state
+
+    def add(self, state: np.ndarray, actions: Dict[str, any], observation_time: float) -> int:
+        if len(self._free_slots) == 0:
+            self._grow()
+        slot = self._free_slots.pop()
+        self._in_use += 1
+
+        self.states[slot] = state
+        self.starting_states[slot] = state
+        for name, action in actions.items():
+            self.actions[name][slot] = np.reshape(action, self.actions[name].shape[1:])
+        self.observation_times[slot] = observation_time
+        for flag in self.flags.values():
+            flag[slot] = False
+        return slot
+
+    def free(self, slot: int) -> None:
+        self._free_slots.append(slot)
+        self._in_use -= 1
+
+    def state(self, slot: int) -> np.ndarray:
+        return self.states[slot]
+
+    def starting_state(self, slot: int) -> np.ndarray:
+        return self.starting_states[slot]
+
+    def field(self, slot: int, name: str) -> float:
+        return self.states[slot, self.field_index[name]].item()
+
+    def set_field(self, slot: int, name: str, value) -> None:
+        self.states[slot, self.field_index[name]] = value
+
+    def increment(self, slot: int, name: str, amount=1) -> None:
+        self.states[slot, self.field_index[name]] += amount
+
+    def starting_field(self, slot: int, name: str) -> float:
+        return self.starting_states[slot, self.field_index[name]].item()
+
+    def action(self, slot: int, name: str = 'action') -> np.ndarray:
+        """Copy of the action, shaped as the agent returned it."""
+        return np.array(self.actions[name][slot])
+
+    def set_action(self, slot: int, action, name: str = 'action') -> None:
+        self.actions[name][slot] = np.reshape(action, self.actions[name].shape[1:])
+
+    def flag(self, slot: int, name: str) -> bool:
+        return bool(self.flags[name][slot])
+
+    def set_flag(self, slot: int, name: str, value: bool = True) -> None:
+        self.flags[name][slot] = value
+
+    def clear(self) -> None:
+        self._free_slots = list(range(len(self.states) - 1, -1, -1))
+        self._in_use = 0
+
+    def _grow(self):
+        capacity = len(self.states)
+
+        def grown(column: np.ndarray) -> np.ndarray:
+            new_column = np.zeros((capacity * 2,) + column.shape[1:], dtype=column.dtype)
+            new_column[:capacity] = column
+            return new_column
+
+        self.states = grown(self.states)
+        self.starting_states = grown(self.starting_states)
+        self.actions = {name: grown(column) for name, column in self.actions.items()}
+        self.observation_times = grown(self.observation_times)
+        self.flags = {name: grown(column) for name, column in self.flags.items()}
+        self._free_slots.extend(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def __len__(self):
+        return self._in_use
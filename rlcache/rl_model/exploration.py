@@ -0,0 +1,17 @@
+from typing import Dict
+
+
+def exploration_epsilon(agent_config: Dict[str, any], timestep: int) -> float:
+    """The epsilon an rlgraph DQN agent configured by agent_config explores with at timestep."""
+    decay_spec = agent_config.get('exploration_spec', {}).get('epsilon_spec', {}).get('decay_spec')
+    if decay_spec is None:
+        raise ValueError('The agent config has no exploration_spec.epsilon_spec.decay_spec to follow.')
+    decay_type = decay_spec.get('type', 'linear_decay')
+    if decay_type not in {'linear_decay', 'polynomial_decay'}:
+        raise ValueError(f'Unsupported epsilon decay type: {decay_type}')
+
+    start, end = decay_spec.get('from', 1.0), decay_spec.get('to', 0.0)
+    progress = (timestep - decay_spec.get('start_timestep', 0)) / decay_spec.get('num_timesteps', 10000)
+    progress = min(max(progress, 0.0), 1.0)
+    power = 1.0 if decay_type == 'linear_decay' else decay_spec.get('power', 2.0)
+    return end + (start - end) * (1 - progress) ** power
@@ -0,0 +1,69 @@
+import random
+from typing import Dict, Optional, Tuple
+
+from rlcache.cache_constants import CacheInformation
+from rlcache.utils import clock
+from rlcache.utils.key_pool import KeyPool
+
+
+class InFlightLimiter(object):
+    """
+    Bounds the experiences a strategy keeps in flight, so their memory doesn't grow with the request rate.
+
+    An experience is force-completed once it is `max_inflight_age` seconds old (the strategy tracks it for that long
+    at most) and at most `max_inflight_experiences` are kept. Once full, decisions are admitted reservoir style: the
+    n-th decision of the current `max_inflight_age` window is admitted with probability capacity / n in place of a
+    uniformly picked in-flight experience, which is dropped. The in-flight experiences stay a uniform sample of the
+    window's decisions whatever the request rate. Decisions not learned from, rejected or dropped, are counted in
+    CacheInformation.dropped_experiences.
+    """
+
+    def __init__(self, config: Dict[str, any], name: str, cache_stats: CacheInformation, max_age: float):
+        """
+        :param max_age: default `max_inflight_age`, how long the strategy would otherwise track an experience.
+        """
+        self.name = name
+        self.cache_stats = cache_stats
+        self.max_age = min(config.get('max_inflight_age', max_age), max_age)
+        capacity = config.get('max_inflight_experiences', 100000)
+        self.capacity = capacity
+        self._keys = KeyPool(config.get('learning_sample_seed', 1))
+        self._random = random.Random(config.get('learning_sample_seed', 1))
+        self._window_start = clock.now()
+        self._window_decisions = 0
+
+    def admit(self, key: str) -> Tuple[bool, Optional[str]]:
+        """Whether to track a decision on `key`, and the in-flight key to drop to make room for it if any."""
+        self.cache_stats.offered_experiences[self.name] += 1
+        if key in self._keys:
+            return True, None  # replaces the key's in-flight experience
+
+        now = clock.now()
+        if now - self._window_start >= self.max_age:
+            self._window_start = now
+            self._window_decisions = 0
+        self._window_decisions += 1
+
+        if self.capacity is None or len(self._keys) < self.capacity:
+            self._keys.add(key)
+            return True, None
+
+        self.cache_stats.dropped_experiences[self.name] += 1
+        if self._random.randrange(self._window_decisions) >= self.capacity:
+            return False, None
+        dropped_key = self._keys.sample(1)[0]
+        self._keys.remove(dropped_key)
+        self._keys.add(key)
+        return True, dropped_key
+
+    def completed(self, key: str) -> None:
+        """The key's experience left the in-flight experiences."""
+        self._keys.remove(key)
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._window_start = clock.now()
+        self._window_decisions = 0
+
+    def __len__(self):
+        return len(self._keys)
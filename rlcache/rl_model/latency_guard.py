@@ -0,0 +1,103 @@
+import logging
+from collections import deque
+from typing import Callable, Dict, TypeVar
+
+import numpy as np
+import time
+
+from rlcache.cache_constants import CacheInformation
+from rlcache.observer import ObservationType
+from rlcache.strategies.base_strategy import BaseStrategy
+
+T = TypeVar('T')
+
+
+class LatencyGuard(object):
+    """
+    Latency SLO guard around one kind of RL decision (should_cache, estimate_ttl or trim_cache).
+
+    Tracks the p99 of the last `latency_window` decision times, re-checked every `latency_check_every` decisions.
+    Once it exceeds `latency_slo_ms` decisions are routed to the fallback strategy, every `latency_probe_every`th
+    one still goes to the RL strategy to measure it. RL decisions resume once the p99 of `latency_min_samples`
+    probes is back under `latency_recovery_ratio` * SLO. Fallback decisions are counted in
+    CacheInformation.latency_fallbacks.
+
+    The fallback is built only when `latency_slo_ms` is set, and observes what the strategy observes (within its
+    own supported observations) so it is ready to take over. Decisions are timed with `timer`, perf_counter unless
+    a test drives it.
+    """
+
+    def __init__(self,
+                 config: Dict[str, any],
+                 decision: str,
+                 cache_stats: CacheInformation,
+                 fallback_factory: Callable[[], BaseStrategy],
+                 timer: Callable[[], float] = time.perf_counter):
+        self.logger = logging.getLogger(__name__)
+        self.decision = decision
+        self.timer = timer
+        self.cache_stats = cache_stats
+        slo_ms = config.get('latency_slo_ms')
+        self.enabled = slo_ms is not None
+        self.slo = slo_ms / 1000 if self.enabled else None
+        self.recovery_ratio = config.get('latency_recovery_ratio', 0.8)
+        self.check_every = config.get('latency_check_every', 50)
+        self.probe_every = config.get('latency_probe_every', 10)
+        self.min_samples = config.get('latency_min_samples', 50)
+        self.latencies = deque(maxlen=config.get('latency_window', 1000))
+
+        self.tripped = False
+        self._since_check = 0
+        self._since_probe = 0
+        self.fallback = fallback_factory() if self.enabled else None
+
+    def decide(self, decision: Callable[[], T], fallback_decision: Callable[[BaseStrategy], T]) -> T:
+        if not self.enabled:
+            return decision()
+
+        if self.tripped:
+            self._since_probe += 1
+            if self._since_probe < self.probe_every:
+                self.cache_stats.latency_fallbacks[self.decision] += 1
+                return fallback_decision(self.fallback)
+            self._since_probe = 0
+
+        start = self.timer()
+        result = decision()
+        self._record(self.timer() - start)
+        return result
+
+    def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
+        if self.fallback is not None and observation_type in self.fallback.supported_observations:
+            self.fallback.observe(key, observation_type, info)
+
+    def close(self):
+        if self.fallback is not None:
+            self.fallback.close()
+
+    def _record(self, latency: float):
+        self.latencies.append(latency)
+        self._since_check += 1
+        # probes are rare, check on every one of them
+        if len(self.latencies) < self.min_samples or (not self.tripped and self._since_check < self.check_every):
+            return
+
+        self._since_check = 0
+        p99 = np.percentile(self.latencies, 99)
+        if not self.tripped and p99 > self.slo:
+            self._switch(tripped=True, p99=p99)
+        elif self.tripped and p99 <= self.slo * self.recovery_ratio:
+            self._switch(tripped=False, p99=p99)
+
+    def _switch(self, tripped: bool, p99: float):
+        self.tripped = tripped
+        # measure the new regime only
+        self.latencies.clear()
+        self._since_probe = 0
+        fallbacks = self.cache_stats.latency_fallbacks[self.decision]
+        if tripped:
+            self.logger.warning(f'{self.decision}: p99 latency {p99 * 1000:.3f}ms over the {self.slo * 1000}ms SLO, '
+                                f'falling back to {type(self.fallback).__name__}. Fallbacks so far: {fallbacks}')
+        else:
+            self.logger.warning(f'{self.decision}: p99 latency {p99 * 1000:.3f}ms recovered, '
+                                f'back to the RL strategy. Fallbacks so far: {fallbacks}')
@@ -0,0 +1,180 @@
+import logging
+import queue
+import threading
+from typing import TYPE_CHECKING, Callable, Dict
+
+import numpy as np
+
+from rlcache.rl_model.experience_dataset import ExperienceWriter
+from rlcache.utils.sampling import update_bucket_from_config
+
+if TYPE_CHECKING:
+    from rlgraph.agents import Agent  # only the agents passed in need rlgraph, the learner itself doesn't
+
+_STOP = object()  # queued after the last experience by AgentLearner.stop
+
+
+class AgentLearner(object):
+    """
+    Owns the agent(s) of an RL strategy and turns completed experiences into training steps.
+
+    Synchronous (default): one agent, `observe` runs agent.observe and agent.update inline, like the strategies
+    used to.
+
+    Asynchronous (`async_learner: true`): actor/learner split. The strategy serves decisions from `serving_agent`
+    while a second agent is trained by a background thread. Serving threads only push experiences onto a
+    queue.SimpleQueue (no Python level locking on put), the learner thread consumes them, trains, and every
+    `publish_weights_every` updates publishes (policy_version, weights) as a single reference swap.
+    `refresh_serving_agent` loads the latest published weights into the serving agent between requests.
+    `stop` trains on the experiences still queued and joins the thread, the next experience starts a new one. `reset`
+    stops it before resetting the agents, so a new episode never trains on the previous one's experiences.
+
+    With `inference_only: true` the policy is frozen, experiences are dropped without touching the agent.
+
+    `max_updates_per_second` caps agent.update calls with a TokenBucket (bursts of `update_burst`), experiences
+    arriving while the bucket is empty are still observed into the agent's memory but don't trigger an update.
+
+    With `record_experiences: <directory>` (offline trainer) experiences are written to an ExperienceWriter instead
+    of being trained on, `train_on_batch` later trains from the recorded dataset.
+    """
+
+    def __init__(self,
+                 config: Dict[str, any],
+                 agent_factory: Callable[[], 'Agent'],
+                 loss_logger: logging.Logger):
+        self.loss_logger = loss_logger
+        self.logger = logging.getLogger(__name__)
+        record_experiences = config.get('record_experiences')
+        self.recorder = ExperienceWriter(record_experiences) if record_experiences else None
+        self.asynchronous = (config.get('async_learner', False) and not config.get('inference_only', False)
+                             and self.recorder is None)
+        self.publish_weights_every = config.get('publish_weights_every', 100)
+        self.inference_only = config.get('inference_only', False)
+        self.update_bucket = update_bucket_from_config(config)
+        self.skipped_updates = 0
+
+        self.serving_agent = agent_factory()
+        # number of updates applied to the training agent, and the update the serving agent is on
+        self.policy_version = 0
+        self.serving_version = 0
+        # policy version of the last set_weights
+        self.weights_loaded_version = 0
+
+        if self.asynchronous:
+            self.training_agent = agent_factory()
+            self.training_agent.set_weights(**self.serving_agent.get_weights())
+            self._published = (0, None)
+            self._experiences = queue.SimpleQueue()
+            self._thread = None  # type: threading.Thread
+            self._start()
+        else:
+            self.training_agent = self.serving_agent
+
+    def observe(self,
+                states: np.ndarray,
+                actions: np.ndarray,
+                rewards,
+                next_states: np.ndarray,
+                terminals,
+                episode_num: int):
+        """Hand a completed experience to the learner."""
+        if self.inference_only:
+            return
+        if self.recorder is not None:
+            self.recorder.append(states, actions, rewards, next_states, terminals)
+            return
+        experience = (states, actions, rewards, next_states, terminals, episode_num)
+        if self.asynchronous:
+            if self._thread is None:
+                self._start()
+            self._experiences.put(experience)
+        else:
+            self._train(*experience)
+
+    def refresh_serving_agent(self):
+        """Pick up the newest published policy, a no-op unless the learner published since the last call."""
+        if not self.asynchronous:
+            return
+
+        version, weights = self._published
+        if version > self.serving_version:
+            self.serving_agent.set_weights(**weights)
+            self.serving_version = version
+
+    def get_weights(self) -> Dict[str, any]:
+        return self.training_agent.get_weights()
+
+    def set_weights(self, weights: Dict[str, any]):
+        """
+        Load weights into every agent, e.g. from a checkpoint or a central learner. This is a new policy: the versions
+        move on so decisions cached for the old one stop matching, and `weights_loaded_version` tells exported
+        copies of the policy to re-export.
+        """
+        self.serving_agent.set_weights(**weights)
+        if self.training_agent is not self.serving_agent:
+            self.training_agent.set_weights(**weights)
+        self.policy_version += 1
+        self.serving_version = self.policy_version
+        self.weights_loaded_version = self.policy_version
+        if self.asynchronous:
+            self._published = (self.policy_version, weights)
+
+    def stop(self):
+        """Drain the queued experiences and join the learner thread, a no-op for synchronous learners."""
+        if not self.asynchronous or self._thread is None:
+            return
+        self._experiences.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def reset(self):
+        self.stop()
+        self.serving_agent.reset()
+        if self.training_agent is not self.serving_agent:
+            self.training_agent.reset()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='agent_learner', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            experience = self._experiences.get()
+            if experience is _STOP:
+                return
+            try:
+                self._train(*experience)
+            except Exception:
+                self.logger.exception('Learner failed to train on an experience.')
+
+    def _train(self, states, actions, rewards, next_states, terminals, episode_num):
+        self.training_agent.observe(preprocessed_states=states,
+                                    actions=actions,
+                                    internals=[],
+                                    rewards=rewards,
+                                    next_states=next_states,
+                                    terminals=terminals)
+        if self.update_bucket is not None and not self.update_bucket.try_consume():
+            self.skipped_updates += 1
+            return
+        self._updated(self.training_agent.update(), episode_num)
+
+    def train_on_batch(self, batch: Dict[str, any], episode_num: int = 0):
+        """
+        One update straight from a batch of recorded experiences ({states, actions, rewards, next_states, terminals}),
+        bypassing the agent's memory. Synchronous learners only.
+        """
+        if self.asynchronous:
+            # the learner thread owns the training agent, updating it here too would race with it
+            raise RuntimeError('train_on_batch needs a synchronous learner, set async_learner: false.')
+        batch = dict(batch, importance_weights=np.ones(len(batch['rewards']), dtype='float32'))
+        self._updated(self.training_agent.update(batch=batch), episode_num)
+
+    def _updated(self, loss, episode_num: int):
+        if loss is not None:
+            self.policy_version += 1
+            self.loss_logger.info(f'{episode_num},{loss[0]}')
+            if not self.asynchronous:
+                self.serving_version = self.policy_version
+            elif self.policy_version % self.publish_weights_every == 0:
+                self._published = (self.policy_version, self.training_agent.get_weights())
@@ -0,0 +1,154 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_ACTIVATIONS = {
+    None: lambda x: x,
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+}
+
+DenseLayer = Tuple[np.ndarray, np.ndarray, Optional[str]]  # kernel, bias, activation
+
+
+class ActionHead(object):
+    """
+    Output layer(s) for one action component.
+
+    int heads (DQN) output one value per action, the greedy action is their argmax. A dueling head outputs
+    [state value, advantages...], the argmax of the advantages is the argmax of the q-values.
+    float heads (SAC) output [mean, log std], the mean is squashed with tanh into [low, high].
+    """
+
+    def __init__(self, layers: List[DenseLayer], kind: str, num_actions: int = None, low=None, high=None):
+        assert kind in {'int', 'float'}, f'Unknown action head kind: {kind}'
+        self.layers = layers
+        self.kind = kind
+        self.num_actions = num_actions
+        self.low = low
+        self.high = high
+
+    def forward(self, hidden: np.ndarray) -> np.ndarray:
+        """Raw head output used for ranking: q-values (or advantages) for int heads, the action for float heads."""
+        for kernel, bias, activation in self.layers:
+            hidden = _ACTIVATIONS[activation](hidden @ kernel + bias)
+
+        if self.kind == 'int':
+            return hidden[:, -self.num_actions:]
+
+        mean = hidden[:, :hidden.shape[1] // 2]
+        return self.low + (np.tanh(mean) + 1) / 2 * (self.high - self.low)
+
+    def greedy(self, head_output: np.ndarray) -> np.ndarray:
+        if self.kind == 'int':
+            return head_output.argmax(axis=1)
+        return head_output
+
+
+class NumpyPolicy(object):
+    """
+    Pure NumPy forward pass over weights exported from a trained rlgraph agent.
+
+    Only the greedy decision is reproduced (argmax for DQN, mean action for SAC), rlgraph stays responsible for
+    exploration and training. Returned actions have the same shapes as `Agent.get_action`: a 1-D state gives an
+    unbatched action, a 2-D batch of states gives one action per row.
+    """
+
+    def __init__(self, trunk: List[DenseLayer], heads: Dict[str, ActionHead], container_action: bool):
+        self.trunk = trunk
+        self.heads = heads
+        self.container_action = container_action
+        self._random = np.random.RandomState()
+
+    def head_outputs(self, states: np.ndarray) -> Dict[str, np.ndarray]:
+        hidden = np.asarray(states, dtype='float32')
+        if hidden.ndim == 1:
+            hidden = hidden[np.newaxis]
+        for kernel, bias, activation in self.trunk:
+            hidden = _ACTIVATIONS[activation](hidden @ kernel + bias)
+        return {name: head.forward(hidden) for name, head in self.heads.items()}
+
+    def get_action(self, states: np.ndarray, epsilon: float = 0.0):
+        unbatched = np.ndim(states) == 1
+        actions = {}
+        for name, head_output in self.head_outputs(states).items():
+            head = self.heads[name]
+            action = head.greedy(head_output)
+            if epsilon > 0 and head.kind == 'int':
+                explore = self._random.random_sample(len(action)) < epsilon
+                action = np.where(explore, self._random.randint(head.num_actions, size=len(action)), action)
+            actions[name] = action[0] if unbatched else action
+
+        if self.container_action:
+            return actions
+        return actions['']
+
+    @classmethod
+    def from_agent(cls, agent, agent_config: Dict[str, any], action_space) -> 'NumpyPolicy':
+        """Export the policy network of an rlgraph DQN or SAC agent."""
+        weights = {}
+        for weight_group, group_weights in agent.get_weights().items():
+            if weight_group == 'policy_weights':
+                weights.update({name.split(':')[0]: np.asarray(value) for name, value in group_weights.items()})
+        return cls.from_weights(weights, agent_config['network_spec'], action_space)
+
+    @classmethod
+    def from_weights(cls, weights: Dict[str, np.ndarray], network_spec: List[Dict[str, any]], action_space):
+        """
+        Rebuild the network from rlgraph variable names, refusing to guess: every kernel must be claimed by exactly
+        one layer, anything left over or matching more than one layer raises a ValueError.
+
+        Hidden layers are found by their `scope` in network_spec. Every action component has one `action-layer`,
+        preceded by an optional dueling `advantage-stream` layer. Dueling `value-stream`/`state-value` layers are
+        recognised and dropped since they don't change the argmax. Target network copies are ignored.
+        """
+        weights = {name: value for name, value in weights.items() if 'target' not in name}
+        unclaimed = set(weights)
+
+        def dense(kernel_name: str, activation: Optional[str]) -> DenseLayer:
+            bias_name = kernel_name[:-len('kernel')] + 'bias'
+            kernel = weights[kernel_name]
+            unclaimed.discard(kernel_name)
+            unclaimed.discard(bias_name)
+            return kernel, weights.get(bias_name, np.zeros(kernel.shape[1], dtype=kernel.dtype)), activation
+
+        def only(candidates: List[str], what: str) -> str:
+            if len(candidates) != 1:
+                raise ValueError(f'Expected one kernel for {what}, found {candidates}')
+            return candidates[0]
+
+        kernels = sorted(name for name in weights if name.endswith('kernel'))
+        trunk = []
+        for layer_spec in network_spec:
+            kernel_name = only([name for name in kernels if f'/{layer_spec["scope"]}/' in f'/{name}'],
+                               f'layer {layer_spec["scope"]}')
+            trunk.append(dense(kernel_name, layer_spec.get('activation')))
+            kernels.remove(kernel_name)
+
+        for name in kernels:
+            if 'value-stream' in name or 'state-value' in name:
+                dense(name, None)  # claimed, not used
+        kernels = [name for name in kernels if name in unclaimed]
+
+        container_action = isinstance(action_space, dict)
+        components = sorted(action_space.items()) if container_action else [('', action_space)]
+        heads = {}
+        for name, space in components:
+            head_kernels = [k for k in kernels if name in k] if container_action and len(components) > 1 else kernels
+            what = f'the {name} action' if name else 'the action'
+            layers = []
+            advantage_kernels = [k for k in head_kernels if 'advantage-stream' in k]
+            if advantage_kernels:
+                # an advantage stream (dueling) sits between the trunk and the action layer
+                layers.append(dense(only(advantage_kernels, f'the advantage stream of {what}'), 'relu'))
+            layers.append(dense(only([k for k in head_kernels if 'action-layer' in k], f'the layer of {what}'), None))
+            if hasattr(space, 'num_categories'):
+                heads[name] = ActionHead(layers, 'int', num_actions=int(np.max(space.num_categories)))
+            else:
+                heads[name] = ActionHead(layers, 'float', low=np.asarray(space.low), high=np.asarray(space.high))
+
+        if unclaimed:
+            raise ValueError(f'Weights not matched to any layer of the network: {sorted(unclaimed)}')
+        return cls(trunk, heads, container_action)
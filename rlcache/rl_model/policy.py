@@ -0,0 +1,103 @@
+import threading
+from functools import partial
+from typing import Dict
+
+import numpy as np
+
+from rlcache.rl_model.decision_cache import DecisionCache
+from rlcache.rl_model.exploration import exploration_epsilon
+from rlcache.rl_model.learner import AgentLearner
+from rlcache.rl_model.numpy_policy import NumpyPolicy
+
+
+class AgentPolicy(object):
+    """
+    Decision side of an RL strategy, `get_action` is a drop-in for `agent.get_action`.
+
+    With `numpy_inference: true` decisions come from a NumpyPolicy exported from the serving agent instead of the
+    rlgraph graph, re-exported once the learner applied `numpy_policy_sync_updates` more updates. rlgraph is then
+    only used for training. The export acts greedily and explores with the agent's own epsilon decay, taken at the
+    number of decisions made so far; `numpy_inference_epsilon` pins epsilon instead. Only DQN agents can be served
+    this way while exploring, SAC explores by sampling its actions.
+
+    With `decision_cache: true` greedy single-state decisions are memoized in a DecisionCache for the current
+    policy version. Exploration is sampled separately, the same way for both paths: with probability epsilon (the
+    agent's decay, or `numpy_inference_epsilon`) the action is drawn at random and the cache isn't touched,
+    otherwise the cached greedy action is served. Only DQN agents can be cached while exploring.
+    """
+
+    def __init__(self, config: Dict[str, any], learner: AgentLearner, agent_config: Dict[str, any], action_space):
+        self.learner = learner
+        self.agent_config = agent_config
+        self.action_space = action_space
+        self.numpy_inference = config.get('numpy_inference', False)
+        self.sync_updates = config.get('numpy_policy_sync_updates', 100)
+        # a frozen policy serving from a checkpoint only acts greedily
+        self.explore = not config.get('inference_only', False)
+        # None follows the agent's epsilon decay
+        self.epsilon = config.get('numpy_inference_epsilon') if self.explore else 0.0
+        if self.numpy_inference and self.explore and agent_config['type'] != 'dqn':
+            raise ValueError(f'numpy_inference can only explore for dqn agents, not {agent_config["type"]}. '
+                             f'Serve it inference_only.')
+        if config.get('decision_cache', False) and self.explore and agent_config['type'] != 'dqn':
+            raise ValueError(f'decision_cache can only explore for dqn agents, not {agent_config["type"]}. '
+                             f'Serve it inference_only.')
+
+        self.numpy_policy = None  # type: NumpyPolicy
+        self.numpy_policy_version = 0
+        self.decisions = 0
+
+        self.decision_cache = DecisionCache(config) if config.get('decision_cache', False) else None
+        self._random = np.random.RandomState()
+
+        # get_action can be called from several threads, they share the serving agent
+        self._lock = threading.Lock()
+
+    def get_action(self, states: np.ndarray):
+        with self._lock:
+            self.learner.refresh_serving_agent()
+            single_state = np.ndim(states) == 1
+            self.decisions += 1 if single_state else len(states)
+
+            if not self.numpy_inference:
+                agent = self.learner.serving_agent
+                if self.decision_cache is None or not single_state:
+                    return agent.get_action(states, use_exploration=self.explore)
+                if self._explores_now():
+                    return self.action_space.sample()
+                return self._cached_decision(states, self.learner.serving_version,
+                                             partial(agent.get_action, use_exploration=False))
+
+            stale_updates = self.learner.serving_version - self.numpy_policy_version
+            if (self.numpy_policy is None or stale_updates >= self.sync_updates
+                    or self.numpy_policy_version < self.learner.weights_loaded_version):
+                self.export()
+            if self.decision_cache is None or not single_state:
+                return self.numpy_policy.get_action(states, self._epsilon())
+            if self._explores_now():
+                return self.numpy_policy.get_action(states, epsilon=1.0)
+            return self._cached_decision(states, self.numpy_policy_version, self.numpy_policy.get_action)
+
+    def _cached_decision(self, state: np.ndarray, version: int, get_action):
+        action = self.decision_cache.get(state, version)
+        if action is None:
+            action = get_action(state)
+            self.decision_cache.set(state, version, action)
+        return action
+
+    def _epsilon(self) -> float:
+        if not self.explore:
+            return 0.0
+        if self.epsilon is not None:
+            return self.epsilon
+        return exploration_epsilon(self.agent_config, self.decisions)
+
+    def _explores_now(self) -> bool:
+        """Draw whether this decision explores, cached decisions are greedy and exploration is sampled separately."""
+        epsilon = self._epsilon()
+        return epsilon > 0 and self._random.random_sample() < epsilon
+
+    def export(self) -> NumpyPolicy:
+        self.numpy_policy = NumpyPolicy.from_agent(self.learner.serving_agent, self.agent_config, self.action_space)
+        self.numpy_policy_version = self.learner.serving_version
+        return self.numpy_policy
@@ -106,3 +106,8 @@ def stats():
                     'requests_counter': REQUESTS_COUNTER,
                     'experiment_config': CONFIG
                     })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify(CACHE_MANAGER.metrics())
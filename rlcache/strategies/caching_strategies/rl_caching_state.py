@@ -24,12 +24,3 @@ class CachingAgentSystemState(AgentSystemState):
     @classmethod
     def from_numpy(cls, encoded: np.ndarray):
         return cls(encoded[0], encoded[1], encoded[2], encoded[3], encoded[4])
-
-
-@dataclass
-class CachingAgentIncompleteExperienceEntry(object):
-    __slots__ = ['state', 'agent_action', 'starting_state', 'observation_time']
-    state: CachingAgentSystemState
-    agent_action: np.ndarray
-    starting_state: CachingAgentSystemState
-    observation_time: float
@@ -1,17 +1,27 @@
 import logging
+from functools import partial
 from typing import Dict
 
-import time
+import numpy as np
 
 from rlcache.backend import TTLCache, InMemoryStorage
 from rlcache.cache_constants import OperationType, CacheInformation
 from rlcache.observer import ObservationType
+from rlcache.rl_model.checkpoint import StrategyCheckpoint
+from rlcache.rl_model.completion_buffer import CompletionBuffer
+from rlcache.rl_model.experience_table import ExperienceTable
+from rlcache.rl_model.latency_guard import LatencyGuard
+from rlcache.rl_model.learner import AgentLearner
+from rlcache.rl_model.policy import AgentPolicy
 from rlcache.strategies.caching_strategies.base_caching_strategy import CachingStrategy
-from rlcache.strategies.caching_strategies.rl_caching_state import CachingAgentIncompleteExperienceEntry, \
-    CachingAgentSystemState
+from rlcache.strategies.caching_strategies.rl_caching_state import CachingAgentSystemState
 from rlcache.strategies.caching_strategies.rl_caching_state_converter import CachingStrategyRLConverter
+from rlcache.strategies.caching_strategies.simple_strategies import OnReadOnlyCacheStrategy
+from rlcache.utils import clock
+from rlcache.utils.key_encoder import shared_key_encoder
+from rlcache.utils.event_log import ENTRY_HITS_COLUMNS, OBSERVATION_COLUMNS, REWARD_COLUMNS, create_event_log
 from rlcache.utils.loggers import create_file_logger
-from rlcache.utils.vocabulary import Vocabulary
+from rlcache.utils.sampling import key_sampler_from_config
 from rlgraph.agents import Agent
 from rlgraph.spaces import FloatBox, IntBox
 
@@ -24,9 +34,16 @@ class RLCachingStrategy(CachingStrategy):
         self.observation_seen = 0
         self.episode_reward = 0
         self.checkpoint_steps = config['checkpoint_steps']
+        self.inference_only = config.get('inference_only', False)
+        # decisions are made for every key, experiences are only tracked for the keys learned from
+        self.key_sampler = key_sampler_from_config(config)
 
+        # key -> slot of its in-flight experience in self.experiences
         self._incomplete_experiences = TTLCache(InMemoryStorage())
         self._incomplete_experiences.expired_entry_callback(self._observe_expired_incomplete_experience)
+        self.experiences = ExperienceTable(CachingAgentSystemState.field_names(), actions={'action': ((), 'int32')})
+        # completed experiences are rewarded and observed by the agent observe_batch_size at a time
+        self.completions = CompletionBuffer(config.get('observe_batch_size', 1), self._observe_completions)
 
         self.experimental_reward = config.get('experimental_reward', False)
         agent_config = config['agent_config']
@@ -34,96 +51,122 @@ class RLCachingStrategy(CachingStrategy):
         # action space: should cache: true or false
         # state space: [capacity (1), query key(1), query result set(num_indexes)]
         fields_in_state = len(CachingAgentSystemState.__slots__)
-        self.agent = Agent.from_spec(agent_config,
-                                     state_space=FloatBox(shape=(fields_in_state,)),
-                                     action_space=IntBox(2))
+        action_space = IntBox(2)
 
         self.logger = logging.getLogger(__name__)
         name = 'rl_caching_strategy'
-        self.reward_logger = create_file_logger(name=f'{name}_reward_logger', result_dir=self.result_dir)
+        self.metrics = cache_stats.strategy_metrics[name]
+        self.reward_logger = create_event_log(f'{name}_reward_logger', self.result_dir, REWARD_COLUMNS,
+                                              cache_stats.event_log_settings)
         self.loss_logger = create_file_logger(name=f'{name}_loss_logger', result_dir=self.result_dir)
-        self.observation_logger = create_file_logger(name=f'{name}_observation_logger', result_dir=self.result_dir)
-        self.entry_hits_logger = create_file_logger(name=f'{name}_entry_hits_logger', result_dir=self.result_dir)
-
-        self.key_vocab = Vocabulary()
+        self.learner = AgentLearner(config,
+                                    agent_factory=partial(Agent.from_spec,
+                                                          agent_config,
+                                                          state_space=FloatBox(shape=(fields_in_state,)),
+                                                          action_space=action_space),
+                                    loss_logger=self.loss_logger)
+        self.policy = AgentPolicy(config, self.learner, agent_config, action_space)
+        self.observation_logger = create_event_log(f'{name}_observation_logger', self.result_dir, OBSERVATION_COLUMNS,
+                                                   cache_stats.event_log_settings)
+        self.entry_hits_logger = create_event_log(f'{name}_entry_hits_logger', self.result_dir, ENTRY_HITS_COLUMNS,
+                                                  cache_stats.event_log_settings)
+
+        self.key_encoder = shared_key_encoder(config, cache_stats.key_encoders)
+        self.checkpoint = StrategyCheckpoint(config, self.result_dir, name)
+        self.checkpoint.restore(self.policy, self.key_encoder)
+        self.latency_guard = LatencyGuard(config, 'should_cache', cache_stats,
+                                          partial(OnReadOnlyCacheStrategy, config, self.result_dir, cache_stats,
+                                                  name=f'{name}_fallback'))
 
     def should_cache(self, key: str, values: Dict[str, str], ttl: int, operation_type: OperationType) -> bool:
+        return self.latency_guard.decide(lambda: self._should_cache(key, values, ttl, operation_type),
+                                         lambda fallback: fallback.should_cache(key, values, ttl, operation_type))
+
+    def _should_cache(self, key: str, values: Dict[str, str], ttl: int, operation_type: OperationType) -> bool:
         # TODO what about the case of a cache key that exist already in the incomplete exp?
         assert self._incomplete_experiences.get(key) is None, \
             "should_cache is assumed to be first call and key shouldn't be in the cache"
-        observation_time = time.time()
+        observation_time = clock.now()
 
-        encoded_key = self.key_vocab.add_or_get_id(key)
-        state = CachingAgentSystemState(encoded_key=encoded_key,
-                                        ttl=ttl,
-                                        hit_count=0,
-                                        step_code=0,
-                                        operation_type=operation_type.value)
-
-        agent_action = self.agent.get_action(state.to_numpy())
-        incomplete_experience_entry = CachingAgentIncompleteExperienceEntry(state=state,
-                                                                            agent_action=agent_action,
-                                                                            starting_state=state.copy(),
-                                                                            observation_time=observation_time)
+        encoded_key = self.key_encoder.encode(key)
+        state = self.experiences.make_state(encoded_key=encoded_key, ttl=ttl, operation_type=operation_type.value)
 
+        agent_action = self.policy.get_action(state)
         action = self.converter.agent_to_system_action(agent_action)
-        self._incomplete_experiences.set(key, incomplete_experience_entry, ttl)
+        if self.inference_only or not self.key_sampler.sampled(key):
+            return action  # nothing will be learned from the decision, don't track it
+
+        slot = self.experiences.add(state, {'action': agent_action}, observation_time)
+        self._incomplete_experiences.set(key, slot, ttl)
 
         return action
 
     def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
         # TODO include stats/capacity information in the info dict
-        experience = self._incomplete_experiences.get(key)  # type: CachingAgentIncompleteExperienceEntry
-        if experience is None:
+        self.latency_guard.observe(key, observation_type, info)
+        slot = self._incomplete_experiences.get(key)
+        if slot is None:
             return  # if I haven't had to make a decision on this, ignore it.
 
-        self.observation_logger.info(f'{self.episode_num},{key},{observation_type.name}')
+        self.observation_logger.log(self.episode_num, key, observation_type.name)
         if observation_type == ObservationType.Hit:
-            experience.state.hit_count += 1
+            self.experiences.increment(slot, 'hit_count')
 
         else:
-            self._reward_experience(key, experience, observation_type)
+            self._reward_experience(key, slot, observation_type)
 
         self.observation_seen += 1
         if self.observation_seen % self.checkpoint_steps == 0:
+            self.checkpoint.save(self.policy, self.key_encoder)
             self.logger.info(f'Observation seen so far: {self.observation_seen}, reward so far: {self.episode_reward}')
 
     def _observe_expired_incomplete_experience(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
         """Observe decisions taken that hasn't been observed by main cache. e.g. don't cache -> ttl up -> no miss"""
         assert observation_type == ObservationType.Expiration
-        experience = info['value']
-        self._reward_experience(key, experience, observation_type)
+        self._reward_experience(key, info['value'], observation_type)
 
-    def _reward_experience(self,
-                           key: str,
-                           experience: CachingAgentIncompleteExperienceEntry,
-                           observation_type: ObservationType):
-        state = experience.state
-        state.step_code = observation_type.value
+    def _reward_experience(self, key: str, slot: int, observation_type: ObservationType):
+        experiences = self.experiences
+        experiences.set_field(slot, 'step_code', observation_type.value)
 
         self._incomplete_experiences.delete(key)
 
-        self.entry_hits_logger.info(f'{self.episode_num},{key},{experience.state.hit_count}')
-        reward = self.converter.system_to_agent_reward(experience)
+        self.entry_hits_logger.log(self.episode_num, key, int(experiences.field(slot, 'hit_count')))
+        self.completions.add(states=experiences.starting_state(slot).copy(),
+                             actions=experiences.action(slot),
+                             next_states=experiences.state(slot).copy())
+        experiences.free(slot)
+        self.logger.debug(f'Key: {key} is in terminal state because: {str(observation_type)}')
+
+    def _observe_completions(self, batch: Dict[str, np.ndarray]):
+        field_index = self.experiences.field_index
+        next_states = batch['next_states']
+        rewards = self.converter.system_to_agent_reward(batch['actions'],
+                                                        next_states[:, field_index['hit_count']],
+                                                        next_states[:, field_index['step_code']])
         if self.experimental_reward:
             # TODO add cache utility to state and reward
             pass
 
-        self.agent.observe(preprocessed_states=experience.starting_state.to_numpy(),
-                           actions=experience.agent_action,
-                           internals=[],
-                           rewards=reward,
-                           next_states=experience.state.to_numpy(),
-                           terminals=False)
+        self.learner.observe(states=batch['states'],
+                             actions=batch['actions'],
+                             rewards=rewards,
+                             next_states=next_states,
+                             terminals=np.zeros(len(rewards), dtype=bool),
+                             episode_num=self.episode_num)
 
-        self.episode_reward += reward
-        self.reward_logger.info(f'{self.episode_num},{reward}')
-        self.logger.debug(f'Key: {key} is in terminal state because: {str(observation_type)}')
-        loss = self.agent.update()
-        if loss is not None:
-            self.loss_logger.info(f'{self.episode_num},{loss[0]}')
+        self.episode_reward += rewards.sum().item()
+        self.metrics.record_rewards(len(rewards), rewards.sum().item())
+        for reward in rewards:
+            self.reward_logger.log(self.episode_num, reward)
 
     def close(self):
+        self.completions.flush()
+        # the episode's experiences are trained on before the agents are reset
+        self.learner.stop()
+        self.checkpoint.save(self.policy, self.key_encoder)
+        self.latency_guard.close()
         super().close()
-        self.agent.reset()
+        self.learner.reset()
         self._incomplete_experiences.clear()
+        self.experiences.clear()
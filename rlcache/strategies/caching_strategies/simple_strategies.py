@@ -3,7 +3,7 @@ from typing import Dict
 from rlcache.cache_constants import OperationType, CacheInformation
 from rlcache.observer import ObservationType
 from rlcache.strategies.caching_strategies.base_caching_strategy import CachingStrategy
-from rlcache.utils.loggers import create_file_logger
+from rlcache.utils.event_log import ENTRY_HITS_COLUMNS, OBSERVATION_COLUMNS, create_event_log
 
 
 class OnReadWriteCacheStrategy(CachingStrategy):
@@ -11,49 +11,41 @@ class OnReadWriteCacheStrategy(CachingStrategy):
     def __init__(self, config: Dict[str, any], result_dir: str, cache_stats: CacheInformation):
         super().__init__(config, result_dir, cache_stats)
         name = 'read_write_caching_strategy'
-        self.observation_logger = create_file_logger(name=f'{name}_observation_logger', result_dir=self.result_dir)
-        self.entry_hits_logger = create_file_logger(name=f'{name}_entry_hits_logger', result_dir=self.result_dir)
-        self.observed_entries = {}
+        self.observation_logger = create_event_log(f'{name}_observation_logger', self.result_dir, OBSERVATION_COLUMNS,
+                                                   cache_stats.event_log_settings)
+        self.entry_hits_logger = create_event_log(f'{name}_entry_hits_logger', self.result_dir, ENTRY_HITS_COLUMNS,
+                                                  cache_stats.event_log_settings)
 
     def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
-        self.observation_logger.info(f'{key},{observation_type.name}')
-        if key not in self.observed_entries:
-            return
+        self.observation_logger.log(self.episode_num, key, observation_type.name)
+        entry = info.get('metadata') if info else None
+        if entry is None:
+            return  # still cached, or not cached at all
 
-        if observation_type == ObservationType.Hit:
-            self.observed_entries[key] += 1
-        else:
-            hits = self.observed_entries[key]
-            self.entry_hits_logger.info(f'{self.episode_num},{key},{hits}')
-            del self.observed_entries[key]
+        hits = entry['hit_count']
+        self.entry_hits_logger.log(self.episode_num, key, hits)
 
     def should_cache(self, key: str, values: Dict[str, str], ttl: int, operation_type: OperationType) -> bool:
-        self.observed_entries[key] = 0  # hits
         return True
 
 
 class OnReadOnlyCacheStrategy(CachingStrategy):
-    def __init__(self, config: Dict[str, any], result_dir: str, cache_stats: CacheInformation):
+    def __init__(self, config: Dict[str, any], result_dir: str, cache_stats: CacheInformation,
+                 name: str = 'read_only_caching_strategy'):
         super().__init__(config, result_dir, cache_stats)
-        name = 'read_only_caching_strategy'
-        self.observation_logger = create_file_logger(name=f'{name}_observation_logger', result_dir=self.result_dir)
-        self.entry_hits_logger = create_file_logger(name=f'{name}_entry_hits_logger', result_dir=self.result_dir)
-        self.observed_entries = {}
+        self.observation_logger = create_event_log(f'{name}_observation_logger', self.result_dir, OBSERVATION_COLUMNS,
+                                                   cache_stats.event_log_settings)
+        self.entry_hits_logger = create_event_log(f'{name}_entry_hits_logger', self.result_dir, ENTRY_HITS_COLUMNS,
+                                                  cache_stats.event_log_settings)
 
     def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
-        self.observation_logger.info(f'{self.episode_num},{key},{observation_type.name}')
-        if key not in self.observed_entries:
-            return
+        self.observation_logger.log(self.episode_num, key, observation_type.name)
+        entry = info.get('metadata') if info else None
+        if entry is None:
+            return  # still cached, or not cached at all
 
-        if observation_type == ObservationType.Hit:
-            self.observed_entries[key] += 1
-        else:
-            hits = self.observed_entries[key]
-            self.entry_hits_logger.info(f'{self.episode_num},{key},{hits}')
-            del self.observed_entries[key]
+        hits = entry['hit_count']
+        self.entry_hits_logger.log(self.episode_num, key, hits)
 
     def should_cache(self, key: str, values: Dict[str, str], ttl: int, operation_type: OperationType) -> bool:
-        should = operation_type == OperationType.Miss
-        if should:
-            self.observed_entries[key] = 0  # hits
-        return should
+        return operation_type == OperationType.Miss
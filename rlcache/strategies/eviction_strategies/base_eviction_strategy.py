@@ -1,5 +1,7 @@
 from abc import ABC
-from typing import Dict
+from typing import Dict, List
+
+import time
 
 from rlcache.backend.base import Storage
 from rlcache.cache_constants import CacheInformation
@@ -7,6 +9,34 @@ from rlcache.observer import ObservationType
 from rlcache.strategies.base_strategy import BaseStrategy
 
 
+class EvictionBudget(object):
+    """
+    Work one eviction may spend: candidates to score and time, checked against time.perf_counter.
+
+    Strategies scanning many candidates (the full-scan and batched RL modes) stop scoring once it is spent, so the
+    cache manager's `eviction_budget` bounds a single trim_cache call too. The default budget is unlimited.
+    """
+
+    def __init__(self, max_candidates: float = float('inf'), max_time: float = float('inf')):
+        self.candidates_left = max_candidates
+        self.deadline = time.perf_counter() + max_time
+
+    def allowance(self, candidates: int) -> int:
+        """How many of `candidates` may still be scored."""
+        if self.out_of_time():
+            return 0
+        return int(min(candidates, max(self.candidates_left, 0)))
+
+    def spend(self, candidates: int) -> None:
+        self.candidates_left -= candidates
+
+    def out_of_time(self) -> bool:
+        return time.perf_counter() > self.deadline
+
+    def exhausted(self) -> bool:
+        return self.candidates_left <= 0 or self.out_of_time()
+
+
 class EvictionStrategy(BaseStrategy, ABC):
     def __init__(self, config: Dict[str, any], result_dir: str, cache_stats: CacheInformation):
         super().__init__(config, result_dir, cache_stats)
@@ -15,7 +45,25 @@ class EvictionStrategy(BaseStrategy, ABC):
                                        ObservationType.Invalidate,
                                        ObservationType.Expiration,
                                        ObservationType.Write}
+        # number of keys scored by trim_cache so far, lets the cache manager bound the work spent per insert
+        self.candidates_scored = 0
 
-    def trim_cache(self, cache: Storage):
-        """ Called when cache is full, finds an item to evict from the cache and evict it."""
+    def trim_cache(self, cache: Storage, budget: EvictionBudget = None):
+        """ Called when cache is full, finds an item to evict from the cache and evict it. Strategies that score
+        candidates stop once the budget is spent, the O(1) policies ignore it."""
         raise NotImplementedError
+
+    def trim_cache_batch(self, cache: Storage, num_keys: int) -> List[str]:
+        """ Evict up to num_keys keys at once, used by background eviction. Strategies that can score many
+        candidates together should override this."""
+        evicted_keys = []
+        while len(evicted_keys) < num_keys:
+            keys = self.trim_cache(cache)
+            if len(keys) == 0:
+                break
+            evicted_keys.extend(keys)
+        return evicted_keys
+
+    def forget(self, key: str):
+        """ Key was evicted by someone else (e.g. the fallback policy), drop any state kept for it."""
+        pass
@@ -0,0 +1,22 @@
+from typing import Dict
+
+from rlcache.backend import TTLCache
+
+
+class FallbackEviction(object):
+    """
+    Cheap eviction policy used once the configured eviction strategy has spent its budget.
+
+    fifo: evicts the oldest inserted key, the storage dict keeps insertion order so this is a single lookup.
+    """
+    _supported_type = ['fifo']
+
+    def __init__(self, config: Dict[str, any]):
+        self.policy = config.get('fallback', 'fifo')
+        if self.policy not in self._supported_type:
+            raise NotImplementedError("Type passed isn't one of the supported types: {}".format(self._supported_type))
+
+    def evict(self, cache: TTLCache) -> str:
+        eviction_key = next(iter(cache.keys()))
+        cache.delete(eviction_key)
+        return eviction_key
@@ -1,61 +1,56 @@
 import logging
-from collections import OrderedDict
 from typing import Dict, List
 
-import time
-
 from rlcache.backend import TTLCache, InMemoryStorage
 from rlcache.cache_constants import CacheInformation
 from rlcache.observer import ObservationType
-from rlcache.strategies.eviction_strategies.base_eviction_strategy import EvictionStrategy
-from rlcache.utils.loggers import create_file_logger
+from rlcache.strategies.eviction_strategies.base_eviction_strategy import EvictionBudget, EvictionStrategy
+from rlcache.utils import clock
+from rlcache.utils.event_log import PERFORMANCE_COLUMNS, create_event_log
 
 
 class FIFOEvictionStrategy(EvictionStrategy):
     def __init__(self, config: Dict[str, any], result_dir: str, cache_stats: CacheInformation):
         super().__init__(config, result_dir, cache_stats)
-        self.fifo = OrderedDict()
+        self.key_metadata = cache_stats.key_metadata
         self.logger = logging.getLogger(__name__)
         self.renewable_ops = {ObservationType.Hit, ObservationType.Write}
         name = 'fifo_eviction_strategy'
-        self.performance_logger = create_file_logger(name=f'{name}_performance_logger', result_dir=result_dir)
+        self.metrics = cache_stats.strategy_metrics[name]
+        self.performance_logger = create_event_log(f'{name}_performance_logger', result_dir, PERFORMANCE_COLUMNS,
+                                                   cache_stats.event_log_settings)
 
         self._incomplete_experiences = TTLCache(InMemoryStorage())
         self._incomplete_experiences.expired_entry_callback(self._observe_expired_incomplete_experience)
 
     def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
-        if observation_type == ObservationType.Write:
-            ttl = info['ttl']
-            observation_time = time.time()
-            self.fifo[key] = {'ttl': ttl, 'observation_time': observation_time}
-        elif observation_type in {ObservationType.Expiration, ObservationType.Invalidate}:
-            self.logger.debug(f"Key {key} expired")
-            if key in self.fifo:
-                del self.fifo[key]
-
         action_taken = self._incomplete_experiences.get(key)
         if action_taken is not None:
             if observation_type == ObservationType.Invalidate:
                 # eviction followed by invalidation.
-                self.performance_logger.info(f'{self.episode_num},TrueEvict')
+                self.metrics.eviction_outcomes['TrueEvict'] += 1
+                self.performance_logger.log(self.episode_num, 'TrueEvict')
             elif observation_type == ObservationType.Miss:
-                self.performance_logger.info(f'{self.episode_num},FalseEvict')
+                self.metrics.eviction_outcomes['FalseEvict'] += 1
+                self.performance_logger.log(self.episode_num, 'FalseEvict')
                 # Miss after making an eviction decision
             self._incomplete_experiences.delete(key)
 
     def _observe_expired_incomplete_experience(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
-        self.performance_logger.info(f'{self.episode_num},TrueEvict')
+        self.metrics.eviction_outcomes['TrueEvict'] += 1
+        self.performance_logger.log(self.episode_num, 'TrueEvict')
 
-    def trim_cache(self, cache: TTLCache) -> List[str]:
+    def trim_cache(self, cache: TTLCache, budget: EvictionBudget = None) -> List[str]:
         while True:
+            # the cache storage keeps insertion order, its first key is the oldest write
+            eviction_key = next(iter(cache.keys()), None)
+            if eviction_key is None:
+                raise KeyError('trim_cache(): no keys to evict.')
             # TTLCache might expire and cause a race condition
-
-            eviction_item = self.fifo.popitem(last=False)
-            eviction_key = eviction_item[0]
-            eviction_value = eviction_item[1]
             if cache.contains(eviction_key):
-                decision_time = time.time()
-                ttl_left = (eviction_value['observation_time'] + eviction_value['ttl']) - decision_time
+                decision_time = clock.now()
+                ttl_left = (self.key_metadata.get(eviction_key, 'insert_time')
+                            + self.key_metadata.get(eviction_key, 'ttl')) - decision_time
                 self._incomplete_experiences.set(eviction_key, 'evict', ttl_left)
                 cache.delete(eviction_key)
                 return [eviction_key]
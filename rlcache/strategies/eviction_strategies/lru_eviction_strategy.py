@@ -2,71 +2,79 @@ import logging
 from collections import OrderedDict
 from typing import Dict, List
 
-import time
-
 from rlcache.backend import TTLCache, InMemoryStorage
 from rlcache.cache_constants import CacheInformation
 from rlcache.observer import ObservationType
-from rlcache.strategies.eviction_strategies.base_eviction_strategy import EvictionStrategy
-from rlcache.utils.loggers import create_file_logger
+from rlcache.strategies.eviction_strategies.base_eviction_strategy import EvictionBudget, EvictionStrategy
+from rlcache.utils import clock
+from rlcache.utils.event_log import PERFORMANCE_COLUMNS, create_event_log
 
 
 class LRUEvictionStrategy(EvictionStrategy):
-    def __init__(self, config: Dict[str, any], result_dir: str, cache_stats: CacheInformation):
+    def __init__(self, config: Dict[str, any], result_dir: str, cache_stats: CacheInformation,
+                 name: str = 'lru_eviction_strategy'):
         super().__init__(config, result_dir, cache_stats)
+        self.key_metadata = cache_stats.key_metadata
+        # sampled mode: approximate LRU by evicting the least recently used of K random keys (Redis style), read off
+        # the key metadata. Exact mode keeps the cached keys in recency order, least recently used first.
+        self.sample_size = config.get('eviction_sample_size')
         self.lru = OrderedDict()
         self.logger = logging.getLogger(__name__)
-        name = 'lru_eviction_strategy'
-        self.performance_logger = create_file_logger(name=f'{name}_performance_logger', result_dir=result_dir)
+        self.metrics = cache_stats.strategy_metrics[name]
+        self.performance_logger = create_event_log(f'{name}_performance_logger', result_dir, PERFORMANCE_COLUMNS,
+                                                   cache_stats.event_log_settings)
 
         self._incomplete_experiences = TTLCache(InMemoryStorage())
         self._incomplete_experiences.expired_entry_callback(self._observe_expired_incomplete_experience)
 
     def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
-        try:
-            stored_values = self.lru.pop(key)
-        except KeyError:
-            self.logger.debug(f"Key: {key} not in LRU monitor. Current LRU size: {len(self.lru)}")
-            stored_values = None
-            pass  # item not observed in cache before.
-        # add/refresh lru if hit
-        if observation_type == ObservationType.Write:
-            ttl = info['ttl']
-            observation_time = time.time()
-            self.lru[key] = {'ttl': ttl, 'observation_time': observation_time}
-
-        elif observation_type == ObservationType.Hit:
-            if stored_values is not None:
-                observation_time = time.time()
-                self.lru[key] = {'ttl': stored_values['ttl'], 'observation_time': observation_time}
-
-        elif observation_type in {ObservationType.Expiration, ObservationType.Invalidate}:
-            self.logger.debug(f"Key {key} expired")
-            assert key not in self.lru, "Expired key should have been deleted."
+        if self.sample_size is None:
+            # add/refresh lru on write and hit, anything else ends the cached entry
+            if observation_type == ObservationType.Write or (observation_type == ObservationType.Hit
+                                                              and key in self.lru):
+                self.lru[key] = None
+                self.lru.move_to_end(key)
+            else:
+                self.lru.pop(key, None)
 
         action_taken = self._incomplete_experiences.get(key)
         if action_taken is not None:
             if observation_type == ObservationType.Invalidate:
                 # eviction followed by invalidation.
-                self.performance_logger.info(f'{self.episode_num},TrueEvict')
+                self.metrics.eviction_outcomes['TrueEvict'] += 1
+                self.performance_logger.log(self.episode_num, 'TrueEvict')
             elif observation_type == ObservationType.Miss:
-                self.performance_logger.info(f'{self.episode_num},FalseEvict')
+                self.metrics.eviction_outcomes['FalseEvict'] += 1
+                self.performance_logger.log(self.episode_num, 'FalseEvict')
                 # Miss after making an eviction decision
             self._incomplete_experiences.delete(key)
 
     def _observe_expired_incomplete_experience(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
-        self.performance_logger.info(f'{self.episode_num},TrueEvict')
+        self.metrics.eviction_outcomes['TrueEvict'] += 1
+        self.performance_logger.log(self.episode_num, 'TrueEvict')
 
-    def trim_cache(self, cache: TTLCache) -> List[str]:
+    def trim_cache(self, cache: TTLCache, budget: EvictionBudget = None) -> List[str]:
         while True:
-            eviction_item = self.lru.popitem(last=False)
-            eviction_key = eviction_item[0]
-            eviction_value = eviction_item[1]
+            if self.sample_size is None:
+                eviction_key, _ = self.lru.popitem(last=False)
+            else:
+                # keys evicted earlier in a batch keep their metadata until the cache manager observes the evictions
+                candidates = [k for k in self.key_metadata.sample(self.sample_size)
+                              if cache.contains(k, clean_expire=False)]
+                if not candidates:
+                    if cache.size() == 0:
+                        raise KeyError('trim_cache(): no keys to evict.')
+                    continue
+                eviction_key = min(candidates, key=lambda k: self.key_metadata.get(k, 'last_access'))
 
             if cache.contains(eviction_key):
                 # TTLCache might expire and cause a race condition
-                decision_time = time.time()
-                ttl_left = (eviction_value['observation_time'] + eviction_value['ttl']) - decision_time
+                decision_time = clock.now()
+                ttl_left = (self.key_metadata.get(eviction_key, 'insert_time')
+                            + self.key_metadata.get(eviction_key, 'ttl')) - decision_time
                 self._incomplete_experiences.set(eviction_key, 'evict', ttl_left)
                 cache.delete(eviction_key)
                 return [eviction_key]
+
+    def forget(self, key: str):
+        self.lru.pop(key, None)
@@ -2,19 +2,19 @@ import logging
 
 import numpy as np
 
+from rlcache.cache_constants import CacheInformation
 from rlcache.observer import ObservationType
 from rlcache.rl_model.converter import RLConverter
-from rlcache.strategies.eviction_strategies.rl_eviction_state import EvictionAgentIncompleteExperienceEntry
-from rlcache.utils.loggers import create_file_logger
-from rlcache.utils.vocabulary import Vocabulary
+from rlcache.utils.event_log import PERFORMANCE_COLUMNS, create_event_log
 
 
 class EvictionStrategyRLConverter(RLConverter):
-    def __init__(self, result_dir: str):
-        self.vocabulary = Vocabulary(add_pad=True, add_unk=False)
+    def __init__(self, result_dir: str, cache_stats: CacheInformation):
         self.logger = logging.getLogger(__name__)
         name = 'rl_eviction_strategy'
-        self.performance_logger = create_file_logger(name=f'{name}_performance_logger', result_dir=result_dir)
+        self.metrics = cache_stats.strategy_metrics[name]
+        self.performance_logger = create_event_log(f'{name}_performance_logger', result_dir, PERFORMANCE_COLUMNS,
+                                                   cache_stats.event_log_settings)
 
     def system_to_agent_state(self, *args, **kwargs) -> np.ndarray:
         pass
@@ -26,49 +26,39 @@ class EvictionStrategyRLConverter(RLConverter):
         return (actions.flatten() == 1).item()
 
     def system_to_agent_reward(self,
-                               stored_experience: EvictionAgentIncompleteExperienceEntry,
-                               observation_type: ObservationType,
-                               episode_num: int) -> int:
+                               agent_actions: np.ndarray,
+                               observation_codes: np.ndarray,
+                               hit_gains: np.ndarray,
+                               episode_num: int) -> np.ndarray:
+        """
+        Rewards of a batch of completed experiences, one row per experience. `hit_gains` are the hits each key got
+        after the decision.
+        """
         # TODO consider using the hit count as scalar?
-
-        should_evict = self.agent_to_system_action(stored_experience.agent_action)
-
-        if observation_type == ObservationType.Expiration:
-            if should_evict:
-                # reward if should evict didn't observe any follow up miss
-                self.performance_logger.info(f'{episode_num},TrueEvict')
-                return 1
-            # else didn't evict
-            else:
-                # reward for not evicting a key that received more hits.
-                # or 0 if it didn't evict but also didn't get any hits
-
-                gain_for_not_evicting = stored_experience.state.hit_count - stored_experience.starting_state.hit_count
-                if gain_for_not_evicting > 0:
-                    self.performance_logger.info(f'{episode_num},TrueMiss')
-                else:
-                    self.performance_logger.info(f'{episode_num},MissEvict')
-
-                return gain_for_not_evicting
-
-        if observation_type == ObservationType.Invalidate:
-            # Set/Delete, remove entry from the cache.
-            # reward an eviction followed by invalidation.
-            if should_evict:
-                self.performance_logger.info(f'{episode_num},TrueEvict')
-                return 1
-            else:
-                # punish not evicting a key that got invalidated after.
-                self.performance_logger.info(f'{episode_num},MissEvict')
-                return -1
-
-        if observation_type == ObservationType.Miss:
-            assert should_evict, 'Observation miss even without making an eviction nor expire decision'
-
-            self.performance_logger.info(f'{episode_num},FalseEvict')
-            # Miss after making an eviction decision
-            # Punish, a read after an eviction decision
-            return -1
-
-        # reward for evicting key that followed by causes that isn't covered up
-        return 1
+        should_evict = agent_actions.reshape(len(observation_codes)) == 1
+        kept = ~should_evict
+        expired = observation_codes == ObservationType.Expiration.value
+        invalidated = observation_codes == ObservationType.Invalidate.value
+        missed = observation_codes == ObservationType.Miss.value
+        assert should_evict[missed].all(), 'Observation miss even without making an eviction nor expire decision'
+
+        # reward evicting a key that didn't observe any follow up miss, including causes that aren't covered below
+        rewards = np.ones(len(observation_codes), dtype='int64')
+        # reward for not evicting a key that received more hits, or 0 if it didn't get any hits
+        rewards[expired & kept] = hit_gains[expired & kept]
+        # Set/Delete removed the entry from the cache, punish not evicting a key that got invalidated after.
+        rewards[invalidated & kept] = -1
+        # Miss after making an eviction decision, punish a read after an eviction decision
+        rewards[missed] = -1
+
+        outcomes = np.full(len(observation_codes), None, dtype=object)
+        outcomes[(expired | invalidated) & should_evict] = 'TrueEvict'
+        outcomes[expired & kept] = np.where(hit_gains[expired & kept] > 0, 'TrueMiss', 'MissEvict')
+        outcomes[invalidated & kept] = 'MissEvict'
+        outcomes[missed] = 'FalseEvict'
+        for outcome in outcomes:
+            if outcome is not None:
+                self.metrics.eviction_outcomes[outcome] += 1
+                self.performance_logger.log(episode_num, outcome)
+
+        return rewards
@@ -1,20 +1,36 @@
 import logging
+from functools import partial
 from typing import Dict, List
 
-import time
-from pandas.tests.extension.numpy_.test_numpy_nested import np
+import numpy as np
 from rlgraph.agents import Agent
 from rlgraph.spaces import FloatBox, IntBox
 
 from rlcache.backend import TTLCache, InMemoryStorage
 from rlcache.cache_constants import CacheInformation
 from rlcache.observer import ObservationType
-from rlcache.strategies.eviction_strategies.base_eviction_strategy import EvictionStrategy
+from rlcache.rl_model.checkpoint import StrategyCheckpoint
+from rlcache.rl_model.completion_buffer import CompletionBuffer
+from rlcache.rl_model.latency_guard import LatencyGuard
+from rlcache.rl_model.learner import AgentLearner
+from rlcache.rl_model.policy import AgentPolicy
+from rlcache.strategies.eviction_strategies.base_eviction_strategy import EvictionBudget, EvictionStrategy
+from rlcache.strategies.eviction_strategies.lru_eviction_strategy import LRUEvictionStrategy
 from rlcache.strategies.eviction_strategies.rl_eviction_state import EvictionAgentSystemState, \
     EvictionAgentIncompleteExperienceEntry
 from rlcache.strategies.eviction_strategies.rl_eviction_state_converter import EvictionStrategyRLConverter
+from rlcache.utils import clock
+from rlcache.utils.indexed_heap import IndexedMinHeap
+from rlcache.utils.key_encoder import shared_key_encoder
+from rlcache.utils.event_log import OBSERVATION_COLUMNS, REWARD_COLUMNS, create_event_log
 from rlcache.utils.loggers import create_file_logger
-from rlcache.utils.vocabulary import Vocabulary
+from rlcache.utils.sampling import key_sampler_from_config
+
+_HIT_COUNT_COLUMN = EvictionAgentSystemState.__slots__.index('hit_count')
+_STEP_CODE_COLUMN = EvictionAgentSystemState.__slots__.index('step_code')
+# state fields read off the key metadata, the step code of a cached key is always Write
+_METADATA_COLUMNS = [(EvictionAgentSystemState.__slots__.index(name), name)
+                     for name in ['encoded_key', 'ttl', 'hit_count']]
 
 
 class RLEvictionStrategy(EvictionStrategy):
@@ -24,147 +40,353 @@ class RLEvictionStrategy(EvictionStrategy):
         self.observation_seen = 0
         self.episode_reward = 0
         self.checkpoint_steps = config['checkpoint_steps']
+        self.inference_only = config.get('inference_only', False)
+        # every cached key is a candidate for eviction, decisions are only tracked for the keys learned from
+        self.key_sampler = key_sampler_from_config(config)
 
         self._incomplete_experiences = TTLCache(InMemoryStorage())
         self._incomplete_experiences.expired_entry_callback(self._observe_expired_incomplete_experience)
-        self.view_of_the_cache = {}  # type: Dict[str, Dict[str, any]]
+        # the states of the cached keys are built from the key metadata, plus the encoded key column of our own
+        self.key_metadata = cache_stats.key_metadata
+        self.key_metadata.register_column('encoded_key', 'int64')
+        # sampled mode: score K random cached keys per eviction instead of the whole cache
+        self.sample_size = config.get('eviction_sample_size')
+        # batched mode: score the whole cache with one forward pass (or one per chunk) over the cached keys' states
+        self.batch_inference = config.get('batch_inference', False)
+        self.inference_batch_size = config.get('inference_batch_size')
+        # score index mode: keys written or hit are marked stale, trim_cache scores the stale keys in one batch and
+        # pops the most evictable off a min-heap, so observe never runs the agent. the whole index is re-scored once
+        # the serving policy is rescore_after_updates agent updates ahead of it.
+        self.score_index = config.get('score_index', False)
+        self.rescore_after_updates = config.get('rescore_after_updates', 100)
+        self._index_version = 0
+        self.eviction_scores = IndexedMinHeap()
+        self._stale_scores = {}  # keys whose score is out of date, in the order they went stale
         self._end_episode_observation = {ObservationType.Invalidate, ObservationType.Miss, ObservationType.Expiration}
+        # completed experiences are rewarded and observed by the agent observe_batch_size at a time
+        self.completions = CompletionBuffer(config.get('observe_batch_size', 1), self._observe_completions)
 
         # TODO refactor into common RL interface for all strategies
         # Agent configuration (can be shared with others)
         agent_config = config['agent_config']
         fields_in_state = len(EvictionAgentSystemState.__slots__)
-        self.converter = EvictionStrategyRLConverter(self.result_dir)
+        action_space = IntBox(low=0, high=2)
+        self.converter = EvictionStrategyRLConverter(self.result_dir, cache_stats)
 
         # State: fields to observe in question
         # Action: to evict or not that key
-        self.agent = Agent.from_spec(agent_config,
-                                     state_space=FloatBox(shape=(fields_in_state,)),
-                                     action_space=IntBox(low=0, high=2))
-
         self.logger = logging.getLogger(__name__)
         name = 'rl_eviction_strategy'
-        self.reward_logger = create_file_logger(name=f'{name}_reward_logger', result_dir=self.result_dir)
+        self.metrics = cache_stats.strategy_metrics[name]
+        self.reward_logger = create_event_log(f'{name}_reward_logger', self.result_dir, REWARD_COLUMNS,
+                                              cache_stats.event_log_settings)
         self.loss_logger = create_file_logger(name=f'{name}_loss_logger', result_dir=self.result_dir)
-        self.observation_logger = create_file_logger(name=f'{name}_observation_logger', result_dir=self.result_dir)
-        self.key_vocab = Vocabulary()
+        self.learner = AgentLearner(config,
+                                    agent_factory=partial(Agent.from_spec,
+                                                          agent_config,
+                                                          state_space=FloatBox(shape=(fields_in_state,)),
+                                                          action_space=action_space),
+                                    loss_logger=self.loss_logger)
+        self.policy = AgentPolicy(config, self.learner, agent_config, action_space)
+        self.observation_logger = create_event_log(f'{name}_observation_logger', self.result_dir, OBSERVATION_COLUMNS,
+                                                   cache_stats.event_log_settings)
+        self.key_encoder = shared_key_encoder(config, cache_stats.key_encoders)
+        self.checkpoint = StrategyCheckpoint(config, self.result_dir, name)
+        self.checkpoint.restore(self.policy, self.key_encoder)
+        self.latency_guard = LatencyGuard(config, 'trim_cache', cache_stats,
+                                          partial(LRUEvictionStrategy, config, self.result_dir, cache_stats,
+                                                  name=f'{name}_fallback'))
+
+    def trim_cache(self, cache: TTLCache, budget: EvictionBudget = None) -> List[str]:
+        budget = budget if budget is not None else EvictionBudget()
+        return self.latency_guard.decide(lambda: self._forget_in_fallback(self._trim_cache(cache, budget)),
+                                         lambda fallback: self._fallback_trim_cache(fallback, cache))
+
+    def _forget_in_fallback(self, evicted_keys: List[str]) -> List[str]:
+        if self.latency_guard.fallback is not None:
+            for key in evicted_keys:
+                self.latency_guard.fallback.forget(key)
+        return evicted_keys
+
+    def _fallback_trim_cache(self, fallback: LRUEvictionStrategy, cache: TTLCache) -> List[str]:
+        evicted_keys = fallback.trim_cache(cache)
+        for key in evicted_keys:
+            self.forget(key)
+        return evicted_keys
+
+    def _trim_cache(self, cache: TTLCache, budget: EvictionBudget) -> List[str]:
+        self.learner.refresh_serving_agent()
+        if self.score_index:
+            return self._indexed_trim_cache(cache, budget)
+        if self.sample_size is not None:
+            return self._sampled_trim_cache(cache, budget)
+        if self.batch_inference:
+            return self._batched_trim_cache(cache, budget)
 
-    def trim_cache(self, cache: TTLCache) -> List[str]:
         # trim cache isn't called often so the operation is ok to be expensive
-        # produce an action on the whole cache
+        # produce an action on the whole cache, or as much of it as the budget allows
         keys_to_evict = []
-        keys_to_not_evict = []
-
-        for (key, cached_key) in list(self.view_of_the_cache.items()):
-            agent_system_state = cached_key['state']
 
-            agent_action = self.agent.get_action(agent_system_state.to_numpy())
+        for key in list(self.key_metadata.keys):
+            if budget.exhausted():
+                break
+            states = self._states([key])
+            agent_action = self.policy.get_action(states[0])
+            self.candidates_scored += 1
+            budget.spend(1)
             should_evict = self.converter.agent_to_system_action(agent_action)
 
-            decision_time = time.time()
+            self._record_decisions([key], np.reshape(agent_action, (1,)), states, clock.now())
+            if should_evict:
+                self._evict(cache, key)
+                keys_to_evict.append(key)
+
+        return keys_to_evict
+
+    def _batched_trim_cache(self, cache: TTLCache, budget: EvictionBudget) -> List[str]:
+        """
+        Score the cached keys with batched forward passes over their states, evict the ones voted out. Only as many
+        keys as the budget allows are scored, the time budget is checked between chunks.
+        """
+        keys = list(self.key_metadata.keys)
+        keys = keys[:budget.allowance(len(keys))]
+        if len(keys) == 0:
+            return []
+
+        states = self._states(keys)
+        chunk_size = self.inference_batch_size or len(keys)
+        chunks = []
+        for start in range(0, len(keys), chunk_size):
+            if start > 0 and budget.out_of_time():
+                break
+            chunks.append(np.asarray(self.policy.get_action(states[start:start + chunk_size])).reshape(-1))
+        agent_actions = np.concatenate(chunks)
+        keys = keys[:len(agent_actions)]
+        self.candidates_scored += len(keys)
+        budget.spend(len(keys))
+
+        self._record_decisions(keys, agent_actions, states[:len(keys)], clock.now())
+
+        keys_to_evict = [keys[i] for i in np.flatnonzero(agent_actions == 1)]
+        for key in keys_to_evict:
+            self._evict(cache, key)
+
+        return keys_to_evict
+
+    def trim_cache_batch(self, cache: TTLCache, num_keys: int) -> List[str]:
+        """Evict the num_keys most evictable keys, scoring the candidates in a single batch."""
+        return self._forget_in_fallback(self._trim_cache_batch(cache, num_keys))
+
+    def _trim_cache_batch(self, cache: TTLCache, num_keys: int) -> List[str]:
+        self.learner.refresh_serving_agent()
+        # off the request path, nothing to bound
+        budget = EvictionBudget()
+        if self.score_index:
+            return self._indexed_trim_cache(cache, budget, num_keys)
+        if self.sample_size is not None:
+            return self._sampled_trim_cache(cache, budget, num_keys)
+        return self._evict_worst(cache, list(self.key_metadata.keys), num_keys, budget)
+
+    def _indexed_trim_cache(self, cache: TTLCache, budget: EvictionBudget, num_keys: int = 1) -> List[str]:
+        """Evict the keys with the highest eviction score, the stale scores first brought up to date."""
+        if self.learner.serving_version - self._index_version >= self.rescore_after_updates:
+            self._rescore_index(budget)
+        else:
+            self._score_stale_keys(budget)
+        if len(self.eviction_scores) == 0:
+            self.logger.error('trim_cache No keys were evicted.')
+            return []
+
+        keys_to_evict = [self.eviction_scores.pop()[0] for _ in range(min(num_keys, len(self.eviction_scores)))]
+        # the index always evicts its top keys, record them as evict decisions whatever the agent voted
+        self._record_decisions(keys_to_evict,
+                               np.repeat(self.converter.system_to_agent_action(True), len(keys_to_evict)),
+                               self._states(keys_to_evict),
+                               clock.now())
+        for eviction_key in keys_to_evict:
+            self._evict(cache, eviction_key)
+        return keys_to_evict
+
+    def _rescore_index(self, budget: EvictionBudget):
+        """
+        Policy moved on since the scores were computed, re-score every cached key in one batch. Keys over the budget
+        keep their previous score and are marked stale, later trims score them.
+        """
+        self._stale_scores = dict.fromkeys(self.key_metadata.keys)
+        self._index_version = self.learner.serving_version
+        self._score_stale_keys(budget)
+
+    def _score_stale_keys(self, budget: EvictionBudget):
+        """Score the keys written or hit since they were last scored in one batch, as many as the budget allows."""
+        keys = [key for key in self._stale_scores if key in self.key_metadata]
+        scored_keys = keys[:budget.allowance(len(keys))]
+        self._stale_scores = dict.fromkeys(keys[len(scored_keys):])
+        if len(scored_keys) > 0:
+            _, scores = self._evict_scores(self._states(scored_keys), budget)
+            for key, score in zip(scored_keys, scores):
+                self.eviction_scores.push(key, -score)
+
+    def _sampled_trim_cache(self, cache: TTLCache, budget: EvictionBudget, num_keys: int = 1) -> List[str]:
+        """Score a random sample of the cached keys in one batch and evict the worst of them."""
+        sample_size = budget.allowance(self.sample_size * num_keys)
+        if sample_size == 0:
+            return []
+        candidates = self.key_metadata.sample(sample_size)
+        return self._evict_worst(cache, candidates, num_keys, budget)
+
+    def _states(self, keys: List[str] = None) -> np.ndarray:
+        """Agent states of the given cached keys, all of them by default, as one batch built from the key metadata."""
+        rows = np.arange(len(self.key_metadata)) if keys is None else self.key_metadata.rows(keys)
+        states = np.empty((len(rows), len(EvictionAgentSystemState.__slots__)), dtype='float32')
+        for index, name in _METADATA_COLUMNS:
+            states[:, index] = self.key_metadata.columns[name][rows]
+        states[:, _STEP_CODE_COLUMN] = ObservationType.Write.value
+        return states
+
+    def _evict_worst(self, cache: TTLCache, candidates: List[str], num_keys: int, budget: EvictionBudget) -> List[str]:
+        if len(candidates) == 0:
+            self.logger.error('trim_cache No keys to evict from.')
+            return []
+
+        states = self._states(candidates)
+        agent_actions, scores = self._evict_scores(states, budget)
+        worst = np.argsort(-scores, kind='stable')[:num_keys]
+        # the worst candidates leave even if the agent voted to keep them, record what actually happened
+        agent_actions[worst] = 1
+        self._record_decisions(candidates, agent_actions, states, clock.now())
+
+        keys_to_evict = [candidates[i] for i in worst]
+        for key in keys_to_evict:
+            self._evict(cache, key)
+        return keys_to_evict
+
+    def _evict_scores(self, states: np.ndarray, budget: EvictionBudget) -> (np.ndarray, np.ndarray):
+        """
+        Run the agent over a batch of states, higher score means more worth evicting.
+
+        Keys the agent votes to evict always outrank the ones it votes to keep, ties are broken towards fewer hits.
+        """
+        agent_actions = np.asarray(self.policy.get_action(states)).reshape(len(states))
+        self.candidates_scored += len(states)
+        budget.spend(len(states))
+        hit_counts = states[:, _HIT_COUNT_COLUMN]
+        scores = (agent_actions == 1).astype('float32') - hit_counts / (1.0 + hit_counts)
+        return agent_actions, scores
+
+    def _record_decisions(self, keys: List[str], agent_actions: np.ndarray, states: np.ndarray, decision_time: float):
+        """Track the decisions on keys, states being the rows the agent decided on so none is rebuilt per key."""
+        if self.inference_only:
+            return
+        # observe the keys for only the ttl period that is left for them. read off the float64 metadata, the float32
+        # states can't hold epoch scale times
+        rows = self.key_metadata.rows(keys)
+        columns = self.key_metadata.columns
+        ttls_left = columns['insert_time'][rows] + columns['ttl'][rows] - decision_time
+        for i, key in enumerate(keys):
+            if not self.key_sampler.sampled(key):
+                continue
+            agent_system_state = EvictionAgentSystemState.from_numpy(states[i])
             incomplete_experience = EvictionAgentIncompleteExperienceEntry(agent_system_state,
-                                                                           agent_action,
+                                                                           agent_actions[i:i + 1],
                                                                            agent_system_state.copy(),
                                                                            decision_time)
+            self._incomplete_experiences.set(key=key, values=incomplete_experience, ttl=ttls_left[i].item())
 
-            # observe the key for only the ttl period that is left for this key
-            ttl_left = (cached_key['observation_time'] + agent_system_state.ttl) - decision_time
-            self._incomplete_experiences.set(key=key, values=incomplete_experience, ttl=ttl_left)
-            if should_evict:
-                del self.view_of_the_cache[key]
-                keys_to_evict.append(key)
-                if not cache.contains(key, clean_expire=False):
-                    # race condition, clean up and move on
-                    self._incomplete_experiences.delete(key)
-                cache.delete(key)
-            else:
-                keys_to_not_evict.append(key)
+    def _evict(self, cache: TTLCache, key: str):
+        self._forget_cached_key(key)
+        if not cache.contains(key, clean_expire=False):
+            # race condition, clean up and move on
+            self._incomplete_experiences.delete(key)
+        cache.delete(key)
 
-        return keys_to_evict
+    def forget(self, key: str):
+        self._forget_cached_key(key)
+        # evicted by someone else: a pending keep decision on the key says nothing about that eviction, and the
+        # Miss that may follow must not be credited to it
+        self._incomplete_experiences.delete(key)
+
+    def _forget_cached_key(self, key: str):
+        self.eviction_scores.remove(key)
+        self._stale_scores.pop(key, None)
 
     def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
-        self.observation_logger.info(f'{self.episode_num},{key},{observation_type}')
+        self.latency_guard.observe(key, observation_type, info)
+        self.observation_logger.log(self.episode_num, key, observation_type.name)
 
-        observed_key = self.converter.vocabulary.add_or_get_id(key)
         stored_experience = self._incomplete_experiences.get(key)
         if observation_type == ObservationType.Write:
             if stored_experience is not None:
                 # race condition
-                reward = self.converter.system_to_agent_reward(stored_experience,
-                                                               ObservationType.Miss,
-                                                               self.episode_num)
-                state = stored_experience.state
-                action = stored_experience.agent_action
-                new_state = state.copy()
-                new_state.step_code = ObservationType.Miss.value
-
-                self._reward_agent(state.to_numpy(), new_state.to_numpy(), action, reward)
+                self._complete_experience(stored_experience, ObservationType.Miss, stored_experience.state)
                 self._incomplete_experiences.delete(key)
 
-            # New item to write into cache view and observe.
-            ttl = info['ttl']
-            observation_time = time.time()
-            self.view_of_the_cache[key] = {'state': EvictionAgentSystemState(encoded_key=observed_key,
-                                                                             ttl=ttl,
-                                                                             hit_count=0,
-                                                                             step_code=observation_type.value),
-                                           'observation_time': observation_time}
+            # the rest of the new key's state is in the key metadata already, unless observed after the entry ended
+            if key in self.key_metadata:
+                self.key_metadata.set(key, 'encoded_key', self.key_encoder.encode(key))
+                if self.score_index:
+                    self._stale_scores[key] = None
 
         elif observation_type == ObservationType.Hit:
-            # Cache hit, update the hit record of this key in the cache
-            stored_view = self.view_of_the_cache[key]['state']
-            stored_view.hit_count += 1
+            # the key metadata counted the hit, credit it to the pending decision on the key too
+            if stored_experience is not None:
+                stored_experience.state.hit_count += 1
+            if self.score_index and key in self.key_metadata:
+                self._stale_scores[key] = None
 
         elif observation_type in self._end_episode_observation:
             if stored_experience:
-                reward = self.converter.system_to_agent_reward(stored_experience, observation_type, self.episode_num)
-                state = stored_experience.state
-                action = stored_experience.agent_action
-                new_state = state.copy()
-                new_state.step_code = observation_type.value
-
-                self._reward_agent(state.to_numpy(), new_state.to_numpy(), action, reward)
+                self._complete_experience(stored_experience, observation_type, stored_experience.state)
                 self._incomplete_experiences.delete(key)
 
-            if key in self.view_of_the_cache:
-                del self.view_of_the_cache[key]
+            self._forget_cached_key(key)
 
         self.observation_seen += 1
         if self.observation_seen % self.checkpoint_steps == 0:
+            self.checkpoint.save(self.policy, self.key_encoder)
             self.logger.info(f'Observation seen so far: {self.observation_seen}, reward so far: {self.episode_reward}')
 
     def _observe_expired_incomplete_experience(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
         """Observe decisions taken that hasn't been observed by main cache. e.g. don't cache -> ttl up -> no miss"""
         assert observation_type == ObservationType.Expiration
-        self.observation_logger.info(f'{self.episode_num},{key},{observation_type}')
+        self.observation_logger.log(self.episode_num, key, observation_type.name)
 
         experience = info['value']  # type: EvictionAgentIncompleteExperienceEntry
-        reward = self.converter.system_to_agent_reward(experience, observation_type, self.episode_num)
-        starting_state = experience.starting_state
-        action = experience.agent_action
+        self._complete_experience(experience, observation_type, experience.starting_state)
+
+    def _complete_experience(self,
+                             experience: EvictionAgentIncompleteExperienceEntry,
+                             observation_type: ObservationType,
+                             state: EvictionAgentSystemState):
+        """Queue a finished experience for the agent, `state` being the state credited with the decision."""
         new_state = experience.state.copy()
         new_state.step_code = observation_type.value
+        self.completions.add(states=state.to_numpy(),
+                             actions=np.reshape(experience.agent_action, ()),
+                             next_states=new_state.to_numpy(),
+                             observation_codes=observation_type.value,
+                             hit_gains=experience.state.hit_count - experience.starting_state.hit_count)
 
-        self._reward_agent(starting_state.to_numpy(), new_state.to_numpy(), action, reward)
-
-    def _reward_agent(self,
-                      state: np.ndarray,
-                      new_state: np.ndarray,
-                      agent_action: np.ndarray,
-                      reward: int):
-        self.agent.observe(preprocessed_states=state,
-                           actions=agent_action,
-                           internals=[],
-                           rewards=reward,
-                           next_states=new_state,
-                           terminals=False)
-        self.reward_logger.info(f'{self.episode_num},{reward}')
-
-        loss = self.agent.update()
-        if loss is not None:
-            self.loss_logger.info(f'{self.episode_num},{loss[0]}')
+    def _observe_completions(self, batch: Dict[str, np.ndarray]):
+        rewards = self.converter.system_to_agent_reward(batch['actions'],
+                                                        batch['observation_codes'],
+                                                        batch['hit_gains'],
+                                                        self.episode_num)
+        self.learner.observe(states=batch['states'],
+                             actions=batch['actions'],
+                             rewards=rewards,
+                             next_states=batch['next_states'],
+                             terminals=np.zeros(len(rewards), dtype=bool),
+                             episode_num=self.episode_num)
+        self.metrics.record_rewards(len(rewards), rewards.sum().item())
+        for reward in rewards:
+            self.reward_logger.log(self.episode_num, reward)
 
     def close(self):
+        self.completions.flush()
+        # the episode's experiences are trained on before the agents are reset
+        self.learner.stop()
+        self.checkpoint.save(self.policy, self.key_encoder)
+        self.latency_guard.close()
         super().close()
         self._incomplete_experiences.clear()
-        self.agent.reset()
+        self.learner.reset()
@@ -1,7 +1,8 @@
 import logging
-from typing import Dict
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 
-import time
+import numpy as np
 from rlgraph.agents import Agent
 from rlgraph.spaces import Dict as RLDict, IntBox
 from rlgraph.spaces import FloatBox
@@ -9,11 +10,23 @@ from rlgraph.spaces import FloatBox
 from rlcache.backend import InMemoryStorage, TTLCache
 from rlcache.cache_constants import OperationType, CacheInformation
 from rlcache.observer import ObservationType
+from rlcache.rl_model.checkpoint import StrategyCheckpoint
+from rlcache.rl_model.experience_table import ExperienceTable
+from rlcache.rl_model.inflight_limiter import InFlightLimiter
+from rlcache.rl_model.latency_guard import LatencyGuard
+from rlcache.rl_model.learner import AgentLearner
+from rlcache.rl_model.policy import AgentPolicy
 from rlcache.strategies.base_strategy import BaseStrategy
-from rlcache.strategies.multi_task.rl_multi_task_cache_strategy_state import MultiTaskAgentSystemState, \
-    MultiTaskAgentObservedExperience
+from rlcache.strategies.eviction_strategies.base_eviction_strategy import EvictionBudget
+from rlcache.strategies.eviction_strategies.lru_eviction_strategy import LRUEvictionStrategy
+from rlcache.strategies.multi_task.rl_multi_task_cache_strategy_state import MultiTaskAgentSystemState
+from rlcache.strategies.ttl_estimation_strategies.fixed_ttl_strategy import FixedTtlStrategy
+from rlcache.utils import clock
+from rlcache.utils.key_encoder import shared_key_encoder
+from rlcache.utils.event_log import OBSERVATION_COLUMNS, PERFORMANCE_COLUMNS, REWARD_COLUMNS, TTL_COLUMNS, \
+    create_event_log
 from rlcache.utils.loggers import create_file_logger
-from rlcache.utils.vocabulary import Vocabulary
+from rlcache.utils.sampling import key_sampler_from_config
 
 
 class RLMultiTasksStrategy(BaseStrategy):
@@ -29,10 +42,24 @@ class RLMultiTasksStrategy(BaseStrategy):
         self.observation_seen = 0
         self.cum_reward = 0
         self.checkpoint_steps = config['checkpoint_steps']
+        # a frozen policy learns nothing, no experiences are kept
+        self.inference_only = config.get('inference_only', False)
 
+        # key -> slot of its in-flight experience in self.experiences
         self._incomplete_experiences = TTLCache(InMemoryStorage())
         self._incomplete_experiences.expired_entry_callback(self._observe_expiry_eviction)
+        self.experiences = ExperienceTable(MultiTaskAgentSystemState.field_names(),
+                                           actions={'ttl': ((), 'int64'), 'eviction': ((), 'int64')},
+                                           flags=['manual_eviction', 'sampled'])
+        # the experiences of every admitted key are tracked, they refine its eviction state, only the experiences of
+        # sampled keys are handed to the agent
+        self.key_sampler = key_sampler_from_config(config)
         self.non_terminal_observations = {ObservationType.EvictionPolicy, ObservationType.Expiration}
+        # sampled mode: score K random cached keys per eviction instead of every observed key
+        self.eviction_sample_size = config.get('eviction_sample_size')
+        self.key_metadata = cache_stats.key_metadata
+        # number of keys scored by trim_cache so far, lets the cache manager bound the work spent per insert
+        self.candidates_scored = 0
 
         agent_config = config['agent_config']
         self.maximum_ttl = config['max_ttl']
@@ -44,114 +71,252 @@ class RLMultiTasksStrategy(BaseStrategy):
             'eviction': IntBox(low=0, high=2)
         })
 
-        self.agent = Agent.from_spec(agent_config,
-                                     state_space=FloatBox(shape=(fields_in_state,)),
-                                     action_space=action_space)
-
         # TODO refactor into common RL interface for all strategies
         self.logger = logging.getLogger(__name__)
         name = 'rl_multi_strategy'
-        self.reward_logger = create_file_logger(name=f'{name}_reward_logger', result_dir=self.result_dir)
+        self.metrics = cache_stats.strategy_metrics[name]
+        self.reward_logger = create_event_log(f'{name}_reward_logger', self.result_dir, REWARD_COLUMNS,
+                                              cache_stats.event_log_settings)
         self.loss_logger = create_file_logger(name=f'{name}_loss_logger', result_dir=self.result_dir)
-        self.ttl_logger = create_file_logger(name=f'{name}_ttl_logger', result_dir=self.result_dir)
-        self.observation_logger = create_file_logger(name=f'{name}_observation_logger', result_dir=self.result_dir)
-        self.performance_logger = create_file_logger(name=f'{name}_performance_logger', result_dir=self.result_dir)
-        self.key_vocab = Vocabulary()
+        self.learner = AgentLearner(config,
+                                    agent_factory=partial(Agent.from_spec,
+                                                          agent_config,
+                                                          state_space=FloatBox(shape=(fields_in_state,)),
+                                                          action_space=action_space),
+                                    loss_logger=self.loss_logger)
+        self.policy = AgentPolicy(config, self.learner, agent_config, action_space)
+        self.ttl_logger = create_event_log(f'{name}_ttl_logger', self.result_dir, TTL_COLUMNS,
+                                           cache_stats.event_log_settings)
+        self.observation_logger = create_event_log(f'{name}_observation_logger', self.result_dir, OBSERVATION_COLUMNS,
+                                                   cache_stats.event_log_settings)
+        self.performance_logger = create_event_log(f'{name}_performance_logger', self.result_dir, PERFORMANCE_COLUMNS,
+                                                   cache_stats.event_log_settings)
+        self.key_encoder = shared_key_encoder(config, cache_stats.key_encoders)
+        # bounds the in-flight experiences, the eviction candidates are the cached keys whether tracked or not
+        self.inflight = InFlightLimiter(config, name, cache_stats, self.maximum_ttl)
+        self.checkpoint = StrategyCheckpoint(config, self.result_dir, name)
+        self.checkpoint.restore(self.policy, self.key_encoder)
+
+        self.ttl_guard = LatencyGuard(config, 'estimate_ttl', cache_stats,
+                                      partial(FixedTtlStrategy,
+                                              {'ttl': config.get('latency_fallback_ttl', 60)},
+                                              self.result_dir,
+                                              cache_stats,
+                                              name=f'{name}_ttl_fallback'))
+        self.eviction_guard = LatencyGuard(config, 'trim_cache', cache_stats,
+                                           partial(LRUEvictionStrategy, config, self.result_dir, cache_stats,
+                                                   name=f'{name}_eviction_fallback'))
+        self.learned_observations = set(self.supported_observations)
+        if self.eviction_guard.enabled:
+            # the LRU fallback keeps its own view of the cache
+            self.supported_observations |= {ObservationType.Write, ObservationType.Expiration}
 
     def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
-        observed_experience = self._incomplete_experiences.get(key)
+        self.ttl_guard.observe(key, observation_type, info)
+        self.eviction_guard.observe(key, observation_type, info)
+        if observation_type not in self.learned_observations:
+            return
+
+        slot = self._incomplete_experiences.get(key)
 
-        if observed_experience is None:
+        if slot is None:
             return  # haven't had to make a decision on it
 
-        current_time = time.time()
-        stored_state = observed_experience.state
+        current_time = clock.now()
+        experiences = self.experiences
 
-        stored_state.step_code = observation_type.value
-        stored_state.cache_utility = self.cache_stats.cache_utility
+        experiences.set_field(slot, 'step_code', observation_type.value)
+        experiences.set_field(slot, 'cache_utility', self.cache_stats.cache_utility)
 
         if observation_type == ObservationType.Hit:
-            stored_state.hit_count += 1
+            experiences.increment(slot, 'hit_count')
         else:
             # Include eviction, invalidation, and miss
-            estimated_ttl = observed_experience.agent_action['ttl'].item()
-            first_observation_time = observed_experience.observation_time
+            estimated_ttl = experiences.action(slot, 'ttl').item()
+            first_observation_time = experiences.observation_times[slot]
             real_ttl = current_time - first_observation_time
+            hit_count = int(experiences.field(slot, 'hit_count'))
             # log the difference between the estimated ttl and real ttl
-            self.ttl_logger.info(
-                f'{self.episode_num},{observation_type.name},{key},{estimated_ttl},{real_ttl},{stored_state.hit_count}')
+            self.metrics.record_ttl(estimated_ttl, real_ttl)
+            self.ttl_logger.log(self.episode_num, observation_type.name, key, estimated_ttl, real_ttl, hit_count)
             self._incomplete_experiences.delete(key)
+            self.inflight.completed(key)
 
-        self.reward_agent(observation_type, observed_experience)
+        self.reward_agent(observation_type, slot)
+        if observation_type != ObservationType.Hit:
+            experiences.free(slot)
 
         self.observation_seen += 1
         if self.observation_seen % self.checkpoint_steps == 0:
+            self.checkpoint.save(self.policy, self.key_encoder)
             self.logger.info(
                 f'Observation seen so far: {self.observation_seen}, reward so far: {self.cum_reward}')
         if observation_type not in self.non_terminal_observations:
-            self.observation_logger.info(f'{key},{observation_type}')
+            self.observation_logger.log(self.episode_num, key, observation_type.name)
+
+    def trim_cache(self, cache: TTLCache, budget: EvictionBudget = None):
+        budget = budget if budget is not None else EvictionBudget()
+        return self.eviction_guard.decide(lambda: self._forget_in_fallback(self._trim_cache(cache, budget)),
+                                          lambda fallback: self._fallback_trim_cache(fallback, cache))
+
+    def _forget_in_fallback(self, evicted_keys: List[str]) -> List[str]:
+        if self.eviction_guard.fallback is not None:
+            for key in evicted_keys:
+                self.eviction_guard.fallback.forget(key)
+        return evicted_keys
+
+    def _fallback_trim_cache(self, fallback: LRUEvictionStrategy, cache: TTLCache) -> List[str]:
+        # evicted keys leave the key metadata, so they are no longer eviction candidates, their experiences go on
+        return fallback.trim_cache(cache)
+
+    def _trim_cache(self, cache: TTLCache, budget: EvictionBudget):
+        if self.eviction_sample_size is not None:
+            return self._sampled_trim_cache(cache, budget)
 
-    def trim_cache(self, cache: TTLCache):
         # trim cache isn't called often so the operation is ok to be expensive
-        # produce an action on the whole cache
+        # produce an action on the whole cache, or as much of it as the budget allows
         keys_to_evict = []
-
-        for (key, stored_experience) in list(self._incomplete_experiences.items()):
-            action = self.agent.get_action(stored_experience.state.to_numpy())['eviction']
+        self._incomplete_experiences.expire(clock.now())
+
+        for key in list(self.key_metadata.keys):
+            if budget.exhausted():
+                break
+            if not cache.contains(key, clean_expire=False):
+                continue  # already evicted, or dropped by the cache
+            states, slots = self._eviction_states([key])
+            action = self.policy.get_action(states[0])['eviction']
+            self.candidates_scored += 1
+            budget.spend(1)
             evict = (action.flatten() == 1).item()
             if evict:
                 cache.delete(key)
                 keys_to_evict.append(key)
-            # update stored value for eviction action
-            stored_experience.agent_action['eviction'] = action
-            stored_experience.manual_eviction = True
+            if slots[0] is not None:
+                # update stored value for eviction action
+                self.experiences.set_action(slots[0], action, 'eviction')
+                self.experiences.set_flag(slots[0], 'manual_eviction')
 
         if len(keys_to_evict) == 0:
             self.logger.error('trim_cache No keys were evicted.')
 
         return keys_to_evict
 
+    def trim_cache_batch(self, cache: TTLCache, num_keys: int):
+        """Evict the num_keys most evictable keys, scoring the candidates in a single batch."""
+        # off the request path, nothing to bound
+        return self._forget_in_fallback(self._sampled_trim_cache(cache, EvictionBudget(), num_keys))
+
+    def _sampled_trim_cache(self, cache: TTLCache, budget: EvictionBudget, num_keys: int = 1):
+        """Score a random sample of the cached keys in one batch and evict the worst of them."""
+        if budget.exhausted():
+            return []
+        if self.eviction_sample_size is None:
+            sampled_keys = list(self.key_metadata.keys)
+            sampled_keys = sampled_keys[:budget.allowance(len(sampled_keys))]
+        else:
+            sampled_keys = self.key_metadata.sample(budget.allowance(self.eviction_sample_size * num_keys))
+        # expire once up front, expiring while collecting could free slots that were already collected
+        self._incomplete_experiences.expire(clock.now())
+        candidates = [key for key in sampled_keys if cache.contains(key, clean_expire=False)]
+        if len(candidates) == 0:
+            self.logger.error('trim_cache No keys were evicted.')
+            return []
+
+        states, slots = self._eviction_states(candidates)
+        eviction_actions = np.asarray(self.policy.get_action(states)['eviction']).reshape(len(candidates))
+        self.candidates_scored += len(candidates)
+        budget.spend(len(candidates))
+
+        # keys voted for eviction outrank the rest, ties are broken towards fewer hits
+        hit_counts = states[:, self.experiences.field_index['hit_count']]
+        scores = (eviction_actions == 1).astype('float32') - hit_counts / (1.0 + hit_counts)
+        worst = np.argsort(-scores, kind='stable')[:num_keys]
+        # the worst candidates leave even if the agent voted to keep them, record what actually happened
+        eviction_actions[worst] = 1
+
+        for i, slot in enumerate(slots):
+            if slot is not None:
+                self.experiences.set_action(slot, eviction_actions[i], 'eviction')
+                self.experiences.set_flag(slot, 'manual_eviction')
+
+        keys_to_evict = [candidates[i] for i in worst]
+        for key in keys_to_evict:
+            cache.delete(key)
+        return keys_to_evict
+
+    def _eviction_states(self, keys: List[str]) -> Tuple[np.ndarray, List[Optional[int]]]:
+        """
+        States of cached keys to score for eviction, and their experience slots. A key with an in-flight experience
+        is scored on its state, the others (not admitted, or admitted but dropped) on one built from their key
+        metadata: they are as much eviction candidates as the keys learned from.
+        """
+        slots = [self._incomplete_experiences.get(key, clean_expire=False) for key in keys]
+        states = np.empty((len(keys), len(self.experiences.field_index)), dtype='float32')
+        cache_utility = self.cache_stats.cache_utility
+        for i, (key, slot) in enumerate(zip(keys, slots)):
+            if slot is not None:
+                states[i] = self.experiences.state(slot)
+            else:
+                states[i] = self.experiences.make_state(encoded_key=self.key_encoder.encode(key),
+                                                        hit_count=self.key_metadata.get(key, 'hit_count'),
+                                                        cache_utility=cache_utility)
+        return states, slots
+
+    def forget(self, key: str):
+        """Key was evicted by the fallback policy, it leaves the key metadata so there is nothing to drop."""
+        pass
+
     def should_cache(self, key: str, values: Dict[str, str], ttl: int, operation_type: OperationType) -> bool:
         # cache objects that have TTL more than 1 second (maybe make this configurable?)
         return ttl > 10
 
     def estimate_ttl(self, key: str, values: Dict[str, any], operation_type: OperationType) -> float:
+        return self.ttl_guard.decide(lambda: self._estimate_ttl(key, values, operation_type),
+                                     lambda fallback: fallback.estimate_ttl(key, values, operation_type))
+
+    def _estimate_ttl(self, key: str, values: Dict[str, any], operation_type: OperationType) -> float:
         # TODO check if it is in the observed queue
 
-        observation_time = time.time()
-        encoded_key = self.key_vocab.add_or_get_id(key)
+        observation_time = clock.now()
+        encoded_key = self.key_encoder.encode(key)
         cache_utility = self.cache_stats.cache_utility
 
-        state = MultiTaskAgentSystemState(encoded_key=encoded_key,
-                                          hit_count=0,
-                                          ttl=0,
-                                          step_code=0,
-                                          cache_utility=cache_utility,
-                                          operation_type=operation_type.value)
+        state = self.experiences.make_state(encoded_key=encoded_key,
+                                            cache_utility=cache_utility,
+                                            operation_type=operation_type.value)
 
-        state_as_numpy = state.to_numpy()
-        agent_action = self.agent.get_action(state_as_numpy)
+        agent_action = self.policy.get_action(state)
         action = agent_action['ttl'].item()
-
-        incomplete_experience = MultiTaskAgentObservedExperience(state=state,
-                                                                 agent_action=agent_action,
-                                                                 starting_state=state.copy(),
-                                                                 observation_time=observation_time,
-                                                                 manual_eviction=False)
-        self._incomplete_experiences.set(key, incomplete_experience, self.maximum_ttl)
+        if self.inference_only:
+            return action
+
+        previous_slot = self._incomplete_experiences.get(key)
+        admitted, dropped_key = self.inflight.admit(key)
+        if not admitted:
+            return action
+        if dropped_key is not None:
+            self._drop_experience(dropped_key)
+        if previous_slot is not None:
+            self.experiences.free(previous_slot)  # the new decision overwrites the previous one
+        slot = self.experiences.add(state, agent_action, observation_time)
+        self.experiences.set_flag(slot, 'sampled', self.key_sampler.sampled(key))
+        self._incomplete_experiences.set(key, slot, self.inflight.max_age)
 
         return action
 
-    def reward_agent(self, observation_type: ObservationType, experience: MultiTaskAgentObservedExperience) -> int:
+    def reward_agent(self, observation_type: ObservationType, slot: int) -> int:
+        if self.inference_only:
+            return 0
         # reward more utilisation of the cache capacity given more hits
-        final_state = experience.state
+        experiences = self.experiences
+        agent_action = {'ttl': experiences.action(slot, 'ttl'), 'eviction': experiences.action(slot, 'eviction')}
 
         # difference_in_ttl = -abs((experience.agent_action.item() + 1) / min(real_ttl, self.maximum_ttl))
         reward = 0
         terminal = False
 
         if observation_type == observation_type.Invalidate and (
-                experience.agent_action['ttl'] < 10 or (experience.agent_action['eviction'].flatten() == 1).item()):
+                agent_action['ttl'] < 10 or (agent_action['eviction'].flatten() == 1).item()):
             # if evicted or not cached, followed by an invalidate
             reward = 10
             terminal = True
@@ -162,60 +327,70 @@ class RLMultiTasksStrategy(BaseStrategy):
             terminal = False
             reward = 1
 
-        if experience.manual_eviction:
+        if experiences.flag(slot, 'manual_eviction'):
             if observation_type == observation_type.Expiration:
                 reward = -10
                 terminal = True
             if observation_type == observation_type.Hit:
                 reward = 2
 
-            self.performance_metric_for_eviction(experience, observation_type)
+            self.performance_metric_for_eviction(slot, observation_type)
 
-        self.agent.observe(preprocessed_states=experience.starting_state.to_numpy(),
-                           actions=experience.agent_action,
-                           internals=[],
-                           rewards=terminal,
-                           next_states=final_state.to_numpy(),
-                           terminals=True)
+        if experiences.flag(slot, 'sampled'):
+            self.learner.observe(states=experiences.starting_state(slot).copy(),
+                                 actions=agent_action,
+                                 rewards=terminal,
+                                 next_states=experiences.state(slot).copy(),
+                                 terminals=True,
+                                 episode_num=self.episode_num)
 
         self.cum_reward += reward
-        self.reward_logger.info(f'{self.episode_num},{reward}')
-        # TODO use self.agent.update_schedule to decide when to call update
-        loss = self.agent.update()
-        if loss is not None:
-            self.loss_logger.info(f'{self.episode_num},{loss[0]}')
+        self.metrics.record_rewards(1, reward)
+        self.reward_logger.log(self.episode_num, reward)
 
         return reward
 
     def _observe_expiry_eviction(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
         """Observe decisions taken that hasn't been observed by main cache. e.g. don't cache -> ttl up -> no miss"""
-        self.observation_logger.info(f'{self.episode_num},{key},{observation_type}')
-        experience = info['value']  # type: MultiTaskAgentObservedExperience
-        self.ttl_logger.info(
-            f'{self.episode_num},{observation_type.name},{key},{experience.agent_action["ttl"].item()},'
-            f'{experience.agent_action["ttl"].item()},{experience.state.hit_count}')
-        experience.state.step_code = observation_type.value
-
-        self.reward_agent(observation_type, experience)
+        self.observation_logger.log(self.episode_num, key, observation_type.name)
+        self.inflight.completed(key)
+        slot = info['value']
+        estimated_ttl = self.experiences.action(slot, 'ttl').item()
+        self.metrics.record_ttl(estimated_ttl, estimated_ttl)
+        self.ttl_logger.log(self.episode_num, observation_type.name, key, estimated_ttl, estimated_ttl,
+                            int(self.experiences.field(slot, 'hit_count')))
+        self.experiences.set_field(slot, 'step_code', observation_type.value)
+
+        self.reward_agent(observation_type, slot)
+        self.experiences.free(slot)
+
+    def _drop_experience(self, key: str):
+        """Stop tracking the key's in-flight experience without learning from it, making room for a new one."""
+        slot = self._incomplete_experiences.get(key, clean_expire=False)
+        if slot is not None:
+            self._incomplete_experiences.delete(key)
+            self.experiences.free(slot)
 
-    def performance_metric_for_eviction(self,
-                                        stored_experience: MultiTaskAgentObservedExperience,
-                                        observation_type: ObservationType) -> int:
-        should_evict = (stored_experience.agent_action['eviction'].flatten() == 1).item()
+    def performance_metric_for_eviction(self, slot: int, observation_type: ObservationType) -> int:
+        should_evict = (self.experiences.action(slot, 'eviction').flatten() == 1).item()
 
         if observation_type == ObservationType.Expiration:
             if should_evict:
                 # reward if should evict didn't observe any follow up miss
-                self.performance_logger.info(f'{self.episode_num},TrueEvict')
+                self.metrics.eviction_outcomes['TrueEvict'] += 1
+                self.performance_logger.log(self.episode_num, 'TrueEvict')
             # else didn't evict
             else:
                 # reward for not evicting a key that received more hits.
                 # or 0 if it didn't evict but also didn't get any hits
-                gain_for_not_evicting = stored_experience.state.hit_count - stored_experience.starting_state.hit_count
+                gain_for_not_evicting = (self.experiences.field(slot, 'hit_count')
+                                         - self.experiences.starting_field(slot, 'hit_count'))
                 if gain_for_not_evicting > 0:
-                    self.performance_logger.info(f'{self.episode_num},TrueMiss')
+                    self.metrics.eviction_outcomes['TrueMiss'] += 1
+                    self.performance_logger.log(self.episode_num, 'TrueMiss')
                 else:
-                    self.performance_logger.info(f'{self.episode_num},MissEvict')
+                    self.metrics.eviction_outcomes['MissEvict'] += 1
+                    self.performance_logger.log(self.episode_num, 'MissEvict')
 
                 return gain_for_not_evicting
 
@@ -223,26 +398,40 @@ class RLMultiTasksStrategy(BaseStrategy):
             # Set/Delete, remove entry from the cache.
             # reward an eviction followed by invalidation.
             if should_evict:
-                self.performance_logger.info(f'{self.episode_num},TrueEvict')
+                self.metrics.eviction_outcomes['TrueEvict'] += 1
+                self.performance_logger.log(self.episode_num, 'TrueEvict')
             else:
                 # punish not evicting a key that got invalidated after.
-                self.performance_logger.info(f'{self.episode_num},MissEvict')
+                self.metrics.eviction_outcomes['MissEvict'] += 1
+                self.performance_logger.log(self.episode_num, 'MissEvict')
 
         elif observation_type == ObservationType.Miss:
             if should_evict:
-                self.performance_logger.info(f'{self.episode_num},FalseEvict')
+                self.metrics.eviction_outcomes['FalseEvict'] += 1
+                self.performance_logger.log(self.episode_num, 'FalseEvict')
             # Miss after making an eviction decision
             # Punish, a read after an eviction decision
 
     def close(self):
-        for (k, v) in list(self._incomplete_experiences.items()):
-            self.ttl_logger.info(
-                f'{self.episode_num},{ObservationType.EndOfEpisode.name},{k},{v.agent_action["ttl"].item()},'
-                f'{v.agent_action["ttl"].item()},{v.state.hit_count}')
-            self.performance_logger.info(f'{self.episode_num},TrueMiss')
+        for (k, slot) in list(self._incomplete_experiences.items()):
+            estimated_ttl = self.experiences.action(slot, 'ttl').item()
+            self.metrics.record_ttl(estimated_ttl, estimated_ttl)
+            self.ttl_logger.log(self.episode_num, ObservationType.EndOfEpisode.name, k, estimated_ttl, estimated_ttl,
+                                int(self.experiences.field(slot, 'hit_count')))
+            self.metrics.eviction_outcomes['TrueMiss'] += 1
+            self.performance_logger.log(self.episode_num, 'TrueMiss')
+        # the episode's experiences are trained on before the agents are reset
+        self.learner.stop()
+        self.checkpoint.save(self.policy, self.key_encoder)
+        self.ttl_guard.close()
+        self.eviction_guard.close()
+        dropped_ratio = self.cache_stats.dropped_experience_ratio.get(self.inflight.name, 0.0)
+        self.logger.info(f'Experiences dropped over the in-flight cap: {dropped_ratio * 100:.2f}%')
         super().close()
         self._incomplete_experiences.clear()
+        self.experiences.clear()
+        self.inflight.clear()
         try:
-            self.agent.reset()
+            self.learner.reset()
         except Exception as e:
             pass
@@ -25,13 +25,3 @@ class MultiTaskAgentSystemState(AgentSystemState):
     @classmethod
     def from_numpy(cls, encoded: np.ndarray):
         return cls(encoded[0], encoded[1], encoded[2], encoded[3], encoded[4], encoded[5])
-
-
-@dataclass
-class MultiTaskAgentObservedExperience(object):
-    __slots__ = ['state', 'agent_action', 'starting_state', 'observation_time', 'manual_eviction']
-    state: MultiTaskAgentSystemState
-    agent_action: np.ndarray
-    starting_state: MultiTaskAgentSystemState
-    observation_time: float
-    manual_eviction: bool
@@ -22,12 +22,3 @@ class TTLAgentSystemState(AgentSystemState):
     @classmethod
     def from_numpy(cls, encoded: np.ndarray):
         return cls(encoded[0], encoded[1], encoded[2], encoded[3], encoded[4])
-
-
-@dataclass
-class TTLAgentObservedExperience(object):
-    __slots__ = ['state', 'agent_action', 'starting_state', 'observation_time']
-    state: TTLAgentSystemState
-    agent_action: np.ndarray
-    starting_state: TTLAgentSystemState
-    observation_time: float
@@ -1,4 +1,5 @@
 import logging
+from functools import partial
 from typing import Dict
 
 import time
@@ -8,11 +9,20 @@ from rlgraph.spaces import FloatBox
 from rlcache.backend import TTLCache, InMemoryStorage
 from rlcache.cache_constants import OperationType, CacheInformation
 from rlcache.observer import ObservationType
+from rlcache.rl_model.checkpoint import StrategyCheckpoint
+from rlcache.rl_model.experience_table import ExperienceTable
+from rlcache.rl_model.inflight_limiter import InFlightLimiter
+from rlcache.rl_model.latency_guard import LatencyGuard
+from rlcache.rl_model.learner import AgentLearner
+from rlcache.rl_model.policy import AgentPolicy
 from rlcache.strategies.ttl_estimation_strategies.base_ttl_strategy import TtlStrategy
-from rlcache.strategies.ttl_estimation_strategies.rl_ttl_state import TTLAgentObservedExperience, \
-    TTLAgentSystemState
+from rlcache.strategies.ttl_estimation_strategies.fixed_ttl_strategy import FixedTtlStrategy
+from rlcache.strategies.ttl_estimation_strategies.rl_ttl_state import TTLAgentSystemState
+from rlcache.utils import clock
+from rlcache.utils.key_encoder import shared_key_encoder
+from rlcache.utils.event_log import OBSERVATION_COLUMNS, REWARD_COLUMNS, TTL_COLUMNS, create_event_log
 from rlcache.utils.loggers import create_file_logger
-from rlcache.utils.vocabulary import Vocabulary
+from rlcache.utils.sampling import key_sampler_from_config
 
 
 class RLTtlStrategy(TtlStrategy):
@@ -23,103 +33,153 @@ class RLTtlStrategy(TtlStrategy):
         self.observation_seen = 0
         self.cum_reward = 0
         self.checkpoint_steps = config['checkpoint_steps']
+        self.inference_only = config.get('inference_only', False)
+        # decisions are made for every key, experiences are only tracked for the keys learned from
+        self.key_sampler = key_sampler_from_config(config)
 
+        # key -> slot of its in-flight experience in self.experiences
         self._incomplete_experiences = TTLCache(InMemoryStorage())
         self._incomplete_experiences.expired_entry_callback(self._observe_expiry_eviction)
+        self.experiences = ExperienceTable(TTLAgentSystemState.field_names(), actions={'action': ((1,), 'float32')})
         self.non_terminal_observations = {ObservationType.EvictionPolicy, ObservationType.Expiration}
         agent_config = config['agent_config']
         self.maximum_ttl = config['max_ttl']
         self.experimental_reward = config.get('experimental_reward', False)
         fields_in_state = len(TTLAgentSystemState.__slots__)
-        self.agent = Agent.from_spec(agent_config,
-                                     state_space=FloatBox(shape=(fields_in_state,)),
-                                     action_space=FloatBox(low=0, high=self.maximum_ttl, shape=(1,)))
+        action_space = FloatBox(low=0, high=self.maximum_ttl, shape=(1,))
 
         # TODO refactor into common RL interface for all strategies
         self.logger = logging.getLogger(__name__)
         name = 'rl_ttl_strategy'
-        self.reward_logger = create_file_logger(name=f'{name}_reward_logger', result_dir=self.result_dir)
+        self.metrics = cache_stats.strategy_metrics[name]
+        self.reward_logger = create_event_log(f'{name}_reward_logger', self.result_dir, REWARD_COLUMNS,
+                                              cache_stats.event_log_settings)
         self.loss_logger = create_file_logger(name=f'{name}_loss_logger', result_dir=self.result_dir)
-        self.ttl_logger = create_file_logger(name=f'{name}_ttl_logger', result_dir=self.result_dir)
-        self.observation_logger = create_file_logger(name=f'{name}_observation_logger', result_dir=self.result_dir)
-        self.key_vocab = Vocabulary()
+        self.learner = AgentLearner(config,
+                                    agent_factory=partial(Agent.from_spec,
+                                                          agent_config,
+                                                          state_space=FloatBox(shape=(fields_in_state,)),
+                                                          action_space=action_space),
+                                    loss_logger=self.loss_logger)
+        self.policy = AgentPolicy(config, self.learner, agent_config, action_space)
+        self.ttl_logger = create_event_log(f'{name}_ttl_logger', self.result_dir, TTL_COLUMNS,
+                                           cache_stats.event_log_settings)
+        self.observation_logger = create_event_log(f'{name}_observation_logger', self.result_dir, OBSERVATION_COLUMNS,
+                                                   cache_stats.event_log_settings)
+        self.key_encoder = shared_key_encoder(config, cache_stats.key_encoders)
+        # bounds the in-flight experiences, they are force-completed after `inflight.max_age` seconds
+        self.inflight = InFlightLimiter(config, name, cache_stats, self.maximum_ttl)
+        self.checkpoint = StrategyCheckpoint(config, self.result_dir, name)
+        self.checkpoint.restore(self.policy, self.key_encoder)
         self.errors = create_file_logger(name=f'{name}_error_logger', result_dir=self.result_dir)
+        self.latency_guard = LatencyGuard(config, 'estimate_ttl', cache_stats,
+                                          partial(FixedTtlStrategy,
+                                                  {'ttl': config.get('latency_fallback_ttl', 60)},
+                                                  self.result_dir,
+                                                  cache_stats,
+                                                  name=f'{name}_fallback'))
 
     def estimate_ttl(self, key: str,
                      values: Dict[str, any],
                      operation_type: OperationType) -> float:
-        observation_time = time.time()
-        encoded_key = self.key_vocab.add_or_get_id(key)
+        return self.latency_guard.decide(lambda: self._estimate_ttl(key, values, operation_type),
+                                         lambda fallback: fallback.estimate_ttl(key, values, operation_type))
+
+    def _estimate_ttl(self, key: str,
+                      values: Dict[str, any],
+                      operation_type: OperationType) -> float:
+        observation_time = clock.now()
+        encoded_key = self.key_encoder.encode(key)
         cache_utility = self.cache_stats.cache_utility
 
-        state = TTLAgentSystemState(encoded_key=encoded_key,
-                                    hit_count=0,
-                                    step_code=0,
-                                    cache_utility=cache_utility,
-                                    operation_type=operation_type.value)
+        state = self.experiences.make_state(encoded_key=encoded_key,
+                                            cache_utility=cache_utility,
+                                            operation_type=operation_type.value)
 
-        state_as_numpy = state.to_numpy()
-        agent_action = self.agent.get_action(state_as_numpy)
+        agent_action = self.policy.get_action(state)
         action = agent_action.item()
-
-        incomplete_experience = TTLAgentObservedExperience(state=state,
-                                                           agent_action=agent_action,
-                                                           starting_state=state.copy(),
-                                                           observation_time=observation_time)
-        self._incomplete_experiences.set(key, incomplete_experience, self.maximum_ttl)
+        if self.inference_only or not self.key_sampler.sampled(key):
+            return action  # nothing will be learned from the decision, don't track it
+        previous_slot = self._incomplete_experiences.get(key)
+        admitted, dropped_key = self.inflight.admit(key)
+        if not admitted:
+            return action
+        if dropped_key is not None:
+            self._drop_experience(dropped_key)
+        if previous_slot is not None:
+            self.experiences.free(previous_slot)  # the new decision overwrites the previous one
+        slot = self.experiences.add(state, {'action': agent_action}, observation_time)
+        self._incomplete_experiences.set(key, slot, self.inflight.max_age)
 
         return action
 
     def observe(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
-        observed_experience = self._incomplete_experiences.get(key)
+        self.latency_guard.observe(key, observation_type, info)
+        slot = self._incomplete_experiences.get(key)
 
-        if observed_experience is None or observation_type == ObservationType.Expiration:
+        if slot is None or observation_type == ObservationType.Expiration:
             return  # haven't had to make a decision on it
 
-        current_time = time.time()
-        stored_state = observed_experience.state
+        current_time = clock.now()
+        experiences = self.experiences
         if observation_type == ObservationType.Hit:
-            stored_state.hit_count += 1
+            experiences.increment(slot, 'hit_count')
         # elif observation_type in self.non_terminal_observations:
         #     # it was evicted by another policy don't attempt to learn stuff from this
         #     pass
 
-        estimated_ttl = observed_experience.agent_action.item()
-        first_observation_time = observed_experience.observation_time
+        estimated_ttl = experiences.action(slot).item()
+        first_observation_time = experiences.observation_times[slot]
         real_ttl = current_time - first_observation_time
-        stored_state.step_code = observation_type.value
-        stored_state.cache_utility = self.cache_stats.cache_utility
-        self.reward_agent(observation_type, observed_experience, real_ttl)
+        experiences.set_field(slot, 'step_code', observation_type.value)
+        experiences.set_field(slot, 'cache_utility', self.cache_stats.cache_utility)
+        self.reward_agent(observation_type, slot, real_ttl)
 
         if observation_type != ObservationType.Hit:
-            self.ttl_logger.info(
-                f'{self.episode_num},{observation_type.name},{key},{estimated_ttl},{real_ttl},{stored_state.hit_count}')
+            hit_count = int(experiences.field(slot, 'hit_count'))
+            self.metrics.record_ttl(estimated_ttl, real_ttl)
+            self.ttl_logger.log(self.episode_num, observation_type.name, key, estimated_ttl, real_ttl, hit_count)
             self._incomplete_experiences.delete(key)
+            self.inflight.completed(key)
+            experiences.free(slot)
 
         self.observation_seen += 1
         if self.observation_seen % self.checkpoint_steps == 0:
+            self.checkpoint.save(self.policy, self.key_encoder)
             self.logger.info(
                 f'Observation seen so far: {self.observation_seen}, reward so far: {self.cum_reward}')
         if observation_type not in self.non_terminal_observations:
-            self.observation_logger.info(f'{key},{observation_type}')
+            self.observation_logger.log(self.episode_num, key, observation_type.name)
 
     def _observe_expiry_eviction(self, key: str, observation_type: ObservationType, info: Dict[str, any]):
         """Observe decisions taken that hasn't been observed by main cache. e.g. don't cache -> ttl up -> no miss"""
-        self.observation_logger.info(f'{self.episode_num},{key},{observation_type}')
-        experience = info['value']  # type: TTLAgentObservedExperience
-        self.ttl_logger.info(f'{self.episode_num},{observation_type.name},{key},{experience.agent_action.item()},'
-                             f'{experience.agent_action.item()},{experience.state.hit_count}')
-        experience.state.step_code = observation_type.value
-
-        self.reward_agent(observation_type, experience, experience.agent_action.item())
+        self.observation_logger.log(self.episode_num, key, observation_type.name)
+        self.inflight.completed(key)
+        slot = info['value']
+        estimated_ttl = self.experiences.action(slot).item()
+        # force-completed at the in-flight age limit, the key lived at least until now
+        real_ttl = min(estimated_ttl, info['expire_at'] - self.experiences.observation_times[slot])
+        hit_count = int(self.experiences.field(slot, 'hit_count'))
+        self.metrics.record_ttl(estimated_ttl, real_ttl)
+        self.ttl_logger.log(self.episode_num, observation_type.name, key, estimated_ttl, real_ttl, hit_count)
+        self.experiences.set_field(slot, 'step_code', observation_type.value)
+
+        self.reward_agent(observation_type, slot, real_ttl)
+        self.experiences.free(slot)
+
+    def _drop_experience(self, key: str):
+        """Stop tracking the key's in-flight experience without learning from it, making room for a new one."""
+        slot = self._incomplete_experiences.get(key, clean_expire=False)
+        if slot is not None:
+            self._incomplete_experiences.delete(key)
+            self.experiences.free(slot)
 
-    def reward_agent(self, observation_type: ObservationType,
-                     experience: TTLAgentObservedExperience,
-                     real_ttl: time) -> int:
+    def reward_agent(self, observation_type: ObservationType, slot: int, real_ttl: time) -> int:
         # reward more utilisation of the cache capacity given more hits
-        final_state = experience.state
+        experiences = self.experiences
+        agent_action = experiences.action(slot)
 
-        difference_in_ttl = -abs((experience.agent_action.item() + 1) / max(min(real_ttl, self.maximum_ttl), 1))
+        difference_in_ttl = -abs((agent_action.item() + 1) / max(min(real_ttl, self.maximum_ttl), 1))
         # reward = final_state.hit_count - abs(difference_in_ttl * self.cache_stats.cache_utility)
 
         if observation_type == ObservationType.Hit:
@@ -133,31 +193,40 @@ class RLTtlStrategy(TtlStrategy):
             if abs(difference_in_ttl) < 10:
                 reward = 10
             terminal = True
-            self.logger.debug(f'Hits: {final_state.hit_count}, ttl diff: {difference_in_ttl}, Reward: {reward}')
+            self.logger.debug(f'Hits: {experiences.field(slot, "hit_count")}, ttl diff: {difference_in_ttl}, '
+                              f'Reward: {reward}')
 
-        self.agent.observe(preprocessed_states=experience.starting_state.to_numpy(),
-                           actions=experience.agent_action,
-                           internals=[],
-                           rewards=reward,
-                           next_states=final_state.to_numpy(),
-                           terminals=terminal)
+        self.learner.observe(states=experiences.starting_state(slot).copy(),
+                             actions=agent_action,
+                             rewards=reward,
+                             next_states=experiences.state(slot).copy(),
+                             terminals=terminal,
+                             episode_num=self.episode_num)
 
         self.cum_reward += reward
-        self.reward_logger.info(f'{self.episode_num},{reward}')
-        loss = self.agent.update()
-        if loss is not None:
-            self.loss_logger.info(f'{self.episode_num},{loss[0]}')
+        self.metrics.record_rewards(1, reward)
+        self.reward_logger.log(self.episode_num, reward)
 
         return reward
 
     def close(self):
+        # the episode's experiences are trained on before the agents are reset
+        self.learner.stop()
+        self.checkpoint.save(self.policy, self.key_encoder)
+        self.latency_guard.close()
+        dropped_ratio = self.cache_stats.dropped_experience_ratio.get(self.inflight.name, 0.0)
+        self.logger.info(f'Experiences dropped over the in-flight cap: {dropped_ratio * 100:.2f}%')
         super().close()
-        for (k, v) in list(self._incomplete_experiences.items()):
-            self.ttl_logger.info(f'{self.episode_num},{ObservationType.EndOfEpisode.name},{k},{v.agent_action.item()},'
-                                 f'{v.agent_action.item()},{v.state.hit_count}')
+        for (k, slot) in list(self._incomplete_experiences.items()):
+            estimated_ttl = self.experiences.action(slot).item()
+            self.metrics.record_ttl(estimated_ttl, estimated_ttl)
+            self.ttl_logger.log(self.episode_num, ObservationType.EndOfEpisode.name, k, estimated_ttl, estimated_ttl,
+                                int(self.experiences.field(slot, 'hit_count')))
 
         self._incomplete_experiences.clear()
+        self.experiences.clear()
+        self.inflight.clear()
         try:
-            self.agent.reset()
+            self.learner.reset()
         except Exception as e:
             self.errors.info(e)
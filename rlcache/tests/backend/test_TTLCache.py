@@ -5,6 +5,8 @@ from time import sleep
 
 from rlcache.backend import InMemoryStorage
 from rlcache.backend.ttl_cache import TTLCache
+from rlcache.utils import clock
+from rlcache.utils.clock import SimulatedClock
 
 
 class TestTTLCacheV2(TestCase):
@@ -82,5 +84,23 @@ class TestTTLCacheV2(TestCase):
 
         get_storage_results = storage.get(key)
         assert get_storage_results == expected_results, f"Expected '{expected_results}' but got {get_storage_results}"
+
+    def test_expired_keys_are_forgotten(self):
+        simulated_clock = SimulatedClock()
+        previous_clock = clock.set_clock(simulated_clock)
+        try:
+            cache = TTLCache(InMemoryStorage(10))
+            expired = []
+            cache.expired_entry_callback(lambda key, observation_type, info: expired.append(key))
+            cache.set('key', 'old_value', 10)
+            cache.set('key', 'new_value', 20)
+            simulated_clock.advance(15)
+            assert cache.get('key') == 'new_value', 'A superseded entry should not expire the key'
+            simulated_clock.advance(10)
+            assert cache.get('key') is None
+            assert expired == ['key'], f'Expected a single expiration, got {expired}'
+            assert len(cache.key_to_expiration_item) == 0 and len(cache.expiration_time_list) == 0
+        finally:
+            clock.set_clock(previous_clock)
     # def test_register_hook_func(self):
     #     self.fail()
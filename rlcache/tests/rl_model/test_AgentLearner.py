@@ -0,0 +1,64 @@
+import logging
+from unittest import TestCase
+
+import numpy as np
+import pytest
+
+from rlcache.rl_model.learner import AgentLearner
+
+
+class CountingAgent(object):
+    """Stand-in for an rlgraph agent, records what the learner does with it."""
+
+    def __init__(self):
+        self.observed = 0
+        self.observed_at_reset = []
+
+    def observe(self, **kwargs):
+        self.observed += 1
+
+    def update(self, batch=None):
+        return 0.0,
+
+    def get_weights(self):
+        return {}
+
+    def set_weights(self, **weights):
+        pass
+
+    def reset(self):
+        self.observed_at_reset.append(self.observed)
+
+
+class TestAgentLearner(TestCase):
+
+    def _observe(self, learner: AgentLearner, num_experiences: int):
+        for _ in range(num_experiences):
+            learner.observe(np.zeros(2), 0, 1.0, np.zeros(2), False, episode_num=0)
+
+    def test_reset_trains_on_the_queued_experiences_first(self):
+        learner = AgentLearner({'async_learner': True}, CountingAgent, logging.getLogger(__name__))
+        self._observe(learner, 100)
+
+        learner.reset()
+        assert learner.training_agent.observed_at_reset == [100], 'Queued experiences must be drained before reset'
+        assert learner._thread is None, 'The learner thread should be joined'
+
+        self._observe(learner, 10)
+        learner.stop()
+        assert learner.training_agent.observed == 110, 'The next experience should start a new learner thread'
+
+    def test_train_on_batch_refuses_asynchronous_learners(self):
+        learner = AgentLearner({'async_learner': True}, CountingAgent, logging.getLogger(__name__))
+        batch = {'states': np.zeros((1, 2)), 'actions': np.zeros(1), 'rewards': np.ones(1),
+                 'next_states': np.zeros((1, 2)), 'terminals': np.zeros(1, dtype=bool)}
+        try:
+            with pytest.raises(RuntimeError):
+                learner.train_on_batch(batch)
+            assert learner.policy_version == 0, 'The training agent must not be updated'
+        finally:
+            learner.stop()
+
+        synchronous = AgentLearner({}, CountingAgent, logging.getLogger(__name__))
+        synchronous.train_on_batch(batch)
+        assert synchronous.policy_version == 1
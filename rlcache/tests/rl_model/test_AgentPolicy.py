@@ -0,0 +1,75 @@
+import logging
+from unittest import TestCase
+
+import numpy as np
+
+from rlcache.rl_model.learner import AgentLearner
+from rlcache.rl_model.policy import AgentPolicy
+
+AGENT_CONFIG = {'type': 'dqn', 'exploration_spec': {'epsilon_spec': {'decay_spec': {
+    'type': 'linear_decay', 'from': 1.0, 'to': 0.2, 'start_timestep': 0, 'num_timesteps': 1}}}}
+
+
+class GreedyAgent(object):
+    """Stand-in for an rlgraph agent, always picks action 1 and records how it was asked."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_action(self, states, use_exploration=True):
+        self.calls.append(use_exploration)
+        return 1
+
+    def set_weights(self, **weights):
+        pass
+
+
+class FixedLearner(object):
+    def __init__(self, agent):
+        self.serving_agent = agent
+        self.serving_version = 0
+
+    def refresh_serving_agent(self):
+        pass
+
+
+class CountingSpace(object):
+    def __init__(self):
+        self.samples = 0
+
+    def sample(self):
+        self.samples += 1
+        return 0
+
+
+class TestAgentPolicy(TestCase):
+
+    def test_cached_decisions_are_greedy_and_exploration_is_sampled(self):
+        agent = GreedyAgent()
+        action_space = CountingSpace()
+        policy = AgentPolicy({'decision_cache': True}, FixedLearner(agent), AGENT_CONFIG, action_space)
+        policy._random = np.random.RandomState(0)
+
+        actions = [policy.get_action(np.zeros(3)) for _ in range(1000)]
+
+        assert agent.calls == [False], f'The greedy action should be computed once, got {agent.calls}'
+        # the decay ends at 0.2 after the first decision
+        assert 120 < action_space.samples < 280, f'{action_space.samples} random actions for epsilon 0.2'
+        assert actions.count(0) == action_space.samples
+
+    def test_decision_cache_is_refused_for_exploring_sac(self):
+        with self.assertRaises(ValueError):
+            AgentPolicy({'decision_cache': True}, FixedLearner(GreedyAgent()), {'type': 'sac'}, CountingSpace())
+
+    def test_loaded_weights_invalidate_cached_decisions(self):
+        agent = GreedyAgent()
+        config = {'decision_cache': True, 'inference_only': True}
+        learner = AgentLearner(config, agent_factory=lambda: agent, loss_logger=logging.getLogger(__name__))
+        policy = AgentPolicy(config, learner, AGENT_CONFIG, CountingSpace())
+
+        policy.get_action(np.zeros(3))
+        policy.get_action(np.zeros(3))
+        learner.set_weights({})
+        policy.get_action(np.zeros(3))
+
+        assert len(agent.calls) == 2, 'Decisions cached for the previous weights should not be served'
@@ -0,0 +1,30 @@
+from unittest import TestCase
+
+import numpy as np
+
+from rlcache.rl_model.completion_buffer import CompletionBuffer
+
+
+class TestCompletionBuffer(TestCase):
+
+    def test_flushes_full_batches(self):
+        batches = []
+        buffer = CompletionBuffer(2, batches.append)
+        for i in range(3):
+            buffer.add(states=np.array([i, i]), actions=i)
+
+        assert len(batches) == 1, 'Only one full batch should have been handed over'
+        assert batches[0]['states'].shape == (2, 2)
+        np.testing.assert_array_equal(batches[0]['actions'], [0, 1])
+        assert len(buffer) == 1
+
+    def test_flush_remainder(self):
+        batches = []
+        buffer = CompletionBuffer(8, batches.append)
+        buffer.add(states=np.array([1, 1]), actions=1)
+        buffer.flush()
+        buffer.flush()
+
+        assert len(batches) == 1, 'Flushing an empty buffer should not hand over an empty batch'
+        assert batches[0]['states'].shape == (1, 2)
+        assert len(buffer) == 0
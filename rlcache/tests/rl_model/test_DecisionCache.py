@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+import numpy as np
+
+from rlcache.rl_model.decision_cache import DecisionCache
+
+
+class TestDecisionCache(TestCase):
+
+    def test_excluded_key_shares_decisions(self):
+        cache = DecisionCache({'decision_cache_encoded_key': 'exclude'})
+        cache.set(np.array([1, 60, 0, 0, 1]), version=0, action=np.array(1))
+
+        assert cache.get(np.array([2, 60, 0, 0, 1]), version=0) == 1, 'States differing by key should share a bucket'
+        assert cache.get(np.array([2, 60, 0, 0, 2]), version=0) is None, 'Different operation types should not'
+
+    def test_bucketed_key(self):
+        cache = DecisionCache({'decision_cache_encoded_key': 'bucket', 'decision_cache_key_buckets': 4})
+        cache.set(np.array([1, 60]), version=0, action=np.array(1))
+
+        assert cache.get(np.array([5, 60]), version=0) == 1, 'Keys 1 and 5 fall in the same bucket'
+        assert cache.get(np.array([2, 60]), version=0) is None, 'Keys 1 and 2 fall in different buckets'
+
+    def test_new_policy_version_invalidates(self):
+        cache = DecisionCache({})
+        cache.set(np.array([1, 60]), version=0, action=np.array(1))
+
+        assert cache.get(np.array([1, 60]), version=1) is None, 'Decisions of an older policy should be dropped'
+        assert len(cache) == 0
+
+    def test_lru_bound(self):
+        cache = DecisionCache({'decision_cache_size': 2, 'decision_cache_encoded_key': 'keep'})
+        for i in range(3):
+            cache.set(np.array([i]), version=0, action={'eviction': np.array(i)})
+
+        assert len(cache) == 2
+        assert cache.get(np.array([0]), version=0) is None, 'Least recently used decision should be evicted'
+
+        action = cache.get(np.array([1]), version=0)
+        action['eviction'] = np.array(0)
+        assert cache.get(np.array([1]), version=0)['eviction'] == 1, 'Callers should not modify the cached action'
@@ -0,0 +1,34 @@
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from rlcache.rl_model.experience_dataset import ExperienceWriter, load_experiences
+
+
+class TestExperienceDataset(TestCase):
+
+    def test_single_and_batched_experiences(self):
+        directory = tempfile.mkdtemp()
+        writer = ExperienceWriter(directory, chunk_size=3)
+        writer.append(np.array([1, 2]), np.array([0.5]), 1, np.array([1, 3]), False)
+        writer.append(np.array([[2, 2], [3, 2]]), np.array([[0.1], [0.2]]), np.array([-1, 2]),
+                      np.array([[2, 3], [3, 3]]), np.zeros(2, dtype=bool))
+        writer.append(np.array([4, 2]), np.array([0.7]), 0, np.array([4, 3]), True)
+        writer.close()
+
+        experiences = load_experiences(directory)
+        assert experiences['states'].shape == (4, 2)
+        assert experiences['actions'].shape == (4, 1), 'Every action should keep the agent action shape'
+        np.testing.assert_array_equal(experiences['rewards'], [1, -1, 2, 0])
+        np.testing.assert_array_equal(experiences['terminals'], [False, False, False, True])
+
+    def test_dict_actions(self):
+        directory = tempfile.mkdtemp()
+        writer = ExperienceWriter(directory)
+        writer.append(np.array([1, 2]), {'ttl': np.array(30), 'eviction': np.array(1)}, 1, np.array([1, 3]), True)
+        writer.close()
+
+        actions = load_experiences(directory)['actions']
+        assert set(actions) == {'ttl', 'eviction'}
+        assert actions['ttl'].shape == (1,)
@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+import numpy as np
+
+from rlcache.rl_model.experience_table import ExperienceTable
+
+
+class TestExperienceTable(TestCase):
+
+    def test_updates_in_place_and_keeps_starting_state(self):
+        table = ExperienceTable(['encoded_key', 'hit_count'], actions={'action': ((1,), 'float32')})
+        slot = table.add(table.make_state(encoded_key=7), {'action': np.array([42.0])}, observation_time=1.0)
+
+        table.increment(slot, 'hit_count')
+        table.increment(slot, 'hit_count')
+
+        assert table.state(slot).tolist() == [7, 2], f'Unexpected state {table.state(slot)}'
+        assert table.starting_field(slot, 'hit_count') == 0, 'The starting state should not change'
+        assert table.action(slot).tolist() == [42.0]
+
+    def test_slots_are_reused_and_grow(self):
+        table = ExperienceTable(['hit_count'], actions={'action': ((), 'int32')}, flags=['marked'], initial_capacity=2)
+        first = table.add(table.make_state(hit_count=1), {'action': 1}, observation_time=0)
+        table.set_flag(first, 'marked')
+        table.free(first)
+
+        reused = table.add(table.make_state(), {'action': 0}, observation_time=0)
+        assert reused == first, 'A freed slot should be handed out again'
+        assert not table.flag(reused, 'marked'), 'Flags should be reset for a new experience'
+
+        slots = [table.add(table.make_state(hit_count=i), {'action': 1}, observation_time=0) for i in range(3)]
+        assert len(table) == 4
+        assert len(set(slots + [reused])) == 4, 'Every live experience needs its own slot'
+        assert [table.field(slot, 'hit_count') for slot in slots] == [0, 1, 2], 'Rows were lost while growing'
@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+from rlcache.cache_constants import CacheInformation
+from rlcache.rl_model.inflight_limiter import InFlightLimiter
+from rlcache.utils import clock
+from rlcache.utils.clock import SimulatedClock
+
+
+class TestInFlightLimiter(TestCase):
+
+    def setUp(self):
+        self.previous_clock = clock.set_clock(SimulatedClock())
+        self.cache_stats = CacheInformation(None, lambda: 0)
+
+    def tearDown(self):
+        clock.set_clock(self.previous_clock)
+
+    def test_capacity_is_never_exceeded(self):
+        limiter = InFlightLimiter({'max_inflight_experiences': 10}, 'strategy', self.cache_stats, max_age=60)
+        tracked = set()
+        for i in range(1000):
+            admitted, dropped_key = limiter.admit(str(i))
+            if dropped_key is not None:
+                tracked.remove(dropped_key)
+            if admitted:
+                tracked.add(str(i))
+
+        assert len(limiter) == len(tracked) == 10, f'Expected 10 in-flight experiences, got {len(limiter)}'
+        assert self.cache_stats.dropped_experiences['strategy'] == 990
+        assert abs(self.cache_stats.dropped_experience_ratio['strategy'] - 0.99) < 1e-9
+
+    def test_redecision_and_completion_make_no_room(self):
+        limiter = InFlightLimiter({'max_inflight_experiences': 1}, 'strategy', self.cache_stats, max_age=60)
+        assert limiter.admit('a') == (True, None)
+        assert limiter.admit('a') == (True, None), 'A new decision on a tracked key replaces its experience'
+        limiter.completed('a')
+        assert limiter.admit('b') == (True, None)
+        assert self.cache_stats.dropped_experiences['strategy'] == 0
+
+    def test_max_age_is_capped_by_the_tracking_age(self):
+        limiter = InFlightLimiter({'max_inflight_age': 7200}, 'strategy', self.cache_stats, max_age=3600)
+        assert limiter.max_age == 3600
@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from rlcache.cache_constants import CacheInformation
+from rlcache.rl_model.latency_guard import LatencyGuard
+from rlcache.utils.clock import SimulatedClock
+
+
+class TestLatencyGuard(TestCase):
+
+    def setUp(self):
+        self.cache_stats = CacheInformation(10, size_check_func=lambda: 0)
+        self.config = {'latency_slo_ms': 1, 'latency_min_samples': 5, 'latency_check_every': 5,
+                       'latency_probe_every': 2}
+
+    def test_disabled_without_slo(self):
+        guard = LatencyGuard({}, 'should_cache', self.cache_stats, fallback_factory=lambda: self.fail('Built'))
+
+        assert guard.decide(lambda: 'rl', lambda fallback: 'fallback') == 'rl'
+        assert guard.fallback is None
+
+    def test_falls_back_and_recovers(self):
+        timer = SimulatedClock()
+        guard = LatencyGuard(self.config, 'should_cache', self.cache_stats, fallback_factory=object, timer=timer.now)
+
+        def slow_decision():
+            timer.advance(0.002)
+            return 'rl'
+
+        for _ in range(5):
+            guard.decide(slow_decision, lambda fallback: 'fallback')
+        assert guard.tripped, 'p99 over the SLO should trip the guard'
+
+        decisions = [guard.decide(lambda: 'rl', lambda fallback: 'fallback') for _ in range(10)]
+        assert decisions == ['fallback', 'rl'] * 5, 'Every other decision should probe the RL strategy'
+        assert self.cache_stats.latency_fallbacks['should_cache'] == 5
+        assert not guard.tripped, 'Enough fast probes should bring the RL strategy back'
+        assert guard.decide(lambda: 'rl', lambda fallback: 'fallback') == 'rl'
@@ -0,0 +1,111 @@
+from collections import namedtuple
+from unittest import TestCase
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from rlcache.rl_model.numpy_policy import NumpyPolicy
+from rlcache.rl_model.exploration import exploration_epsilon
+
+# stand-ins exposing the attributes NumpyPolicy reads from rlgraph spaces
+IntSpace = namedtuple('IntSpace', ['num_categories'])
+FloatSpace = namedtuple('FloatSpace', ['low', 'high'])
+
+NETWORK_SPEC = [{'type': 'dense', 'units': 4, 'activation': 'relu', 'scope': 'hidden'},
+                {'type': 'dense', 'units': 4, 'activation': 'relu', 'scope': 'hidden2'}]
+
+
+def trunk_weights(random: np.random.RandomState, state_size: int):
+    return {
+        'policy/neural-network/hidden/dense/kernel': random.randn(state_size, 4),
+        'policy/neural-network/hidden/dense/bias': random.randn(4),
+        'policy/neural-network/hidden2/dense/kernel': random.randn(4, 4),
+        'policy/neural-network/hidden2/dense/bias': random.randn(4),
+    }
+
+
+class TestNumpyPolicy(TestCase):
+
+    def test_dqn_argmax_matches_manual_forward_pass(self):
+        random = np.random.RandomState(0)
+        weights = trunk_weights(random, state_size=3)
+        weights['policy/action-adapter-0/action-layer/dense/kernel'] = random.randn(4, 2)
+        weights['policy/action-adapter-0/action-layer/dense/bias'] = random.randn(2)
+        policy = NumpyPolicy.from_weights(weights, NETWORK_SPEC, IntSpace(num_categories=2))
+
+        states = random.randn(20, 3)
+        hidden = np.maximum(states @ weights['policy/neural-network/hidden/dense/kernel']
+                            + weights['policy/neural-network/hidden/dense/bias'], 0)
+        hidden = np.maximum(hidden @ weights['policy/neural-network/hidden2/dense/kernel']
+                            + weights['policy/neural-network/hidden2/dense/bias'], 0)
+        q_values = (hidden @ weights['policy/action-adapter-0/action-layer/dense/kernel']
+                    + weights['policy/action-adapter-0/action-layer/dense/bias'])
+
+        actions = policy.get_action(states)
+        assert actions.tolist() == q_values.argmax(axis=1).tolist(), 'Greedy actions differ from the q-values argmax'
+        assert np.ndim(policy.get_action(states[0])) == 0, 'A single state should give an unbatched action'
+
+    def test_sac_mean_is_squashed_into_bounds(self):
+        random = np.random.RandomState(1)
+        weights = trunk_weights(random, state_size=3)
+        weights['policy/action-adapter-0/action-layer/dense/kernel'] = random.randn(4, 2) * 100
+        policy = NumpyPolicy.from_weights(weights, NETWORK_SPEC, FloatSpace(low=0, high=60))
+
+        actions = policy.get_action(random.randn(50, 3))
+
+        assert actions.shape == (50, 1), f'Unexpected action shape {actions.shape}'
+        assert ((actions >= 0) & (actions <= 60)).all(), 'Mean actions should stay in the action space bounds'
+
+    def test_missing_layer_is_reported(self):
+        weights = trunk_weights(np.random.RandomState(2), state_size=3)
+        del weights['policy/neural-network/hidden2/dense/kernel']
+
+        with self.assertRaises(ValueError):
+            NumpyPolicy.from_weights(weights, NETWORK_SPEC, IntSpace(num_categories=2))
+
+    def test_unmatched_weight_is_reported(self):
+        random = np.random.RandomState(3)
+        weights = trunk_weights(random, state_size=3)
+        weights['policy/action-adapter-0/action-layer/dense/kernel'] = random.randn(4, 2)
+        weights['policy/action-adapter-0/layer-norm/dense/kernel'] = random.randn(4, 4)
+
+        with self.assertRaises(ValueError):
+            NumpyPolicy.from_weights(weights, NETWORK_SPEC, IntSpace(num_categories=2))
+
+    def test_ambiguous_action_layer_is_reported(self):
+        random = np.random.RandomState(4)
+        weights = trunk_weights(random, state_size=3)
+        weights['policy/action-adapter-0/action-layer/dense/kernel'] = random.randn(4, 2)
+        weights['policy/action-adapter-1/action-layer/dense/kernel'] = random.randn(4, 2)
+
+        with self.assertRaises(ValueError):
+            NumpyPolicy.from_weights(weights, NETWORK_SPEC, IntSpace(num_categories=2))
+
+    def test_exploration_epsilon_follows_the_decay_spec(self):
+        agent_config = {'exploration_spec': {'epsilon_spec': {'decay_spec': {
+            'type': 'linear_decay', 'from': 1.0, 'to': 0.2, 'start_timestep': 0, 'num_timesteps': 100}}}}
+
+        assert exploration_epsilon(agent_config, 0) == 1.0
+        assert abs(exploration_epsilon(agent_config, 50) - 0.6) < 1e-9
+        assert abs(exploration_epsilon(agent_config, 1000) - 0.2) < 1e-9
+        with self.assertRaises(ValueError):
+            exploration_epsilon({}, 0)
+
+    def test_export_matches_rlgraph_dqn(self):
+        pytest.importorskip('tensorflow')
+        pytest.importorskip('rlgraph')
+        from rlgraph.agents import Agent
+        from rlgraph.spaces import FloatBox, IntBox
+
+        with open(os.path.join(os.path.dirname(__file__), '../../../configs/agents/caching_dqn.json')) as f:
+            agent_config = json.load(f)
+        action_space = IntBox(2)
+        agent = Agent.from_spec(agent_config, state_space=FloatBox(shape=(3,)), action_space=action_space)
+        policy = NumpyPolicy.from_agent(agent, agent_config, action_space)
+
+        states = np.random.RandomState(5).randn(20, 3).astype('float32')
+        expected = agent.get_action(states, use_exploration=False)
+        assert policy.get_action(states).tolist() == np.asarray(expected).tolist(), 'Export differs from rlgraph'
@@ -0,0 +1,30 @@
+import queue
+from unittest import TestCase
+
+import numpy as np
+
+from rlcache.rl_model.experience_stream import SharedMemoryExperienceStream, read_experience_block
+
+
+class TestSharedMemoryExperienceStream(TestCase):
+
+    def test_blocks_round_trip(self):
+        messages = queue.Queue()
+        stream = SharedMemoryExperienceStream('rl_ttl_strategy', messages, block_rows=2)
+        stream.append(np.array([1, 2]), np.array([0.5]), 1, np.array([1, 3]), False)
+        assert messages.empty(), 'No block should be sent before block_rows experiences'
+        stream.append(np.array([2, 2]), np.array([0.1]), -1, np.array([2, 3]), True)
+        stream.append(np.array([3, 2]), np.array([0.2]), 2, np.array([3, 3]), False)
+        stream.close()
+
+        _, name, block_name, layout = messages.get_nowait()
+        assert name == 'rl_ttl_strategy'
+        experiences = read_experience_block(block_name, layout)
+        np.testing.assert_array_equal(experiences['states'], [[1, 2], [2, 2]])
+        np.testing.assert_array_equal(experiences['rewards'], [1, -1])
+        assert experiences['actions'].shape == (2, 1)
+
+        _, _, block_name, layout = messages.get_nowait()
+        experiences = read_experience_block(block_name, layout)
+        np.testing.assert_array_equal(experiences['terminals'], [False])
+        assert stream.experiences_sent == 3
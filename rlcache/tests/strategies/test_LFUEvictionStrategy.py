@@ -0,0 +1,33 @@
+import tempfile
+from unittest import TestCase
+
+from rlcache.backend import InMemoryStorage, TTLCache
+from rlcache.cache_constants import CacheInformation
+from rlcache.strategies.eviction_strategies.lfu_eviction_strategy import LFUEvictionStrategy
+from rlcache.utils import clock
+from rlcache.utils.clock import SimulatedClock
+
+
+class TestLFUEvictionStrategy(TestCase):
+
+    def setUp(self):
+        self.previous_clock = clock.set_clock(SimulatedClock())
+
+    def tearDown(self):
+        clock.set_clock(self.previous_clock)
+
+    def test_sampling_leaves_the_hit_counts_alone(self):
+        cache = TTLCache(InMemoryStorage(capacity=4))
+        cache_stats = CacheInformation(4, cache.size, {'enabled': False})
+        key_metadata = cache_stats.key_metadata
+        strategy = LFUEvictionStrategy({'eviction_sample_size': 4}, tempfile.mkdtemp(), cache_stats)
+        for i, key in enumerate(['a', 'b', 'c', 'd']):
+            cache.set(key, {}, 60)
+            key_metadata.insert(key, 60, 1, clock.now())
+            for _ in range(i + 1):
+                key_metadata.hit(key, clock.now())
+
+        hit_counts = {key: key_metadata.get(key, 'hit_count') for key in key_metadata.keys}
+        assert strategy.trim_cache(cache) == ['a'], 'The least frequently used key of the sample is evicted'
+        assert {key: key_metadata.get(key, 'hit_count') for key in ['b', 'c', 'd']} == \
+               {key: hit_counts[key] for key in ['b', 'c', 'd']}, 'Scoring the sample must not count as a use'
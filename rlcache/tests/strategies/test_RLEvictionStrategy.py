@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import pytest
+
+pytest.importorskip('rlgraph')
+
+from rlcache.backend import InMemoryStorage, TTLCache
+from rlcache.cache_constants import CacheInformation
+from rlcache.observer import ObservationType
+from rlcache.strategies.eviction_strategies.base_eviction_strategy import EvictionBudget
+from rlcache.strategies.eviction_strategies.fallback_eviction import FallbackEviction
+from rlcache.strategies.eviction_strategies.rl_eviction_strategy import RLEvictionStrategy
+from rlcache.utils import clock
+from rlcache.utils.clock import SimulatedClock
+
+AGENT_CONFIG = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'configs', 'agents', 'eviction_dqn.json')
+
+
+class TestRLEvictionStrategy(TestCase):
+
+    def setUp(self):
+        self.previous_clock = clock.set_clock(SimulatedClock())
+
+    def tearDown(self):
+        clock.set_clock(self.previous_clock)
+
+    def _full_cache(self, config, capacity=10, result_dir=None):
+        with open(AGENT_CONFIG, 'r') as fp:
+            agent_config = json.load(fp)
+        cache = TTLCache(InMemoryStorage(capacity=capacity))
+        cache_stats = CacheInformation(capacity, cache.size, {'enabled': False})
+        strategy = RLEvictionStrategy(dict(config, checkpoint_steps=1000, agent_config=agent_config),
+                                      result_dir or tempfile.mkdtemp(), cache_stats)
+        for i in range(capacity):
+            key = f'k{i}'
+            cache.set(key, {}, 60)
+            cache_stats.key_metadata.insert(key, 60, 1, clock.now())
+            strategy.observe(key, ObservationType.Write, {'ttl': 60})
+        return strategy, cache
+
+    def test_full_scan_stops_within_the_budget(self):
+        strategy, cache = self._full_cache({})
+        budget = EvictionBudget(max_candidates=3)
+
+        strategy.trim_cache(cache, budget)
+        assert strategy.candidates_scored == 3, f'Scored {strategy.candidates_scored} keys over a budget of 3'
+        assert budget.exhausted()
+
+    def test_batched_scan_stops_within_the_budget(self):
+        strategy, cache = self._full_cache({'batch_inference': True, 'inference_batch_size': 2})
+
+        strategy.trim_cache(cache, EvictionBudget(max_candidates=5))
+        assert strategy.candidates_scored == 5, f'Scored {strategy.candidates_scored} keys over a budget of 5'
+
+        strategy.trim_cache(cache, EvictionBudget(max_time=-1))
+        assert strategy.candidates_scored == 5, 'Nothing is scored once the time budget is spent'
+
+    def test_close_saves_a_checkpoint_served_without_bookkeeping(self):
+        result_dir = tempfile.mkdtemp()
+        strategy, cache = self._full_cache({}, result_dir=result_dir)
+        strategy.close()
+        assert os.path.exists(os.path.join(result_dir, 'checkpoints', 'rl_eviction_strategy', 'weights.pkl')), \
+            'close() should checkpoint the episode'
+
+        strategy, cache = self._full_cache({'inference_only': True, 'load_checkpoint': result_dir})
+        assert len(strategy.trim_cache_batch(cache, 2)) == 2
+        assert list(strategy._incomplete_experiences.keys()) == [], 'Nothing is learned, no decision should be tracked'
+
+    def test_fallback_reports_under_its_own_name(self):
+        strategy, cache = self._full_cache({'latency_slo_ms': 1})
+
+        assert 'rl_eviction_strategy_fallback' in strategy.cache_stats.strategy_metrics
+        assert 'lru_eviction_strategy' not in strategy.cache_stats.strategy_metrics, \
+            'The fallback should not report as a standalone LRU strategy'
+
+    def test_miss_after_the_fallback_evicted_a_kept_key(self):
+        strategy, cache = self._full_cache({})
+        # the agent scores and keeps two keys before the budget runs out
+        assert strategy.trim_cache(cache, EvictionBudget(max_candidates=2)) == []
+        assert strategy._incomplete_experiences.get('k0') is not None
+
+        # the cache manager then hands over to the fallback, which evicts the oldest key
+        evicted_key = FallbackEviction({}).evict(cache)
+        strategy.forget(evicted_key)
+        assert evicted_key == 'k0'
+
+        strategy.observe(evicted_key, ObservationType.Miss, {})
+        assert strategy._incomplete_experiences.get(evicted_key) is None
+
+    def test_miss_after_a_latency_fallback_evicted_a_kept_key(self):
+        strategy, cache = self._full_cache({'latency_slo_ms': 1, 'latency_probe_every': 100})
+        assert strategy.trim_cache(cache, EvictionBudget(max_candidates=2)) == []
+
+        # over the SLO, the LRU fallback takes the evictions over
+        strategy.latency_guard.tripped = True
+        evicted_keys = strategy.trim_cache(cache)
+        assert evicted_keys == ['k0'], f'The least recently used key should be evicted, got {evicted_keys}'
+
+        strategy.observe('k0', ObservationType.Miss, {})
+        assert strategy._incomplete_experiences.get('k0') is None
+
+    def test_decisions_are_tracked_for_the_ttl_left_at_epoch_timestamps(self):
+        epoch_clock = SimulatedClock(start=1.7e9)
+        clock.set_clock(epoch_clock)
+        strategy, cache = self._full_cache({})
+        strategy.trim_cache(cache, EvictionBudget(max_candidates=1))
+
+        epoch_clock.advance(59)
+        strategy._incomplete_experiences.expire(clock.now())
+        assert strategy._incomplete_experiences.get('k0') is not None, 'Tracked for less than the ttl of 60s'
+        epoch_clock.advance(2)
+        strategy._incomplete_experiences.expire(clock.now())
+        assert strategy._incomplete_experiences.get('k0') is None, 'Tracked for longer than the ttl of 60s'
+
+    def test_batched_trim_builds_the_states_once(self):
+        strategy, cache = self._full_cache({'batch_inference': True})
+        built = []
+        states = strategy._states
+        strategy._states = lambda keys=None: built.append(keys) or states(keys)
+
+        strategy.trim_cache(cache)
+        assert len(built) == 1, f'States built {len(built)} times for one batch'
+        assert len(strategy._incomplete_experiences.keys()) == 10, 'Every decision should be tracked'
@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import pytest
+
+pytest.importorskip('rlgraph')
+
+from rlcache.backend import InMemoryStorage, TTLCache
+from rlcache.cache_constants import CacheInformation, OperationType
+from rlcache.strategies.multi_task.rl_multi_task_cache_strategy import RLMultiTasksStrategy
+from rlcache.utils import clock
+from rlcache.utils.clock import SimulatedClock
+
+AGENT_CONFIG = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'configs', 'agents', 'multi_dqn.json')
+
+
+class TestRLMultiTasksStrategy(TestCase):
+
+    def setUp(self):
+        self.previous_clock = clock.set_clock(SimulatedClock())
+
+    def tearDown(self):
+        clock.set_clock(self.previous_clock)
+
+    def test_keys_without_an_experience_stay_eviction_candidates(self):
+        with open(AGENT_CONFIG, 'r') as fp:
+            agent_config = json.load(fp)
+        cache = TTLCache(InMemoryStorage(capacity=5))
+        cache_stats = CacheInformation(5, cache.size, {'enabled': False})
+        strategy = RLMultiTasksStrategy({'checkpoint_steps': 1000, 'max_ttl': 60, 'max_inflight_experiences': 5,
+                                        'agent_config': agent_config}, tempfile.mkdtemp(), cache_stats)
+
+        # decisions on keys that never get cached fill the in-flight reservoir
+        for i in range(20):
+            strategy.estimate_ttl(f'uncached_{i}', {}, OperationType.Miss)
+        assert len(strategy.inflight) == 5
+        for i in range(5):
+            key = f'cached_{i}'
+            cache.set(key, {}, 60)
+            cache_stats.key_metadata.insert(key, 60, 1, clock.now())
+
+        evicted = strategy.trim_cache_batch(cache, 2)
+        assert len(evicted) == 2, f'Cached keys should be evicted without an in-flight experience, got {evicted}'
+        assert all(key.startswith('cached_') for key in evicted)
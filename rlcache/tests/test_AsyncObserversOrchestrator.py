@@ -0,0 +1,83 @@
+import tempfile
+import threading
+from unittest import TestCase
+
+from rlcache.async_observer import AsyncObserversOrchestrator
+from rlcache.cache_constants import CacheInformation
+from rlcache.observer import ObservationType, Observer
+from rlcache.utils import clock
+from rlcache.utils.clock import SimulatedClock
+
+
+class TimedObserver(Observer):
+    def __init__(self):
+        super().__init__()
+        self.supported_observations = {ObservationType.Hit, ObservationType.Miss, ObservationType.Write}
+        self.observed = []
+
+    def observe(self, key, observation_type, info):
+        self.observed.append((key, observation_type, clock.now()))
+
+
+class TestAsyncObserversOrchestrator(TestCase):
+
+    def setUp(self):
+        self.simulated_clock = SimulatedClock()
+        self.previous_clock = clock.set_clock(self.simulated_clock)
+        self.observer = TimedObserver()
+        self.cache_stats = CacheInformation(10, lambda: 0)
+        self.lock = threading.RLock()
+
+    def tearDown(self):
+        self.orchestrator.stop()
+        clock.set_clock(self.previous_clock)
+
+    def _orchestrator(self, **config):
+        # the worker never wakes up on its own during a test
+        config = dict({'queue_size': 4, 'batch_size': 2, 'flush_interval_ms': 60 * 1000}, **config)
+        self.orchestrator = AsyncObserversOrchestrator(config, [self.observer], tempfile.mkdtemp(), self.cache_stats,
+                                                       self.lock)
+        return self.orchestrator
+
+    def test_settle_delivers_the_key_events_at_their_time(self):
+        orchestrator = self._orchestrator(batch_size=8)
+        with self.lock:
+            orchestrator.observe('a', ObservationType.Write, {})
+            self.simulated_clock.advance(5)
+            orchestrator.observe('b', ObservationType.Miss, {})
+            orchestrator.observe('a', ObservationType.Hit, {})
+            self.simulated_clock.advance(5)
+            assert self.observer.observed == [], 'Observations are delivered asynchronously'
+
+            orchestrator.settle('a')
+            assert self.observer.observed == [('a', ObservationType.Write, 0), ('a', ObservationType.Hit, 5)]
+            orchestrator.flush()
+        assert self.observer.observed[-1] == ('b', ObservationType.Miss, 5), 'Settled events are not redelivered'
+        assert len(self.observer.observed) == 3
+
+    def test_full_queue(self):
+        orchestrator = self._orchestrator(on_full='drop_hits')
+        with self.lock:
+            for key in ['a', 'b', 'c', 'd']:
+                orchestrator.observe(key, ObservationType.Write, {})
+            orchestrator.observe('e', ObservationType.Hit, {})
+            assert self.cache_stats.dropped_observations == 1 and self.observer.observed == []
+
+            orchestrator.observe('e', ObservationType.Miss, {})
+            assert [key for key, _, _ in self.observer.observed] == ['a', 'b'], 'The oldest batch makes room'
+
+    def test_stop_joins_the_worker_and_observe_restarts_it(self):
+        orchestrator = self._orchestrator(batch_size=8)
+        worker = orchestrator._thread
+        with self.lock:
+            orchestrator.observe('a', ObservationType.Write, {})
+
+        orchestrator.stop()
+        assert not worker.is_alive(), 'stop() should join the worker thread'
+        assert self.observer.observed == [('a', ObservationType.Write, 0)], 'Pending events are delivered on stop'
+        orchestrator.stop()  # no-op once stopped
+
+        with self.lock:
+            orchestrator.observe('b', ObservationType.Miss, {})
+        assert orchestrator._thread is not None and orchestrator._thread.is_alive(), \
+            'The next episode should get a new worker'
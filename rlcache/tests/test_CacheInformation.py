@@ -0,0 +1,27 @@
+import json
+from unittest import TestCase
+
+from rlcache.cache_constants import CacheInformation
+
+
+class TestCacheInformation(TestCase):
+
+    def test_metrics_report_the_fallbacks_and_drops(self):
+        cache_stats = CacheInformation(10, lambda: 0)
+        cache_stats.fallback_evicts['eviction'] += 3
+        cache_stats.latency_fallbacks['should_cache'] += 2
+        cache_stats.offered_experiences['eviction'] += 4
+        cache_stats.dropped_experiences['eviction'] += 1
+        cache_stats.dropped_observations = 5
+
+        metrics = cache_stats.metrics()
+        assert metrics['fallback_evicts'] == {'eviction': 3}
+        assert metrics['latency_fallbacks'] == {'should_cache': 2}
+        assert metrics['dropped_experiences'] == {'eviction': 1}
+        assert metrics['dropped_experience_ratio'] == {'eviction': 0.25}
+        assert metrics['dropped_observations'] == 5
+        assert type(metrics['fallback_evicts']) is dict, 'Counters are reported as plain dicts'
+        json.dumps(metrics)
+
+        cache_stats.close()
+        assert metrics['fallback_evicts'] == {'eviction': 3}, 'The episode metrics must not be cleared with the stats'
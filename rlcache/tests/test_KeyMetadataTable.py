@@ -0,0 +1,31 @@
+from unittest import TestCase
+
+from rlcache.key_metadata import KeyMetadataTable
+
+
+class TestKeyMetadataTable(TestCase):
+
+    def test_insert_hit_and_remove(self):
+        table = KeyMetadataTable(initial_capacity=2)
+        for i, key in enumerate(['a', 'b', 'c']):
+            table.insert(key, ttl=10 * (i + 1), size=100, now=float(i))
+        table.hit('b', now=5.0)
+
+        assert table.get('b', 'hit_count') == 1 and table.get('b', 'last_access') == 5.0
+        table.remove('a')
+        assert sorted(table.keys) == ['b', 'c'] and 'a' not in table
+        assert table.get('c', 'ttl') == 30, 'Moving the last row into the hole should keep its metadata'
+        assert table.get('a', 'ttl') is None
+
+    def test_registered_columns_reset_on_insert(self):
+        table = KeyMetadataTable()
+        table.register_column('encoded_key', 'int64', default=-1)
+        table.insert('a', ttl=10, size=1, now=0.0)
+        table.set('a', 'encoded_key', 7)
+        table.hit('a', now=1.0)
+        table.insert('a', ttl=20, size=1, now=2.0)
+
+        assert table.get('a', 'encoded_key') == -1
+        assert table.get('a', 'hit_count') == 0
+        assert len(table) == 1
+        assert list(table.column('ttl')) == [20]
@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from rlcache.cache_constants import CacheInformation
+from rlcache.observer import ObservationType, Observer, ObserversOrchestrator
+
+
+class RecordingObserver(Observer):
+    def __init__(self, supported_observations):
+        super().__init__()
+        self.supported_observations = supported_observations
+        self.calls = []
+
+    def observe(self, key, observation_type, info):
+        self.calls.append([(key, observation_type, info)])
+
+    def observe_many(self, observations):
+        self.calls.append(list(observations))
+
+
+class TestObserversOrchestrator(TestCase):
+
+    def setUp(self):
+        self.ttl_like = RecordingObserver({ObservationType.Miss, ObservationType.Expiration})
+        self.eviction_like = RecordingObserver({ObservationType.Miss, ObservationType.Write})
+        self.results_dir = tempfile.mkdtemp()
+        self.cache_stats = CacheInformation(10, lambda: 0, {'enabled': False})
+        self.orchestrator = ObserversOrchestrator([self.ttl_like, self.eviction_like],
+                                                  self.results_dir,
+                                                  self.cache_stats)
+
+    def test_observe_only_reaches_supporting_observers(self):
+        self.orchestrator.observe('a', ObservationType.Write, {'ttl': 5})
+        assert self.ttl_like.calls == [], 'Write is not supported by the ttl observer'
+        assert self.eviction_like.calls == [[('a', ObservationType.Write, {'ttl': 5})]]
+
+    def test_observe_many_is_one_call_per_observer(self):
+        self.orchestrator.observe_many([('a', ObservationType.Miss, {}), ('a', ObservationType.Write, {'ttl': 5})])
+        assert self.ttl_like.calls == [[('a', ObservationType.Miss, {})]], 'Unsupported observations are filtered out'
+        assert self.eviction_like.calls == [[('a', ObservationType.Miss, {}), ('a', ObservationType.Write, {'ttl': 5})]]
+
+    def test_close_dumps_the_episode_metrics(self):
+        self.cache_stats.hit, self.cache_stats.miss = 3, 1
+        strategy_metrics = self.cache_stats.strategy_metrics['rl_ttl_strategy']
+        strategy_metrics.record_ttl(10, 4)
+        strategy_metrics.eviction_outcomes['TrueEvict'] += 1
+        self.orchestrator.close()
+        self.cache_stats.close()
+
+        with open(os.path.join(self.results_dir, 'metrics.jsonl'), 'r') as fp:
+            dumped = [json.loads(line) for line in fp]
+        assert dumped == self.cache_stats.episode_metrics, 'Completed episodes are kept in memory too'
+        assert dumped[0]['episode'] == 0 and dumped[0]['hit_ratio'] == 0.75
+        assert dumped[0]['strategies']['rl_ttl_strategy']['mean_ttl_error'] == 6
+        assert dumped[0]['strategies']['rl_ttl_strategy']['eviction_outcomes'] == {'TrueEvict': 1}
+        assert strategy_metrics.to_dict() == {}, 'The aggregates restart with the next episode'
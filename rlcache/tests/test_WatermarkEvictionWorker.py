@@ -0,0 +1,52 @@
+import threading
+from unittest import TestCase
+
+import time
+
+from rlcache.backend import InMemoryStorage, TTLCache
+from rlcache.eviction_worker import WatermarkEvictionWorker
+
+
+class TestWatermarkEvictionWorker(TestCase):
+
+    def setUp(self):
+        self.cache = TTLCache(InMemoryStorage(capacity=10))
+        self.lock = threading.RLock()
+        self.worker = WatermarkEvictionWorker({'high': 0.8, 'low': 0.5, 'batch_size': 2}, self.cache,
+                                              self._evict_batch, self.lock)
+
+    def tearDown(self):
+        self.worker.stop()
+
+    def _evict_batch(self, num_keys: int) -> int:
+        evicted_keys = list(self.cache.keys())[:num_keys]
+        for key in evicted_keys:
+            self.cache.delete(key)
+        return len(evicted_keys)
+
+    def _fill(self, size: int):
+        for i in range(size):
+            with self.lock:
+                self.cache.set(f'k{i}', {}, 60)
+                self.worker.notify()
+
+    def _wait_for_size(self, size: int):
+        deadline = time.monotonic() + 5
+        while self.cache.size() != size and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert self.cache.size() == size, f'Expected {size} cached keys, got {self.cache.size()}'
+
+    def test_evicts_down_to_the_low_watermark(self):
+        self._fill(8)
+        self._wait_for_size(5)
+
+    def test_stopped_worker_evicts_nothing_until_notified_again(self):
+        self.worker.stop()
+        for i in range(9):
+            self.cache.set(f'k{i}', {}, 60)
+        time.sleep(0.01)
+        assert self.cache.size() == 9, 'A stopped worker must not evict'
+
+        with self.lock:
+            self.worker.notify()
+        self._wait_for_size(5)
@@ -0,0 +1,57 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from rlcache.utils import clock
+from rlcache.utils.clock import SimulatedClock
+from rlcache.utils.event_log import TTL_COLUMNS, create_event_log, export_csv, read_event_log
+
+
+class TestEventLog(TestCase):
+
+    def test_records_round_trip_through_a_wrapping_buffer(self):
+        result_dir = tempfile.mkdtemp()
+        event_log = create_event_log('ttl_logger', result_dir, TTL_COLUMNS, {'buffer_records': 4})
+        for i in range(10):
+            event_log.log(i // 5, 'Expiration' if i % 2 else 'Invalidate', f'k{i % 3}', 60.0, float(i), i)
+        event_log.close()
+
+        log = read_event_log(event_log.directory, ['observation', 'key', 'real_ttl'])
+        assert set(log.keys()) == {'observation', 'key', 'real_ttl'}, 'Only the projected columns are read'
+        np.testing.assert_array_equal(log['real_ttl'], np.arange(10, dtype='float64'))
+        assert list(log['key'][:4]) == ['k0', 'k1', 'k2', 'k0']
+        assert list(log['observation'][:2]) == ['Invalidate', 'Expiration']
+
+        codes = read_event_log(event_log.directory, ['observation'], decode=False)
+        assert codes['observation'].dtype == np.uint8, 'Categories are stored as codes'
+        assert list(codes['observation_categories']) == ['Invalidate', 'Expiration']
+
+    def test_csv_export(self):
+        result_dir = tempfile.mkdtemp()
+        event_log = create_event_log('performance_logger', result_dir, [('episode', 'int32'), ('state', 'category')])
+        event_log.log(0, 'TrueEvict')
+        event_log.log(1, 'FalseEvict')
+        event_log.flush()
+
+        csv_path = export_csv(event_log.directory)
+        assert csv_path == os.path.join(result_dir, 'performance_logger.log')
+        with open(csv_path, 'r') as fp:
+            rows = [line.strip().split(',')[1:] for line in fp]
+        assert rows == [['0', 'TrueEvict'], ['1', 'FalseEvict']], 'Same layout as the text logger, after the time'
+
+    def test_timestamps_follow_the_cache_clock(self):
+        simulated_clock = SimulatedClock(start=1000.0)
+        previous_clock = clock.set_clock(simulated_clock)
+        try:
+            event_log = create_event_log('reward_logger', tempfile.mkdtemp(), [('reward', 'float64')])
+            event_log.log(1.0)
+            simulated_clock.advance(5)
+            event_log.log(2.0)
+            event_log.close()
+        finally:
+            clock.set_clock(previous_clock)
+
+        log = read_event_log(event_log.directory, ['timestamp'])
+        np.testing.assert_array_equal(log['timestamp'], [1000.0, 1005.0])
@@ -0,0 +1,38 @@
+import random
+from unittest import TestCase
+
+from rlcache.utils.indexed_heap import IndexedMinHeap
+
+
+class TestIndexedMinHeap(TestCase):
+
+    def test_pops_in_priority_order(self):
+        heap = IndexedMinHeap()
+        random_state = random.Random(0)
+        priorities = {str(i): random_state.random() for i in range(200)}
+        for key, priority in priorities.items():
+            heap.push(key, priority)
+
+        popped = [heap.pop()[1] for _ in range(len(priorities))]
+        assert popped == sorted(priorities.values()), 'Expected keys to pop in ascending priority'
+
+    def test_update_and_remove(self):
+        heap = IndexedMinHeap()
+        heap.push('a', 1)
+        heap.push('b', 2)
+        heap.push('c', 3)
+
+        heap.push('c', 0)
+        assert heap.peek() == ('c', 0), f'Expected c to move to the top, got {heap.peek()}'
+
+        heap.remove('c')
+        heap.remove('missing')
+        assert 'c' not in heap
+        assert [heap.pop()[0] for _ in range(len(heap))] == ['a', 'b']
+
+    def test_ties_pop_in_insertion_order(self):
+        heap = IndexedMinHeap()
+        for key in ['first', 'second', 'third']:
+            heap.push(key, 1)
+
+        assert [heap.pop()[0] for _ in range(3)] == ['first', 'second', 'third']
@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+from rlcache.utils.key_encoder import HashingKeyEncoder, LRUVocabularyKeyEncoder, shared_key_encoder
+
+
+class TestKeyEncoder(TestCase):
+
+    def test_hashing_is_stable_and_bounded(self):
+        encoder = HashingKeyEncoder(buckets=16)
+        encoded = [encoder.encode(f'key_{i}') for i in range(100)]
+
+        assert all(1 <= key_id <= 16 for key_id in encoded), f'Ids out of range: {encoded}'
+        assert encoded == [HashingKeyEncoder(buckets=16).encode(f'key_{i}') for i in range(100)], \
+            'Hashing should not depend on the encoder instance'
+
+    def test_lru_vocabulary_reuses_ids(self):
+        encoder = LRUVocabularyKeyEncoder(capacity=2)
+        a, b = encoder.encode('a'), encoder.encode('b')
+        encoder.encode('a')  # 'b' is now the least recently seen
+
+        assert encoder.encode('c') == b, 'A new key should take over the id of the least recently seen key'
+        assert encoder.encode('a') == a
+        assert len(encoder.key_to_id) == 2
+
+    def test_equal_settings_share_an_encoder(self):
+        registry = {}
+        first = shared_key_encoder({'key_encoding': {'type': 'lru_vocabulary', 'capacity': 10}}, registry)
+        second = shared_key_encoder({'key_encoding': {'capacity': 10, 'type': 'lru_vocabulary'}}, registry)
+        default = shared_key_encoder({}, registry)
+
+        assert first is second, 'Strategies with the same settings should share the encoder'
+        assert isinstance(default, HashingKeyEncoder), 'Hashing should be the default key encoding'
+
+    def test_shared_encoder_refuses_conflicting_restores(self):
+        encoder = LRUVocabularyKeyEncoder(capacity=10)
+        encoder.restore_state([('a', 1), ('b', 2)], 'run_1/caching_strategy')
+        encoder.encode('c')
+        # a second strategy restoring the same checkpointed state keeps the ids handed out since
+        encoder.restore_state([('a', 1), ('b', 2)], 'run_1/ttl_strategy')
+
+        assert encoder.encode('c') == 3, 'A matching restore should not reset the encoder'
+        with self.assertRaises(ValueError):
+            encoder.restore_state([('b', 1)], 'run_2/ttl_strategy')
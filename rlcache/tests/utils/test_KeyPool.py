@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from rlcache.utils.key_pool import KeyPool
+
+
+class TestKeyPool(TestCase):
+
+    def test_add_is_idempotent(self):
+        pool = KeyPool()
+        pool.add('key')
+        pool.add('key')
+
+        assert len(pool) == 1, f'Expected one key in the pool, got {len(pool)}'
+
+    def test_remove_keeps_array_dense(self):
+        pool = KeyPool()
+        for key in ['a', 'b', 'c', 'd']:
+            pool.add(key)
+
+        pool.remove('b')
+        pool.remove('missing')
+
+        assert sorted(pool) == ['a', 'c', 'd'], f'Unexpected pool content {list(pool)}'
+        assert 'b' not in pool
+        pool.remove('d')
+        pool.remove('a')
+        assert list(pool) == ['c'], f'Unexpected pool content {list(pool)}'
+
+    def test_sample_is_distinct_and_bounded(self):
+        pool = KeyPool(seed=0)
+        keys = [str(i) for i in range(100)]
+        for key in keys:
+            pool.add(key)
+
+        sample = pool.sample(10)
+        assert len(sample) == 10
+        assert len(set(sample)) == 10, f'Expected distinct keys, got {sample}'
+        assert set(sample) <= set(keys)
+
+        assert sorted(pool.sample(1000)) == sorted(keys), 'Sampling more than the pool size returns every key'
@@ -0,0 +1,19 @@
+from unittest import TestCase
+
+from rlcache.utils.sampling import KeySampler
+
+
+class TestKeySampler(TestCase):
+
+    def test_deterministic_fraction(self):
+        sampler = KeySampler(rate=0.25)
+        keys = [f'key_{i}' for i in range(10000)]
+        sampled = [key for key in keys if sampler.sampled(key)]
+
+        assert 2000 < len(sampled) < 3000, f'Roughly a quarter of the keys should be sampled, got {len(sampled)}'
+        assert sampled == [key for key in keys if KeySampler(rate=0.25).sampled(key)], \
+            'The same keys should be sampled every time'
+
+    def test_full_and_empty_rates(self):
+        assert KeySampler(rate=1.0).sampled('key')
+        assert not KeySampler(rate=0.0).sampled('key')
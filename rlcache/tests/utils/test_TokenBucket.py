@@ -0,0 +1,18 @@
+from unittest import TestCase
+
+from rlcache.utils.sampling import TokenBucket
+
+
+class TestTokenBucket(TestCase):
+
+    def test_burst_then_rate(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=2, burst=3, clock=lambda: now[0])
+
+        assert [bucket.try_consume() for _ in range(4)] == [True, True, True, False], 'Only the burst is allowed'
+
+        now[0] = 1.0
+        assert [bucket.try_consume() for _ in range(3)] == [True, True, False], 'A second refills rate tokens'
+
+        now[0] = 100.0
+        assert sum(bucket.try_consume() for _ in range(10)) == 3, 'Idle time never refills past the burst'
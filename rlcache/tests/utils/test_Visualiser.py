@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from rlcache.utils import visualiser
+from rlcache.utils.event_log import EVALUATION_COLUMNS, create_event_log
+from rlcache.utils.visualiser import EVALUATION_LOG_NAMES, load_log, map_runs
+
+parsed_runs = []
+
+
+def count_observations(run_dir):
+    parsed_runs.append(run_dir)
+    return len(load_log(f'{run_dir}/evaluation_logger', EVALUATION_LOG_NAMES, ['episode']))
+
+
+def write_evaluation_log(run_dir, num_observations):
+    event_log = create_event_log('evaluation_logger', run_dir, EVALUATION_COLUMNS)
+    for i in range(num_observations):
+        event_log.log(f'k{i}', 'Hit', 0)
+    event_log.close()
+
+
+class TestVisualiser(TestCase):
+
+    def setUp(self):
+        self.settings = visualiser.PROCESSES, visualiser.CACHE_DIR, visualiser.CACHE_VERSION
+        visualiser.PROCESSES, visualiser.CACHE_DIR = 1, tempfile.mkdtemp()
+
+    def tearDown(self):
+        visualiser.PROCESSES, visualiser.CACHE_DIR, visualiser.CACHE_VERSION = self.settings
+
+    def test_load_log_reads_event_logs_like_the_csv(self):
+        result_dir = tempfile.mkdtemp()
+        event_log = create_event_log('evaluation_logger', result_dir, EVALUATION_COLUMNS, {'export_csv': True})
+        for i in range(12):
+            event_log.log(f'k{i % 4}', 'Hit' if i % 3 else 'Miss', i // 6)
+        event_log.close()
+
+        events_df = load_log(f'{result_dir}/evaluation_logger', EVALUATION_LOG_NAMES, ['episode', 'observation'])
+        assert list(events_df.columns) == ['episode', 'observation'], 'Only the projected columns are read'
+        assert events_df['observation'].dtype == 'category', 'Observation names are categorical'
+
+        shutil.rmtree(event_log.directory)
+        csv_df = load_log(f'{result_dir}/evaluation_logger', EVALUATION_LOG_NAMES, ['episode', 'observation'])
+        counts = events_df.groupby(['episode', 'observation'], observed=True).size()
+        assert counts.to_dict() == csv_df.groupby(['episode', 'observation']).size().to_dict(), \
+            'Same counts as the csv of older runs'
+
+    def test_map_runs_only_parses_new_or_changed_runs(self):
+        run_dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        write_evaluation_log(run_dirs[0], 3)
+        write_evaluation_log(run_dirs[1], 5)
+        parsed_runs.clear()
+        assert map_runs(count_observations, run_dirs, ['evaluation_logger']) == [3, 5]
+        assert map_runs(count_observations, run_dirs, ['evaluation_logger']) == [3, 5]
+        assert parsed_runs == run_dirs, 'Unchanged runs come from the cache'
+
+        write_evaluation_log(run_dirs[1], 7)
+        assert map_runs(count_observations, run_dirs, ['evaluation_logger']) == [3, 7]
+        assert parsed_runs == run_dirs + run_dirs[1:], 'Only the changed run is parsed again'
+
+    def test_map_runs_keeps_its_cache_out_of_the_results(self):
+        run_dir = tempfile.mkdtemp()
+        write_evaluation_log(run_dir, 3)
+        parsed_runs.clear()
+
+        assert map_runs(count_observations, [run_dir], ['evaluation_logger']) == [3]
+        assert os.listdir(run_dir) == ['evaluation_logger.events'], 'Nothing but the logs in the run directory'
+        assert len(os.listdir(visualiser.CACHE_DIR)) == 1
+
+        visualiser.CACHE_VERSION += 1
+        assert map_runs(count_observations, [run_dir], ['evaluation_logger']) == [3]
+        assert parsed_runs == [run_dir, run_dir], 'A new cache version parses the runs again'
@@ -0,0 +1,51 @@
+import threading
+from typing import Optional
+
+import time
+
+
+class Clock(object):
+    """Wall clock, the time source of cache expiry and the strategies' observations."""
+
+    def now(self) -> float:
+        return time.time()
+
+
+class SimulatedClock(Clock):
+    """Clock that only moves when told to, e.g. to the timestamps of a replayed trace."""
+
+    def __init__(self, start: float = 0.0):
+        self.current = start
+
+    def now(self) -> float:
+        return self.current
+
+    def advance_to(self, timestamp: float) -> None:
+        # out of order trace records don't move time backwards
+        self.current = max(self.current, timestamp)
+
+    def advance(self, seconds: float) -> None:
+        self.current += seconds
+
+
+_clock = Clock()
+_pinned = threading.local()
+
+
+def now() -> float:
+    pinned = getattr(_pinned, 'time', None)
+    if pinned is not None:
+        return pinned
+    return _clock.now()
+
+
+def pin(timestamp: Optional[float]) -> None:
+    """Make now() return `timestamp` on the calling thread, e.g. while delivering a queued observation. None unpins."""
+    _pinned.time = timestamp
+
+
+def set_clock(clock: Clock) -> Clock:
+    """Install `clock` process wide, returns the clock it replaces."""
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
@@ -0,0 +1,299 @@
+"""
+Binary event logs, the per event logs of the cache manager and the strategies.
+
+An EventLog writes fixed-width records of typed columns to a preallocated in-memory ring buffer. A background thread
+flushes it in large chunks to a columnar directory <result_dir>/<name>.events: one raw <column>.bin file per column,
+schema.json with the column types, row count and category names, and keys.jsonl with the interned keys. Column types
+are numpy dtypes, 'key' (interned as int64 ids) or 'category' (a few distinct strings, e.g. observation names, stored
+as uint8 codes). Every record gets a 'timestamp' column first, from clock.now(): wall clock time, or trace time
+under a SimulatedClock.
+
+Set `enabled` to False in the event log settings to log nothing, CacheInformation keeps the evaluation numbers in
+memory either way. With `export_csv` in the event log settings the flusher also writes the rows to
+<result_dir>/<name>.log in the csv layout of the text loggers, or convert afterwards with:
+    python -m rlcache.utils.event_log <result_dir>/<name>.events [...]
+Pass --parquet to write <result_dir>/<name>.parquet instead, categories as categorical columns (needs pandas and
+pyarrow). rlcache.utils.visualiser loads either, reading only the columns a plot needs.
+"""
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import weakref
+from typing import Dict, List, Tuple
+
+import numpy as np
+import time
+
+from rlcache.utils import clock
+
+logger = logging.getLogger(__name__)
+
+OBSERVATION_COLUMNS = [('episode', 'int32'), ('key', 'key'), ('observation', 'category')]
+EVALUATION_COLUMNS = [('key', 'key'), ('observation', 'category'), ('episode', 'int32')]
+REWARD_COLUMNS = [('episode', 'int32'), ('reward', 'float64')]
+TTL_COLUMNS = [('episode', 'int32'), ('observation', 'category'), ('key', 'key'), ('ttl', 'float64'),
+               ('real_ttl', 'float64'), ('hits', 'int64')]
+PERFORMANCE_COLUMNS = [('episode', 'int32'), ('state', 'category')]
+ENTRY_HITS_COLUMNS = [('episode', 'int32'), ('key', 'key'), ('hits', 'int64')]
+# CacheInformation.to_record of every episode
+END_OF_EPISODE_COLUMNS = [('episode_num', 'int32'), ('invalidate', 'int64'), ('hit', 'int64'), ('miss', 'int64'),
+                          ('hit_ratio', 'float64'), ('should_cache', 'int64'), ('should_not_cache', 'int64'),
+                          ('should_cache_ratio', 'float64'), ('manual_evicts', 'int64'), ('cache_utility', 'float64')]
+
+_STORAGE_DTYPES = {'key': 'int64', 'category': 'uint8'}
+_FLUSH_INTERVAL = 1.0  # seconds, the flusher also wakes up once a buffer is half full
+
+_open_logs = weakref.WeakSet()
+_wake_up = threading.Event()
+_flusher = None  # type: threading.Thread
+
+
+class EventLog(object):
+
+    def __init__(self, name: str, result_dir: str, columns: List[Tuple[str, str]], settings: Dict[str, any]):
+        self.name = name
+        self.directory = os.path.join(result_dir, f'{name}.events')
+        os.makedirs(self.directory, exist_ok=True)
+        self.columns = [('timestamp', 'float64')] + list(columns)
+        self.capacity = settings.get('buffer_records', 65536)
+        self._records = np.zeros(self.capacity, dtype=[(column, _STORAGE_DTYPES.get(column_type, column_type))
+                                                       for column, column_type in self.columns])
+        self._written = 0
+        self._flushed = 0
+        self._flush_lock = threading.Lock()
+
+        self._keys = {}  # type: Dict[any, int]
+        self._key_list = []
+        self._keys_flushed = 0
+        self._categories = {column: [] for column, column_type in columns if column_type == 'category'}
+        self._category_codes = {column: {} for column in self._categories}
+        self._encoders = [self._key_id if column_type == 'key'
+                          else self._category_encoder(column) if column_type == 'category'
+                          else None
+                          for column, column_type in columns]
+
+        self._files = {column: open(os.path.join(self.directory, f'{column}.bin'), 'wb')
+                       for column, _ in self.columns}
+        self._keys_file = open(os.path.join(self.directory, 'keys.jsonl'), 'w')
+        self._csv_file = open(os.path.join(result_dir, f'{name}.log'), 'w') if settings.get('export_csv') else None
+        self._write_schema(0)
+
+        _open_logs.add(self)
+        _start_flusher()
+
+    def log(self, *values):
+        """Append a record, the values in the order of the columns."""
+        if self._written - self._flushed >= self.capacity:
+            self.flush()  # the flusher fell behind, write on the caller
+        record = [clock.now()]
+        for value, encode in zip(values, self._encoders):
+            record.append(value if encode is None else encode(value))
+        self._records[self._written % self.capacity] = tuple(record)
+        self._written += 1
+        if self._written - self._flushed == self.capacity // 2:
+            _wake_up.set()
+
+    def flush(self):
+        """Write the buffered records out."""
+        with self._flush_lock:
+            start, end = self._flushed, self._written
+            if start == end:
+                return
+            # keys and categories are added before the records using them, snapshot them after `end`
+            new_keys = self._key_list[self._keys_flushed:]
+            chunks = self._chunks(start, end)
+            for column, column_file in self._files.items():
+                for chunk in chunks:
+                    np.ascontiguousarray(chunk[column]).tofile(column_file)
+                column_file.flush()
+            for key in new_keys:
+                self._keys_file.write(json.dumps(key) + '\n')
+            self._keys_file.flush()
+            self._keys_flushed += len(new_keys)
+            self._write_schema(end)
+            if self._csv_file is not None:
+                for chunk in chunks:
+                    self._export_chunk(chunk)
+            self._flushed = end
+
+    def close(self):
+        self.flush()
+        _open_logs.discard(self)
+        for column_file in self._files.values():
+            column_file.close()
+        self._keys_file.close()
+        if self._csv_file is not None:
+            self._csv_file.close()
+
+    def __len__(self):
+        return self._written
+
+    def _chunks(self, start: int, end: int) -> List[np.ndarray]:
+        first, count = start % self.capacity, end - start
+        if first + count <= self.capacity:
+            return [self._records[first:first + count]]
+        return [self._records[first:], self._records[:first + count - self.capacity]]  # wraps around
+
+    def _key_id(self, key) -> int:
+        key_id = self._keys.get(key)
+        if key_id is None:
+            key_id = self._keys[key] = len(self._key_list)
+            self._key_list.append(key)
+        return key_id
+
+    def _category_encoder(self, column: str):
+        codes, categories = self._category_codes[column], self._categories[column]
+
+        def encode(category: str) -> int:
+            code = codes.get(category)
+            if code is None:
+                assert len(categories) < 256, f'More than 256 categories in {self.name}.{column}'
+                code = codes[category] = len(categories)
+                categories.append(category)
+            return code
+
+        return encode
+
+    def _write_schema(self, rows: int):
+        schema = {'columns': self.columns,
+                  'rows': rows,
+                  'categories': {column: list(categories) for column, categories in self._categories.items()}}
+        with open(os.path.join(self.directory, 'schema.json'), 'w') as fp:
+            json.dump(schema, fp)
+
+    def _export_chunk(self, chunk: np.ndarray):
+        columns = []
+        for column, column_type in self.columns:
+            values = chunk[column].tolist()
+            if column == 'timestamp':
+                values = [time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(value)) for value in values]
+            elif column_type == 'key':
+                values = [self._key_list[key_id] for key_id in values]
+            elif column_type == 'category':
+                values = [self._categories[column][code] for code in values]
+            columns.append(values)
+        self._csv_file.writelines(','.join(map(str, row)) + '\n' for row in zip(*columns))
+        self._csv_file.flush()
+
+
+class DisabledEventLog(object):
+    """Stands in for an EventLog when the event logs are disabled."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def log(self, *values):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+def create_event_log(name: str, result_dir: str, columns: List[Tuple[str, str]], settings: Dict[str, any] = None):
+    settings = settings or {}
+    if not settings.get('enabled', True):
+        return DisabledEventLog(name)
+    return EventLog(name, result_dir, columns, settings)
+
+
+def flush_all():
+    for event_log in list(_open_logs):
+        event_log.flush()
+
+
+def read_event_log(directory: str, columns: List[str] = None, decode: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Read the given columns of an event log, all of them by default. Keys and categories are decoded to object arrays,
+    unless decode is False: their codes then come as they are stored and the names under '<column>_categories'.
+    """
+    with open(os.path.join(directory, 'schema.json'), 'r') as fp:
+        schema = json.load(fp)
+    column_types = dict(schema['columns'])
+    columns = columns or [column for column, _ in schema['columns']]
+    keys = None
+    result = {}
+    for column in columns:
+        column_type = column_types[column]
+        values = np.fromfile(os.path.join(directory, f'{column}.bin'),
+                             dtype=_STORAGE_DTYPES.get(column_type, column_type),
+                             count=schema['rows'])
+        if column_type == 'key' and decode:
+            if keys is None:
+                with open(os.path.join(directory, 'keys.jsonl'), 'r') as fp:
+                    keys = np.array([json.loads(line) for line in fp] + [None], dtype=object)[:-1]
+            values = keys[values]
+        elif column_type == 'category':
+            categories = np.array(schema['categories'][column] + [None], dtype=object)[:-1]
+            if decode:
+                values = categories[values]
+            else:
+                result[f'{column}_categories'] = categories
+        result[column] = values
+    return result
+
+
+def export_csv(directory: str, csv_path: str = None) -> str:
+    """Write an event log as the csv its text logger used to write, next to it by default."""
+    csv_path = csv_path or directory[:-len('.events')] + '.log'
+    log = read_event_log(directory)
+    log['timestamp'] = [time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(value)) for value in log['timestamp']]
+    with open(csv_path, 'w') as fp:
+        fp.writelines(','.join(map(str, row)) + '\n'
+                      for row in zip(*[log[column] if isinstance(log[column], list) else log[column].tolist()
+                                       for column in log]))
+    return csv_path
+
+
+def export_parquet(directory: str, parquet_path: str = None) -> str:
+    """Write an event log as a parquet file, next to it by default. Keys are decoded, categories stay categorical."""
+    import pandas as pd  # only the exports and the visualiser need pandas
+
+    parquet_path = parquet_path or directory[:-len('.events')] + '.parquet'
+    log = read_event_log(directory, decode=False)
+    with open(os.path.join(directory, 'schema.json'), 'r') as fp:
+        column_types = dict(json.load(fp)['columns'])
+    frame = pd.DataFrame()
+    for column, column_type in column_types.items():
+        if column_type == 'category':
+            frame[column] = pd.Categorical.from_codes(log[column], log[f'{column}_categories'])
+        elif column_type == 'key':
+            frame[column] = read_event_log(directory, [column])[column]
+        else:
+            frame[column] = log[column]
+    frame.to_parquet(parquet_path, index=False)
+    return parquet_path
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_periodically, name='event_log_flusher', daemon=True)
+        _flusher.start()
+
+
+def _flush_periodically():
+    while True:
+        _wake_up.wait(_FLUSH_INTERVAL)
+        _wake_up.clear()
+        try:
+            flush_all()
+        except Exception:
+            logger.exception('Flushing the event logs failed.')
+
+
+atexit.register(flush_all)
+
+if __name__ == '__main__':
+    export = export_parquet if '--parquet' in sys.argv[1:] else export_csv
+    for event_log_directory in sys.argv[1:]:
+        if event_log_directory != '--parquet':
+            print(export(event_log_directory))
@@ -0,0 +1,92 @@
+import itertools
+from typing import Dict, List, Tuple
+
+
+class IndexedMinHeap(object):
+    """
+    Binary min-heap keyed by string, supporting O(log n) push, priority update and removal of arbitrary keys.
+
+    Entries with equal priority pop in insertion order.
+    """
+
+    def __init__(self):
+        self._heap = []  # type: List[list]  # [priority, sequence, key]
+        self._key_to_index = {}  # type: Dict[str, int]
+        self._sequence = itertools.count()
+
+    def push(self, key: str, priority: float) -> None:
+        """Insert the key, or move it if it is already in the heap."""
+        index = self._key_to_index.get(key)
+        if index is not None:
+            entry = self._heap[index]
+            old_priority = entry[0]
+            entry[0] = priority
+            if priority < old_priority:
+                self._sift_up(index)
+            else:
+                self._sift_down(index)
+            return
+
+        self._heap.append([priority, next(self._sequence), key])
+        self._key_to_index[key] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def peek(self) -> Tuple[str, float]:
+        priority, _, key = self._heap[0]
+        return key, priority
+
+    def pop(self) -> Tuple[str, float]:
+        key, priority = self.peek()
+        self.remove(key)
+        return key, priority
+
+    def remove(self, key: str) -> None:
+        index = self._key_to_index.pop(key, None)
+        if index is None:
+            return
+        last_entry = self._heap.pop()
+        if index < len(self._heap):
+            self._heap[index] = last_entry
+            self._key_to_index[last_entry[2]] = index
+            self._sift_up(index)
+            self._sift_down(self._key_to_index[last_entry[2]])
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._key_to_index.clear()
+
+    def __contains__(self, key):
+        return key in self._key_to_index
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _less(self, i: int, j: int) -> bool:
+        a, b = self._heap[i], self._heap[j]
+        return a[0] < b[0] or (a[0] == b[0] and a[1] < b[1])
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._key_to_index[heap[i][2]] = i
+        self._key_to_index[heap[j][2]] = j
+
+    def _sift_up(self, index: int):
+        while index > 0:
+            parent = (index - 1) // 2
+            if not self._less(index, parent):
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _sift_down(self, index: int):
+        size = len(self._heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and self._less(child, smallest):
+                    smallest = child
+            if smallest == index:
+                break
+            self._swap(index, smallest)
+            index = smallest
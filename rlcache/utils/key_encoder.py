@@ -0,0 +1,119 @@
+import json
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict
+
+from rlcache.utils.vocabulary import Vocabulary
+
+
+class KeyEncoder(ABC):
+    """Maps cache keys to the integer `encoded_key` field of the agent states."""
+
+    @abstractmethod
+    def encode(self, key: str) -> int:
+        pass
+
+    def get_state(self):
+        """Picklable state, for checkpoints."""
+        return None
+
+    def set_state(self, state) -> None:
+        pass
+
+    def restore_state(self, state, source: str) -> None:
+        """
+        set_state from a checkpoint. Every strategy sharing the encoder restores it, so only the first restore is
+        applied: the later ones must carry the same state, a conflicting one raises a ValueError instead of
+        re-mapping the keys the other strategies were trained on.
+        """
+        restored = getattr(self, '_restored', None)
+        if restored is not None:
+            restored_source, restored_state = restored
+            if restored_state != state:
+                raise ValueError(f'Key encoder state from {source} conflicts with the one restored from '
+                                 f'{restored_source}, strategies sharing an encoder must restore from the same run.')
+            return
+        self.set_state(state)
+        self._restored = (source, state)
+
+
+class HashingKeyEncoder(KeyEncoder):
+    """Hashing trick: keys land in one of `buckets` buckets, nothing is stored. Id 0 is never used."""
+
+    def __init__(self, buckets: int):
+        self.buckets = buckets
+
+    def encode(self, key: str) -> int:
+        # crc32 rather than hash(), string hashing is salted per process and checkpoints must stay valid
+        return zlib.crc32(key.encode('utf-8')) % self.buckets + 1
+
+
+class LRUVocabularyKeyEncoder(KeyEncoder):
+    """Exact ids for the `capacity` most recently seen keys, the least recently seen key gives up its id when full."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.key_to_id = OrderedDict()
+
+    def encode(self, key: str) -> int:
+        key_id = self.key_to_id.get(key)
+        if key_id is not None:
+            self.key_to_id.move_to_end(key)
+            return key_id
+
+        if len(self.key_to_id) < self.capacity:
+            key_id = len(self.key_to_id) + 1
+        else:
+            _, key_id = self.key_to_id.popitem(last=False)
+        self.key_to_id[key] = key_id
+        return key_id
+
+    def get_state(self):
+        return list(self.key_to_id.items())
+
+    def set_state(self, state) -> None:
+        self.key_to_id = OrderedDict(state)
+
+
+class VocabularyKeyEncoder(KeyEncoder):
+    """Legacy behaviour, every distinct key gets its own id forever."""
+
+    def __init__(self):
+        self.vocabulary = Vocabulary()
+
+    def encode(self, key: str) -> int:
+        return self.vocabulary.add_or_get_id(key)
+
+    def get_state(self):
+        return self.vocabulary.id_to_token
+
+    def set_state(self, state) -> None:
+        self.vocabulary.id_to_token = state
+        self.vocabulary.token_to_id = {token: token_id for token_id, token in enumerate(state)}
+
+
+def key_encoder_from_config(config: Dict[str, any]) -> KeyEncoder:
+    _supported_type = ['hashing', 'lru_vocabulary', 'vocabulary']
+
+    encoder_type = config.get('type', 'hashing')
+    if encoder_type == 'hashing':
+        return HashingKeyEncoder(config.get('buckets', 2 ** 20))
+    elif encoder_type == 'lru_vocabulary':
+        return LRUVocabularyKeyEncoder(config.get('capacity', 100000))
+    elif encoder_type == 'vocabulary':
+        return VocabularyKeyEncoder()
+    else:
+        raise NotImplementedError("Type passed isn't one of the supported types: {}".format(_supported_type))
+
+
+def shared_key_encoder(config: Dict[str, any], key_encoders: Dict[str, KeyEncoder]) -> KeyEncoder:
+    """
+    Encoder for the strategy's `key_encoding` settings. Strategies passing the same `key_encoders` registry (the
+    one in CacheInformation) and equal settings share one instance, so keys are only stored once.
+    """
+    encoding_config = config.get('key_encoding', {})
+    spec = json.dumps(encoding_config, sort_keys=True)
+    if spec not in key_encoders:
+        key_encoders[spec] = key_encoder_from_config(encoding_config)
+    return key_encoders[spec]
@@ -0,0 +1,51 @@
+import random
+from typing import Dict, List, Optional
+
+
+class KeyPool(object):
+    """
+    Array backed set of keys that supports O(1) add, remove and uniform random sampling.
+
+    Removal swaps the removed key with the last key in the array so the array never has holes, which lets
+    sampling index directly into it instead of walking a dict.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self._keys = []  # type: List[str]
+        self._key_to_index = {}  # type: Dict[str, int]
+        self._random = random.Random(seed)
+
+    def add(self, key: str) -> None:
+        if key in self._key_to_index:
+            return
+        self._key_to_index[key] = len(self._keys)
+        self._keys.append(key)
+
+    def remove(self, key: str) -> None:
+        index = self._key_to_index.pop(key, None)
+        if index is None:
+            return
+        last_key = self._keys.pop()
+        if index < len(self._keys):
+            # fill the hole with the last key
+            self._keys[index] = last_key
+            self._key_to_index[last_key] = index
+
+    def sample(self, k: int) -> List[str]:
+        """Draw up to k distinct keys uniformly at random."""
+        if k >= len(self._keys):
+            return list(self._keys)
+        return self._random.sample(self._keys, k)
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._key_to_index.clear()
+
+    def __contains__(self, key):
+        return key in self._key_to_index
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
@@ -0,0 +1,56 @@
+import time
+import zlib
+from typing import Callable, Dict, Optional
+
+
+class KeySampler(object):
+    """
+    Deterministic hash based selection of the keys an RL strategy learns from.
+
+    A key is either always or never sampled, so its experiences are tracked from decision to terminal observation.
+    Strategies configured with the same `learning_sample_seed` learn from the same keys. The seed is the crc32
+    starting value, which keeps the sample independent of the hashing key encoder's buckets.
+    """
+
+    def __init__(self, rate: float = 1.0, seed: int = 1):
+        assert 0.0 <= rate <= 1.0, f'Sample rate should be in [0, 1]: {rate}'
+        self.rate = rate
+        self.seed = seed
+        self._threshold = int(rate * 2 ** 32)
+
+    def sampled(self, key: str) -> bool:
+        if self.rate >= 1.0:
+            return True
+        return zlib.crc32(key.encode('utf-8'), self.seed) < self._threshold
+
+
+class TokenBucket(object):
+    """Allows `rate` operations per second on average, and bursts of up to `burst` operations."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.clock = clock
+        self.tokens = self.burst
+        self._last_refill = clock()
+
+    def try_consume(self, tokens: float = 1.0) -> bool:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+def key_sampler_from_config(config: Dict[str, any]) -> KeySampler:
+    return KeySampler(config.get('learning_sample_rate', 1.0), config.get('learning_sample_seed', 1))
+
+
+def update_bucket_from_config(config: Dict[str, any]) -> Optional[TokenBucket]:
+    """Bucket capping agent updates at `max_updates_per_second`, None when updates are unbounded."""
+    max_updates_per_second = config.get('max_updates_per_second')
+    if max_updates_per_second is None:
+        return None
+    return TokenBucket(max_updates_per_second, config.get('update_burst'))
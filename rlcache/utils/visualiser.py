@@ -1,17 +1,34 @@
+import hashlib
+import inspect
 import os
-from typing import List, Tuple, Dict
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Tuple, Dict
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import time
 
+from rlcache.utils.event_log import read_event_log
+
 CAPACITIES = [100, 1000, 2500, 5000]
 
 ''' collection of tools to help visualise and fix missing data points in collected data.'''
 caching_strategy_dir = 'caching_strategy'
 eviction_strategy_dir = 'eviction_strategy'
 
+EVALUATION_LOG_NAMES = ['timestamp', 'key', 'observation', 'episode']
+TTL_LOG_NAMES = ['timestamp', 'episode', 'observation', 'key', 'ttl', 'real_ttl', 'hits']
+PERFORMANCE_LOG_NAMES = ['timestamp', 'episode', 'state']
+END_OF_EPISODE_LOG_NAMES = ['timestamp', 'episode_num', 'invalidate', 'hit', 'miss', 'hit_ratio', 'should_cache',
+                            'should_not_cache', 'should_cache_ratio', 'manual_evicts', 'cache_utility']
+
+# per run aggregates, one pickle per run directory, kept out of the results
+CACHE_DIR = os.environ.get('RLCACHE_VISUALISER_CACHE', os.path.expanduser('~/.cache/rlcache/visualiser'))
+CACHE_VERSION = 1  # bump when a change the parsing functions' source doesn't show (e.g. in load_log) alters results
+PROCESSES = None  # worker processes parsing the runs, the cpu count by default, 1 parses them in this process
+
 EVICTION_METHOD_TO_LOGGER_MAP = {
     'simple_strategy': 'lru_eviction_strategy',
     'simple_strategy_fifo': 'fifo_eviction_strategy',
@@ -28,6 +45,98 @@ TTL_METHOD_TO_LOGGER_MAP = {
 }
 
 
+def load_log(log_path: str, names: List[str], usecols: List[str] = None) -> pd.DataFrame:
+    """
+    Load the usecols columns (all of names by default) of a run's log, log_path being its path without extension.
+    Prefers the columnar outputs, reading only those columns: <log_path>.parquet, then the binary <log_path>.events,
+    observation names as categoricals and keys as their interned ids. Falls back to parsing the <log_path>.log csv
+    of older runs, whose columns are names.
+    """
+    usecols = usecols or names
+    if os.path.exists(f'{log_path}.parquet'):
+        return pd.read_parquet(f'{log_path}.parquet', columns=usecols)
+    if os.path.isdir(f'{log_path}.events'):
+        log = read_event_log(f'{log_path}.events', usecols, decode=False)
+        return pd.DataFrame({column: pd.Categorical.from_codes(log[column], log[f'{column}_categories'])
+                             if f'{column}_categories' in log else log[column]
+                             for column in usecols})
+    return pd.read_csv(f'{log_path}.log', names=names, usecols=usecols)
+
+
+def map_runs(function: Callable, run_dirs: List[str], log_names: List[str], *args) -> List:
+    """
+    function(run_dir, *args) of every run directory, the runs parsed in parallel over a process pool. The results are
+    cached on disk under CACHE_DIR, keyed by CACHE_VERSION, a hash of function's source and the modification time and
+    size of the logs function reads (log_names, relative to the run directory), so only the new or changed runs, or
+    the runs of a changed function, are parsed again.
+    """
+    code = (CACHE_VERSION, _source_hash(function))
+    keys = [(function.__name__, args, code, tuple(_log_signature(f'{run_dir}/{name}') for name in log_names))
+            for run_dir in run_dirs]
+    caches = [_read_run_cache(run_dir) for run_dir in run_dirs]
+    missing = [i for i, (key, cache) in enumerate(zip(keys, caches)) if key not in cache]
+    if missing:
+        missing_dirs = [run_dirs[i] for i in missing]
+        if PROCESSES == 1 or len(missing) == 1:
+            computed = [function(run_dir, *args) for run_dir in missing_dirs]
+        else:
+            with ProcessPoolExecutor(max_workers=PROCESSES) as pool:
+                computed = list(pool.map(function, missing_dirs, *[[arg] * len(missing) for arg in args]))
+        for i, result in zip(missing, computed):
+            # only the latest result of a function and arguments is kept
+            caches[i] = {key: value for key, value in caches[i].items() if key[:2] != keys[i][:2]}
+            caches[i][keys[i]] = result
+            _write_run_cache(run_dirs[i], caches[i])
+    return [cache[key] for key, cache in zip(keys, caches)]
+
+
+def _log_signature(log_path: str) -> Tuple:
+    """The modification time and size of the log load_log reads, None if there is none."""
+    if os.path.exists(f'{log_path}.parquet'):
+        stat = os.stat(f'{log_path}.parquet')
+        return 'parquet', stat.st_mtime_ns, stat.st_size
+    if os.path.isdir(f'{log_path}.events'):
+        stats = [entry.stat() for entry in os.scandir(f'{log_path}.events')]
+        return 'events', max(stat.st_mtime_ns for stat in stats), sum(stat.st_size for stat in stats)
+    if os.path.exists(f'{log_path}.log'):
+        stat = os.stat(f'{log_path}.log')
+        return 'log', stat.st_mtime_ns, stat.st_size
+    return None
+
+
+def _source_hash(function: Callable) -> str:
+    try:
+        source = inspect.getsource(function).encode('utf-8')
+    except (OSError, TypeError):
+        source = function.__code__.co_code  # no source file, e.g. defined in an interactive session
+    return hashlib.sha1(source).hexdigest()
+
+
+def _run_cache_path(run_dir: str) -> str:
+    run_hash = hashlib.sha1(os.path.abspath(run_dir).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f'{run_hash}.pkl')
+
+
+def _read_run_cache(run_dir: str) -> Dict:
+    try:
+        with open(_run_cache_path(run_dir), 'rb') as fp:
+            return pickle.load(fp)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return {}
+
+
+def _write_run_cache(run_dir: str, cache: Dict):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cache_path = _run_cache_path(run_dir)
+    with open(f'{cache_path}.tmp', 'wb') as fp:
+        pickle.dump(cache, fp)
+    os.replace(f'{cache_path}.tmp', cache_path)
+
+
+def _run_name(run_dir: str) -> str:
+    return os.path.basename(os.path.normpath(run_dir))
+
+
 def calculate_ttl_diff(directory, method):
     sub_dirs = os.listdir(directory)
     write_ratio_df = pd.DataFrame({'write_ratio': [0, 5, 10, 25, 50, 100]})
@@ -37,20 +146,10 @@ def calculate_ttl_diff(directory, method):
         ttl_dir = 'multi_strategy'
     else:
         ttl_dir = 'ttl_strategy'
-    for sub_dir in sub_dirs:
-        observations_df = pd.read_csv(f'{directory}/{sub_dir}/{ttl_dir}/{name}_ttl_logger.log',
-                                      names=['timestamp', 'episode', 'observation',
-                                             'key', 'ttl', 'real_ttl', 'hits'],
-                                      usecols=['episode', 'ttl', 'real_ttl', 'observation'])
-        # if rl_ttl
-        if name == 'rl_ttl_strategy':
-            observations_df['episode'] = observations_df['episode'] + np.where(
-                'EndOfEpisode' == observations_df['observation'],
-                -1, 0)
-        observations_df['rlcache_ttl'] = (observations_df['ttl'] - observations_df['real_ttl'])
-        observations_df['fixed_ttl'] = (60 - observations_df['real_ttl'])
+    run_dirs = [f'{directory}/{sub_dir}' for sub_dir in sub_dirs]
+    ttl_diffs = map_runs(ttl_diff_of_run, run_dirs, [f'{ttl_dir}/{name}_ttl_logger'], ttl_dir, name)
+    for sub_dir, ttl_diff_all in zip(sub_dirs, ttl_diffs):
         print(f'{directory}/{sub_dir}')
-        ttl_diff_all = observations_df.groupby('episode').mean()[['rlcache_ttl', 'fixed_ttl']]
         ttl_diff_all.index = write_ratio_df.index
         if method == 'rl_ttl_strategy':
             write_ratio_df[sub_dir] = ttl_diff_all['rlcache_ttl']
@@ -64,6 +163,19 @@ def calculate_ttl_diff(directory, method):
     return means, errors
 
 
+def ttl_diff_of_run(run_dir: str, ttl_dir: str, name: str) -> pd.DataFrame:
+    observations_df = load_log(f'{run_dir}/{ttl_dir}/{name}_ttl_logger', TTL_LOG_NAMES,
+                               usecols=['episode', 'ttl', 'real_ttl', 'observation'])
+    # if rl_ttl
+    if name == 'rl_ttl_strategy':
+        observations_df['episode'] = observations_df['episode'] + np.where(
+            'EndOfEpisode' == observations_df['observation'],
+            -1, 0)
+    observations_df['rlcache_ttl'] = (observations_df['ttl'] - observations_df['real_ttl'])
+    observations_df['fixed_ttl'] = (60 - observations_df['real_ttl'])
+    return observations_df.groupby('episode')[['rlcache_ttl', 'fixed_ttl']].mean()
+
+
 def calculate_ttl_diff_varying_methods(directory, methods, capacity):
     res_df = pd.DataFrame()
     errs_df = pd.DataFrame()
@@ -123,13 +235,8 @@ def save_zoomed_hit_rate(directory: str,
     sub_dirs = os.listdir(method_directory)
     hit_rate_df = pd.DataFrame()
 
-    for sub_dir in sub_dirs:
-        stats_df = pd.read_csv(f'{method_directory}/{sub_dir}/evaluation_logger.log',
-                               names=['timestamp', 'key', 'observation', 'episode'],
-                               usecols=['episode', 'observation', 'key'])
-        stats = stats_df.groupby([(stats_df.index // 1000), 'episode', 'observation']).count().unstack(0)['key'].fillna(
-            0).transpose()
-        zoomed_stats = (stats[1]['Hit'] / stats[1].sum(axis=1)).dropna()
+    run_dirs = [f'{method_directory}/{sub_dir}' for sub_dir in sub_dirs]
+    for sub_dir, zoomed_stats in zip(sub_dirs, map_runs(zoomed_hitrate_of_run, run_dirs, ['evaluation_logger'])):
         hit_rate_df[f'{sub_dir}'] = zoomed_stats
 
     hit_rate_df.index = hit_rate_df.index * 1000
@@ -145,6 +252,13 @@ def save_zoomed_hit_rate(directory: str,
     return means, errors
 
 
+def zoomed_hitrate_of_run(run_dir: str) -> pd.Series:
+    stats_df = load_log(f'{run_dir}/evaluation_logger', EVALUATION_LOG_NAMES, usecols=['episode', 'observation'])
+    stats = stats_df.groupby([(stats_df.index // 1000), 'episode', 'observation'], observed=True).size().unstack(
+        0).fillna(0).transpose()
+    return (stats[1]['Hit'] / stats[1].sum(axis=1)).dropna()
+
+
 def save_everything_hit_rate(directory: str,
                              methods: List,
                              output: str,
@@ -250,25 +364,12 @@ def calculate_hitrate_on_varying_capacity(directory: str,
 
 
 def calculate_cache_rate(directory: str):
-    TIME_OF_FIX_IMPLEMENTATION = '2019_05_24_13_32'
-
     sub_dirs = os.listdir(directory)
     write_ratio_df = pd.DataFrame({'write_ratio': [0, 5, 10, 25, 50, 100]})
     write_ratio_df = write_ratio_df.set_index('write_ratio')
 
-    for sub_dir in sub_dirs:
-        end_of_episode_stats_df = pd.read_csv(f'{directory}/{sub_dir}/end_of_episode_logger.log',
-                                              names=['timestamp', 'episode_num',
-                                                     'invalidate', 'hit',
-                                                     'miss', 'hit_ratio',
-                                                     'should_cache',
-                                                     'should_not_cache',
-                                                     'should_cache_ratio',
-                                                     'manual_evicts',
-                                                     'cache_utility'])
-        if time.strptime(sub_dir, '%Y_%m_%d_%H_%M') < time.strptime(TIME_OF_FIX_IMPLEMENTATION, '%Y_%m_%d_%H_%M'):
-            end_of_episode_stats_df = fix_cummulative_sum_in_EOE_logger(end_of_episode_stats_df)
-        cache_rate = end_of_episode_stats_df['should_cache_ratio'].drop(0)
+    run_dirs = [f'{directory}/{sub_dir}' for sub_dir in sub_dirs]
+    for sub_dir, cache_rate in zip(sub_dirs, map_runs(cache_rate_of_run, run_dirs, ['end_of_episode_logger'])):
         cache_rate.index = write_ratio_df.index
         write_ratio_df[sub_dir] = cache_rate
 
@@ -277,6 +378,16 @@ def calculate_cache_rate(directory: str):
     return means, errors
 
 
+def cache_rate_of_run(run_dir: str) -> pd.Series:
+    TIME_OF_FIX_IMPLEMENTATION = '2019_05_24_13_32'
+
+    end_of_episode_stats_df = load_log(f'{run_dir}/end_of_episode_logger', END_OF_EPISODE_LOG_NAMES)
+    if time.strptime(_run_name(run_dir), '%Y_%m_%d_%H_%M') < time.strptime(TIME_OF_FIX_IMPLEMENTATION,
+                                                                         '%Y_%m_%d_%H_%M'):
+        end_of_episode_stats_df = fix_cummulative_sum_in_EOE_logger(end_of_episode_stats_df)
+    return end_of_episode_stats_df['should_cache_ratio'].drop(0)
+
+
 def fix_cummulative_sum_in_EOE_logger(end_of_episode_stats_df):
     df_should_cache = end_of_episode_stats_df['should_cache']
     df_should_not_cache = end_of_episode_stats_df['should_not_cache']
@@ -305,18 +416,8 @@ def calculate_hitrate(directory: str, q95=False) -> Tuple[pd.Series, pd.Series]:
     write_ratio_df = pd.DataFrame({'write_ratio': [0, 5, 10, 25, 50, 100]})
     write_ratio_df = write_ratio_df.set_index('write_ratio')
 
-    for sub_dir in sub_dirs:
-        stats_df = pd.read_csv(f'{directory}/{sub_dir}/evaluation_logger.log',
-                               names=['timestamp', 'key', 'observation', 'episode'],
-                               usecols=['episode', 'observation', 'key'])
-        if q95:
-            stats = stats_df.groupby(['episode', 'observation', (stats_df.index // 10000)]).count().unstack(0)[
-                'key'].fillna(0).transpose()
-            hit_ratio_all = (stats['Hit'] / 10000).quantile(0.95, axis=1)
-        else:
-            stats = stats_df.groupby(['episode', 'observation']).count().unstack(0)['key'].fillna(0).transpose()
-            hit_ratio_all = stats['Hit'] / stats.sum(axis=1)
-
+    run_dirs = [f'{directory}/{sub_dir}' for sub_dir in sub_dirs]
+    for sub_dir, hit_ratio_all in zip(sub_dirs, map_runs(hitrate_of_run, run_dirs, ['evaluation_logger'], q95)):
         print(f'{directory}/{sub_dir}')
         hit_ratio_all.index = write_ratio_df.index
         write_ratio_df[sub_dir] = hit_ratio_all
@@ -326,6 +427,16 @@ def calculate_hitrate(directory: str, q95=False) -> Tuple[pd.Series, pd.Series]:
     return means, errors
 
 
+def hitrate_of_run(run_dir: str, q95=False) -> pd.Series:
+    stats_df = load_log(f'{run_dir}/evaluation_logger', EVALUATION_LOG_NAMES, usecols=['episode', 'observation'])
+    if q95:
+        stats = stats_df.groupby(['episode', 'observation', (stats_df.index // 10000)], observed=True).size(
+        ).unstack(0).fillna(0).transpose()
+        return (stats['Hit'] / 10000).quantile(0.95, axis=1)
+    stats = stats_df.groupby(['episode', 'observation'], observed=True).size().unstack(0).fillna(0).transpose()
+    return stats['Hit'] / stats.sum(axis=1)
+
+
 def calculate_eviction_score_with_varying_methods(directory: str, methods: List, capacity: int, metric):
     res_df = pd.DataFrame()
     errs_df = pd.DataFrame()
@@ -350,9 +461,6 @@ def calculate_eviction_score_with_varying_methods(directory: str, methods: List,
 
 def calculate_eviction_score(directory: str,
                              eviction_name: str):
-    MISSING_EPISODE_NUMBER_TIMESTAMP = '2019_05_19_14_27'
-    BUG_IN_CUMMULATIVE_SUM_EOE_LOGGER = '2019_05_24_13_32'
-
     sub_dirs = os.listdir(directory)
 
     precision_df = pd.DataFrame({'write_ratio': [0, 5, 10, 25, 50, 100]})
@@ -364,22 +472,12 @@ def calculate_eviction_score(directory: str,
     manual_evicts_df = pd.DataFrame({'write_ratio': [0, 5, 10, 25, 50, 100]})
     manual_evicts_df = manual_evicts_df.set_index('write_ratio')
 
-    for sub_dir in sub_dirs:
-        if time.strptime(sub_dir, '%Y_%m_%d_%H_%M') < time.strptime(MISSING_EPISODE_NUMBER_TIMESTAMP, '%Y_%m_%d_%H_%M') \
-                and eviction_name == 'rl_eviction_strategy':
-            eviction_performance_df = fix_missing_episode_in_eviction(f'{directory}/{sub_dir}',
-                                                                      eviction_name)
-        else:
-            if eviction_name == 'rl_multi_strategy':
-                eviction_performance_df = pd.read_csv(
-                    f'{directory}/{sub_dir}/multi_strategy/{eviction_name}_performance_logger.log',
-                    names=['timestamp', 'episode', 'state'])
-            else:
-                eviction_performance_df = pd.read_csv(
-                    f'{directory}/{sub_dir}/eviction_strategy/{eviction_name}_performance_logger.log',
-                    names=['timestamp', 'episode', 'state'])
-        eviction_performance = eviction_performance_df.groupby(['episode', 'state']
-                                                               ).count().unstack(0)['timestamp'].fillna(0).transpose()
+    strategy_dir = 'multi_strategy' if eviction_name == 'rl_multi_strategy' else 'eviction_strategy'
+    run_dirs = [f'{directory}/{sub_dir}' for sub_dir in sub_dirs]
+    run_scores = map_runs(eviction_performance_of_run, run_dirs,
+                          [f'{strategy_dir}/{eviction_name}_performance_logger', 'end_of_episode_logger'],
+                          eviction_name)
+    for sub_dir, (eviction_performance, manual_evicts) in zip(sub_dirs, run_scores):
         precision, recall, f1 = calculate_f1_measure(eviction_performance)
         precision.index = precision_df.index
         recall.index = recall_df.index
@@ -388,26 +486,35 @@ def calculate_eviction_score(directory: str,
 
         f1.index = f1_df.index
         f1_df[sub_dir] = f1
-
-        # count manual evicts
-        end_of_episode_stats_df = pd.read_csv(f'{directory}/{sub_dir}/end_of_episode_logger.log',
-                                              names=['timestamp', 'episode_num',
-                                                     'invalidate', 'hit',
-                                                     'miss', 'hit_ratio',
-                                                     'should_cache',
-                                                     'should_not_cache',
-                                                     'should_cache_ratio',
-                                                     'manual_evicts',
-                                                     'cache_utility'])
-        if time.strptime(sub_dir, '%Y_%m_%d_%H_%M') < time.strptime(BUG_IN_CUMMULATIVE_SUM_EOE_LOGGER,
-                                                                    '%Y_%m_%d_%H_%M'):
-            end_of_episode_stats_df = fix_cummulative_sum_in_EOE_logger(end_of_episode_stats_df)
-        end_of_episode_stats_df = end_of_episode_stats_df.drop(0)
-        manual_evicts_df[sub_dir] = end_of_episode_stats_df['manual_evicts'].values
+        manual_evicts_df[sub_dir] = manual_evicts
 
     return precision_df, recall_df, f1_df, manual_evicts_df
 
 
+def eviction_performance_of_run(run_dir: str, eviction_name: str) -> Tuple[pd.DataFrame, np.ndarray]:
+    """The eviction outcome counts per episode of a run and its manual evictions per episode."""
+    MISSING_EPISODE_NUMBER_TIMESTAMP = '2019_05_19_14_27'
+    BUG_IN_CUMMULATIVE_SUM_EOE_LOGGER = '2019_05_24_13_32'
+
+    run_time = time.strptime(_run_name(run_dir), '%Y_%m_%d_%H_%M')
+    if run_time < time.strptime(MISSING_EPISODE_NUMBER_TIMESTAMP, '%Y_%m_%d_%H_%M') \
+            and eviction_name == 'rl_eviction_strategy':
+        eviction_performance_df = fix_missing_episode_in_eviction(run_dir, eviction_name)
+    else:
+        strategy_dir = 'multi_strategy' if eviction_name == 'rl_multi_strategy' else 'eviction_strategy'
+        eviction_performance_df = load_log(f'{run_dir}/{strategy_dir}/{eviction_name}_performance_logger',
+                                           PERFORMANCE_LOG_NAMES, usecols=['episode', 'state'])
+    eviction_performance = eviction_performance_df.groupby(['episode', 'state'], observed=True
+                                                           ).size().unstack(0).fillna(0).transpose()
+
+    # count manual evicts
+    end_of_episode_stats_df = load_log(f'{run_dir}/end_of_episode_logger', END_OF_EPISODE_LOG_NAMES)
+    if run_time < time.strptime(BUG_IN_CUMMULATIVE_SUM_EOE_LOGGER, '%Y_%m_%d_%H_%M'):
+        end_of_episode_stats_df = fix_cummulative_sum_in_EOE_logger(end_of_episode_stats_df)
+    end_of_episode_stats_df = end_of_episode_stats_df.drop(0)
+    return eviction_performance, end_of_episode_stats_df['manual_evicts'].values
+
+
 def calculate_f1_measure(perf):
     # https://machinelearningmastery.com/classification-accuracy-is-not-enough-more-performance-measures-you-can-use/
     # TrueEvict: True positive
@@ -429,15 +536,7 @@ def calculate_f1_measure(perf):
 def fix_missing_episode_in_eviction(directory: str,
                                     eviction_name: str):
     # get episodes timestamps
-    end_of_episode_stats_df = pd.read_csv(f'{directory}/end_of_episode_logger.log',
-                                          names=['timestamp', 'episode_num',
-                                                 'invalidate', 'hit',
-                                                 'miss', 'hit_ratio',
-                                                 'should_cache',
-                                                 'should_not_cache',
-                                                 'should_cache_ratio',
-                                                 'manual_evicts',
-                                                 'cache_utility'],
+    end_of_episode_stats_df = pd.read_csv(f'{directory}/end_of_episode_logger.log', names=END_OF_EPISODE_LOG_NAMES,
                                           usecols=['timestamp'])
     episodes_break_timestamp = end_of_episode_stats_df.drop(0).values.flatten().tolist()
     # read eviction performance